@@ -5,13 +5,19 @@ from routes.auth import auth_bp, login_required
 from routes.contacts import contacts_bp
 from routes.messages import messages_bp
 from routes.groups import groups_bp  # ✅ ADD THIS IMPORT
-from socketio_events import register_socketio_events
+from routes.sync import sync_bp
+from routes.bootstrap import bootstrap_bp
+from routes.files import files_bp
+from socketio_events import register_socketio_events, start_background_tasks
+from logger import get_logger
 import os
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+log = get_logger(__name__)
+
 # Create Flask app
 app = Flask(__name__)
 app.secret_key = os.getenv('SECRET_KEY', 'your-secret-key-change-this')
@@ -30,15 +36,16 @@ app.register_blueprint(auth_bp)
 app.register_blueprint(contacts_bp)
 app.register_blueprint(messages_bp)
 app.register_blueprint(groups_bp)  # ✅ ADD THIS LINE
+app.register_blueprint(sync_bp)
+app.register_blueprint(bootstrap_bp)
+app.register_blueprint(files_bp)
 
 # Register Socket.IO events
 register_socketio_events(socketio)
 
-# DEBUG: Print all registered routes
-print("\n=== REGISTERED ROUTES ===")
+# DEBUG: Log all registered routes
 for rule in app.url_map.iter_rules():
-    print(f"{rule.endpoint}: {rule.rule}")
-print("========================\n")
+    log.debug("app.route_registered", endpoint=rule.endpoint, rule=rule.rule)
 
 
 # DATABASE CONNECTION
@@ -101,5 +108,8 @@ if __name__ == '__main__':
     # Connect to database on startup
     db.connect()
     
+    # Only here: importing this module (e.g. in a thumbnail worker) must not start them
+    start_background_tasks(socketio)
+    
     # Run Flask app with Socket.IO
     socketio.run(app, debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,365 @@
+"""Cold storage for old messages.
+
+Messages older than ARCHIVE_AFTER_DAYS are moved out of MESSAGE, per
+conversation and oldest first, into zlib-compressed segments appended to
+one file per conversation. ARCHIVESEGMENT is the offset index: where each
+segment starts in the file and which messages it holds. History reads fall
+through to the archive once the hot rows before a cursor run out.
+
+Run a pass by hand or from cron (python archive.py), or set
+ARCHIVE_INTERVAL to let the app run passes in the background.
+"""
+import argparse
+import json
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from database.db import db
+from logger import get_logger
+
+log = get_logger(__name__)
+
+# Segment files; anchored like UPLOAD_DIR so a cron run from elsewhere writes where the app reads
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'archive'))
+# Age after which a message may leave MESSAGE
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', '180'))
+# Messages per compressed segment; a conversation with fewer old messages is left alone
+ARCHIVE_SEGMENT_MESSAGES = int(os.getenv('ARCHIVE_SEGMENT_MESSAGES', '500'))
+ARCHIVE_MIN_MESSAGES = int(os.getenv('ARCHIVE_MIN_MESSAGES', '50'))
+# Conversations looked at per pass; the next pass continues after the last one
+ARCHIVE_CONVERSATIONS_PER_PASS = int(os.getenv('ARCHIVE_CONVERSATIONS_PER_PASS', '200'))
+# Seconds between background passes; 0 leaves archiving to an external job
+ARCHIVE_INTERVAL = float(os.getenv('ARCHIVE_INTERVAL', '0'))
+# Pause after each segment so a pass never monopolizes the database
+ARCHIVE_THROTTLE = float(os.getenv('ARCHIVE_THROTTLE', '0.05'))
+# Decoded segments kept for paging through the same stretch of history
+ARCHIVE_CACHE_SEGMENTS = int(os.getenv('ARCHIVE_CACHE_SEGMENTS', '64'))
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class ArchiveConflict(Exception):
+    """Messages changed between being read and being removed from MESSAGE"""
+
+
+# =====================================================
+# HISTORY CURSORS
+# =====================================================
+def history_cursor(entries, limit):
+    """Cursor for the page before `entries` (oldest first), or None when history is exhausted"""
+    if len(entries) < limit:
+        return None
+    oldest = entries[0]
+    return f"{oldest['timestamp']}_{oldest['msg_id']}"
+
+
+def parse_cursor(value):
+    """(timestamp, msg_id) from a history cursor; ValueError if it is malformed"""
+    timestamp, _, msg_id = value.rpartition('_')
+    return datetime.fromisoformat(timestamp), int(msg_id)
+
+
+def _before(record, cursor):
+    return (record['timestamp'], record['msg_id']) < cursor
+
+
+# =====================================================
+# MESSAGE ARCHIVE
+# =====================================================
+class MessageArchive:
+    """Append-only compressed segment files plus their ARCHIVESEGMENT index.
+
+    A pass takes the oldest messages of a conversation that are past the
+    cutoff and stops at the first one that must stay hot (unread, pinned or
+    starred), so everything archived is older than everything in MESSAGE
+    and a history cursor only ever moves from MESSAGE into the archive.
+    Segments are written to the file first and indexed and deleted from
+    MESSAGE in one transaction; a failed pass leaves only unindexed bytes.
+    Archived messages are read-only: edits and deletes no longer match them.
+    """
+
+    def __init__(self, root=ARCHIVE_DIR, segment_size=ARCHIVE_SEGMENT_MESSAGES,
+                 min_messages=ARCHIVE_MIN_MESSAGES, cache_segments=ARCHIVE_CACHE_SEGMENTS):
+        self.root = root
+        self.segment_size = segment_size
+        self.min_messages = min_messages
+        self.cache_segments = cache_segments
+        self._lock = threading.Lock()
+        self._segments = OrderedDict()  # segment_id -> [record]
+        self._next_conv = 0
+        self.archived = 0
+        self.segments_written = 0
+        self.conflicts = 0
+        self.reads = 0
+
+    def path_for(self, conv_id):
+        return os.path.join(self.root, f'{conv_id % 256:02x}', f'{conv_id}.seg')
+
+    # -------------------------------------------------
+    # Writing
+    # -------------------------------------------------
+    def run_pass(self, max_age_days=ARCHIVE_AFTER_DAYS, conversations=ARCHIVE_CONVERSATIONS_PER_PASS,
+                 throttle=ARCHIVE_THROTTLE, sleep=None):
+        """Archive old messages of the next `conversations` conversations; returns messages moved"""
+        cutoff = (datetime.now() - timedelta(days=max_age_days)).strftime(TIMESTAMP_FORMAT)
+        conv_query = """
+            SELECT conv_id, type FROM CONVERSATION
+            WHERE conv_id > %s
+            ORDER BY conv_id
+            LIMIT %s
+        """
+        rows = db.execute_query(conv_query, (self._next_conv, conversations))
+        if rows is None:
+            log.error("archive.conversations_failed")
+            return 0
+        # Wrap around once the end is reached
+        self._next_conv = rows[-1]['conv_id'] if len(rows) == conversations else 0
+
+        moved = 0
+        for row in rows:
+            while True:
+                try:
+                    count = self.archive_segment(row['conv_id'], row['type'] == 'group', cutoff)
+                except ArchiveConflict:
+                    with self._lock:
+                        self.conflicts += 1
+                    log.warning("archive.conflict", conv_id=row['conv_id'])
+                    break
+                if not count:
+                    break
+                moved += count
+                if sleep and throttle:
+                    sleep(throttle)
+        if moved:
+            log.info("archive.pass_finished", messages=moved, conversations=len(rows))
+        return moved
+
+    def archive_segment(self, conv_id, group, cutoff):
+        """Move one segment of a conversation's oldest messages out of MESSAGE; returns its size"""
+        select_query = """
+            SELECT m.msg_id, m.sender_id, m.receiver_id, m.content, m.timestamp, m.status,
+                   m.attachment_path, m.pinned, m.edited, m.deleted
+            FROM MESSAGE m
+            WHERE m.conv_id = %s AND m.timestamp < %s
+            ORDER BY m.timestamp, m.msg_id
+            LIMIT %s
+        """
+        rows = db.execute_query(select_query, (conv_id, cutoff, self.segment_size))
+        if not rows or len(rows) < self.min_messages:
+            return 0
+
+        placeholders = ', '.join(['%s'] * len(rows))
+        starred_query = f"SELECT msg_id FROM STARREDMESSAGES WHERE msg_id IN ({placeholders})"
+        starred = db.execute_query(starred_query, tuple(row['msg_id'] for row in rows))
+        if starred is None:
+            return 0
+        starred = {row['msg_id'] for row in starred}
+
+        # Unread messages back the unread counters; stop before the first one
+        segment = []
+        for row in rows:
+            unread = row['status'] != 'read' and row['sender_id'] != row['receiver_id']
+            if unread or row['pinned'] or row['msg_id'] in starred:
+                break
+            segment.append(row)
+        if len(segment) < self.min_messages:
+            return 0
+
+        records = [self._record(row, group) for row in segment]
+        block = zlib.compress(json.dumps(records, separators=(',', ':')).encode())
+        offset = self._append(conv_id, block)
+
+        msg_ids = tuple(row['msg_id'] for row in segment)
+        placeholders = ', '.join(['%s'] * len(msg_ids))
+        index_query = """
+            INSERT INTO ARCHIVESEGMENT
+                (conv_id, file_offset, byte_length, message_count, first_msg_id, last_msg_id, first_at, last_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """
+        # Re-check the conditions that keep a message hot; any change since the SELECT aborts the segment
+        delete_query = f"""
+            DELETE FROM MESSAGE
+            WHERE msg_id IN ({placeholders}) AND conv_id = %s AND pinned = FALSE
+              AND (status = 'read' OR sender_id = receiver_id)
+              AND msg_id NOT IN (SELECT msg_id FROM STARREDMESSAGES WHERE msg_id IN ({placeholders}))
+        """
+        # Attachments stay downloadable for the conversation once their messages leave MESSAGE
+        file_hashes = sorted({row['attachment_path'] for row in segment
+                              if row['attachment_path'] and not row['deleted']})
+        try:
+            with db.transaction() as tx:
+                tx.execute(index_query, (conv_id, offset, len(block), len(records),
+                                         records[0]['msg_id'], records[-1]['msg_id'],
+                                         records[0]['timestamp'], records[-1]['timestamp']))
+                if file_hashes:
+                    self._reference_attachments(tx, conv_id, file_hashes)
+                if tx.execute(delete_query, msg_ids + (conv_id,) + msg_ids) != len(msg_ids):
+                    raise ArchiveConflict(conv_id)
+        except db.driver_errors:
+            return 0
+
+        with self._lock:
+            self.archived += len(records)
+            self.segments_written += 1
+        log.debug("archive.segment_written", conv_id=conv_id, messages=len(records), size=len(block))
+        return len(records)
+
+    @staticmethod
+    def _reference_attachments(tx, conv_id, file_hashes):
+        placeholders = ', '.join(['%s'] * len(file_hashes))
+        known_query = f"""
+            SELECT file_hash FROM ARCHIVEATTACHMENT
+            WHERE conv_id = %s AND file_hash IN ({placeholders})
+        """
+        known = {row['file_hash'] for row in tx.query(known_query, (conv_id, *file_hashes))}
+        missing = [file_hash for file_hash in file_hashes if file_hash not in known]
+        if not missing:
+            return
+        insert_query = f"""
+            INSERT INTO ARCHIVEATTACHMENT (file_hash, conv_id)
+            VALUES {', '.join(['(%s, %s)'] * len(missing))}
+        """
+        tx.execute(insert_query, tuple(value for file_hash in missing for value in (file_hash, conv_id)))
+
+    @staticmethod
+    def _record(row, group):
+        record = {
+            'msg_id': row['msg_id'],
+            'sender_id': row['sender_id'],
+            'content': row['content'],
+            'timestamp': row['timestamp'].strftime(TIMESTAMP_FORMAT),
+            'status': row['status'],
+            'attachment_path': row['attachment_path'],
+            'edited': bool(row['edited']),
+            'deleted': bool(row['deleted'])
+        }
+        # Same shape as the history queries: group rows carry no receiver
+        if not group:
+            record['receiver_id'] = row['receiver_id']
+        return record
+
+    def _append(self, conv_id, block):
+        path = self.path_for(conv_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'ab') as segment_file:
+            segment_file.write(block)
+            segment_file.flush()
+            os.fsync(segment_file.fileno())
+            return segment_file.tell() - len(block)
+
+    # -------------------------------------------------
+    # Reading
+    # -------------------------------------------------
+    def read(self, conv_id, before, limit):
+        """Up to `limit` archived rows before the (timestamp, msg_id) cursor, newest first.
+
+        Rows have the shape of the MESSAGE history queries; before=None
+        starts at the newest archived message.
+        """
+        if limit <= 0:
+            return []
+        index_query = """
+            SELECT segment_id, file_offset, byte_length, first_at, first_msg_id
+            FROM ARCHIVESEGMENT
+            WHERE conv_id = %s
+            ORDER BY segment_id DESC
+        """
+        segments = db.execute_query(index_query, (conv_id,))
+        if not segments:
+            return []
+
+        rows = []
+        for segment in segments:
+            if before is not None and (segment['first_at'], segment['first_msg_id']) >= before:
+                continue
+            for record in reversed(self._load(conv_id, segment)):
+                row = {**record, 'timestamp': datetime.strptime(record['timestamp'], TIMESTAMP_FORMAT)}
+                if before is None or _before(row, before):
+                    rows.append(row)
+                    if len(rows) == limit:
+                        return rows
+        return rows
+
+    def _load(self, conv_id, segment):
+        segment_id = segment['segment_id']
+        with self._lock:
+            self.reads += 1
+            records = self._segments.get(segment_id)
+            if records is not None:
+                self._segments.move_to_end(segment_id)
+                return records
+
+        with open(self.path_for(conv_id), 'rb') as segment_file:
+            segment_file.seek(segment['file_offset'])
+            block = segment_file.read(segment['byte_length'])
+        records = json.loads(zlib.decompress(block))
+
+        with self._lock:
+            self._segments[segment_id] = records
+            while len(self._segments) > self.cache_segments:
+                self._segments.popitem(last=False)
+        return records
+
+    def drop(self, conv_id):
+        """Remove the segment file of a deleted conversation (its index rows go with CONVERSATION)"""
+        try:
+            os.remove(self.path_for(conv_id))
+        except FileNotFoundError:
+            pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                'archived': self.archived,
+                'segments_written': self.segments_written,
+                'conflicts': self.conflicts,
+                'segment_reads': self.reads,
+                'cached_segments': len(self._segments)
+            }
+
+
+message_archive = MessageArchive()
+
+
+def start_archiver(socketio, interval=ARCHIVE_INTERVAL):
+    """Background task running an archive pass every `interval` seconds (if enabled)"""
+    if interval <= 0:
+        return None
+
+    def archive_loop():
+        while True:
+            socketio.sleep(interval)
+            try:
+                message_archive.run_pass(sleep=socketio.sleep)
+            except Exception:
+                log.exception("archive.pass_failed")
+
+    return socketio.start_background_task(archive_loop)
+
+
+# =====================================================
+# MAIN
+# =====================================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Move old messages from MESSAGE into compressed archive segments')
+    parser.add_argument('--days', type=int, default=ARCHIVE_AFTER_DAYS,
+                        help='archive messages older than this many days')
+    parser.add_argument('--conversations', type=int, default=ARCHIVE_CONVERSATIONS_PER_PASS,
+                        help='conversations per pass')
+    args = parser.parse_args(argv)
+
+    import time
+    total = 0
+    while True:
+        moved = message_archive.run_pass(args.days, args.conversations, sleep=time.sleep)
+        total += moved
+        # One sweep over every conversation
+        if message_archive._next_conv == 0:
+            break
+    print(f'{total} messages archived, {message_archive.segments_written} segments')
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
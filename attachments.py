@@ -0,0 +1,473 @@
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import secrets
+import tempfile
+import threading
+import time
+from database.db import db
+from logger import get_logger
+
+log = get_logger(__name__)
+
+# Root of the attachment store: objects/ holds finished files, partial/ in-progress uploads
+UPLOAD_DIR = os.getenv('UPLOAD_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads'))
+MAX_UPLOAD_BYTES = int(os.getenv('MAX_UPLOAD_BYTES', str(50 * 1024 * 1024)))
+# Bytes read from the request per iteration; also the chunk size suggested to resumable clients
+UPLOAD_CHUNK_BYTES = int(os.getenv('UPLOAD_CHUNK_BYTES', str(1024 * 1024)))
+# Resumable uploads untouched for this long are discarded
+UPLOAD_SESSION_TTL = float(os.getenv('UPLOAD_SESSION_TTL', str(24 * 3600)))
+UPLOAD_SWEEP_INTERVAL = float(os.getenv('UPLOAD_SWEEP_INTERVAL', '300'))
+# ATTACHMENT rows kept in memory; a row never changes under its hash
+ATTACHMENT_META_CACHE = int(os.getenv('ATTACHMENT_META_CACHE', '20000'))
+
+_FILE_HASH = re.compile(r'^[0-9a-f]{64}$')
+_UPLOAD_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+def is_file_hash(value):
+    return isinstance(value, str) and bool(_FILE_HASH.match(value))
+
+
+def clean_name(name):
+    """Original file name as shown to users: no directories, bounded length"""
+    name = os.path.basename((name or '').replace('\\', '/')).strip()
+    return name[:255] or 'file'
+
+
+def guess_type(name, declared=None):
+    if declared and declared != 'application/octet-stream':
+        return declared[:100]
+    return mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+
+def file_category(mime_type):
+    """Dashboard category for a MIME type: images, video, audio, archives or documents"""
+    if mime_type.startswith(('image/', 'video/', 'audio/')):
+        return {'image': 'images', 'video': 'video', 'audio': 'audio'}[mime_type.split('/', 1)[0]]
+    if any(kind in mime_type for kind in ('zip', 'rar', 'tar', '7z', 'gzip', 'compressed')):
+        return 'archives'
+    return 'documents'
+
+
+def download_url(file_hash):
+    return f'/api/files/download/{file_hash}'
+
+
+def thumbnail_url(file_hash):
+    return f'/api/files/thumbnail/{file_hash}'
+
+
+def attachment_fields(row):
+    """attachment_* payload fields of a message row prepared by attach_metadata()"""
+    if not row.get('attachment_path'):
+        return {}
+    fields = {
+        'attachment_name': row.get('attachment_name'),
+        'attachment_type': row.get('attachment_type'),
+        'attachment_size': row.get('attachment_size')
+    }
+    # Image attachments, once their preview has been generated
+    if row.get('thumbnail_url'):
+        fields['thumbnail_url'] = row['thumbnail_url']
+        fields['attachment_width'] = row.get('attachment_width')
+        fields['attachment_height'] = row.get('attachment_height')
+    return fields
+
+
+def copy_stream(stream, write, chunk_size=UPLOAD_CHUNK_BYTES):
+    """Feed a request stream to write() chunk by chunk; returns the bytes copied"""
+    copied = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return copied
+        write(chunk)
+        copied += len(chunk)
+
+
+class UploadRejected(Exception):
+    """An upload the client must fix or retry; carries the HTTP status and extra response fields"""
+
+    def __init__(self, error, status=400, **extra):
+        super().__init__(error)
+        self.error = error
+        self.status = status
+        self.extra = extra
+
+
+class HashingWriter:
+    """Temp file in the store that SHA-256 hashes every byte on its way to disk.
+
+    Also usable as a werkzeug stream_factory target, which writes the part
+    and then seeks back to 0.
+    """
+
+    def __init__(self, directory, limit=MAX_UPLOAD_BYTES):
+        fd, self.path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        self._file = os.fdopen(fd, 'w+b')
+        self._hash = hashlib.sha256()
+        self.size = 0
+        self.limit = limit
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.limit:
+            raise UploadRejected('File too large', 413, max_bytes=self.limit)
+        self._hash.update(data)
+        return self._file.write(data)
+
+    def seek(self, offset, whence=0):
+        return self._file.seek(offset, whence)
+
+    def tell(self):
+        return self._file.tell()
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+    def close(self):
+        self._file.close()
+
+    def discard(self):
+        self._file.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class _UploadSession:
+    __slots__ = ('upload_id', 'user_id', 'name', 'mime_type', 'size', 'offset', 'hasher', 'lock')
+
+    def __init__(self, upload_id, user_id, name, mime_type, size):
+        self.upload_id = upload_id
+        self.user_id = user_id
+        self.name = name
+        self.mime_type = mime_type
+        self.size = size
+        self.offset = 0
+        self.hasher = hashlib.sha256()
+        self.lock = threading.Lock()
+
+
+# =====================================================
+# ATTACHMENT STORE
+# =====================================================
+class AttachmentStore:
+    """Content-addressed file store for message attachments.
+
+    Uploads are streamed to a temp file while being hashed and then renamed
+    to objects/<aa>/<sha256>; a file whose hash is already stored is dropped
+    and the existing object reused. MESSAGE.attachment_path holds the hash,
+    ATTACHMENT holds size, type and the first uploader's file name.
+
+    Resumable uploads append chunks to partial/<upload_id>.part at the offset
+    the server reports; the session (.json next to it) survives restarts.
+    """
+
+    def __init__(self, root=UPLOAD_DIR, max_bytes=MAX_UPLOAD_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.objects_dir = os.path.join(root, 'objects')
+        self.thumbs_dir = os.path.join(root, 'thumbs')
+        self.partial_dir = os.path.join(root, 'partial')
+        self._lock = threading.Lock()
+        self._sessions = {}  # upload_id -> _UploadSession
+        self._ready = False
+        self._swept_at = 0.0
+        self._meta = {}  # file_hash -> ATTACHMENT row
+
+    def _ensure_dirs(self):
+        if not self._ready:
+            os.makedirs(self.objects_dir, exist_ok=True)
+            os.makedirs(self.partial_dir, exist_ok=True)
+            self._ready = True
+
+    def path_for(self, file_hash):
+        return os.path.join(self.objects_dir, file_hash[:2], file_hash)
+
+    def thumbnail_path(self, file_hash):
+        return os.path.join(self.thumbs_dir, file_hash[:2], f'{file_hash}.jpg')
+
+    def writer(self):
+        """New HashingWriter for a one-shot upload; commit() or discard() it"""
+        self._ensure_dirs()
+        return HashingWriter(self.partial_dir, self.max_bytes)
+
+    # -------------------------------------------------
+    # Finished files
+    # -------------------------------------------------
+    def commit(self, writer, name, mime_type, user_id):
+        """Move a fully written upload into the store; returns its file info"""
+        writer.close()
+        if writer.size == 0:
+            writer.discard()
+            raise UploadRejected('Empty file')
+        return self._store(writer.path, writer.hexdigest(), writer.size, name, mime_type, user_id)
+
+    def _store(self, temp_path, file_hash, size, name, mime_type, user_id):
+        name = clean_name(name)
+        mime_type = guess_type(name, mime_type)
+        target = self.path_for(file_hash)
+        deduplicated = os.path.exists(target)
+        if deduplicated:
+            os.unlink(temp_path)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            # Readable by a front proxy serving the store directly
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, target)
+
+        meta = self.describe(file_hash)
+        if meta is None:
+            insert_query = """
+                INSERT INTO ATTACHMENT (file_hash, size, mime_type, original_name, uploaded_by, created_at)
+                VALUES (%s, %s, %s, %s, %s, NOW())
+            """
+            # A concurrent upload of the same bytes may win the insert; its row is just as good
+            if not db.execute_update(insert_query, (file_hash, size, mime_type, name, user_id)):
+                meta = self.describe(file_hash)
+                if meta is None:
+                    raise UploadRejected('Failed to record file', 500)
+        self._record_uploader(file_hash, user_id)
+
+        # Whether the bytes were already stored stays server-side: it would reveal other users' files
+        log.info("attachments.stored", file_hash=file_hash, size=size, deduplicated=deduplicated)
+        return {
+            'filename': file_hash,
+            'original_name': name,
+            'type': file_category(mime_type),
+            'mime_type': mime_type,
+            'size': size,
+            'url': download_url(file_hash)
+        }
+
+    def _record_uploader(self, file_hash, user_id):
+        if self._is_uploader(file_hash, user_id):
+            return
+        insert_query = "INSERT INTO ATTACHMENTUPLOADER (file_hash, user_id) VALUES (%s, %s)"
+        # A concurrent upload of the same bytes by the same user may have inserted it first
+        if not db.execute_update(insert_query, (file_hash, user_id)) and not self._is_uploader(file_hash, user_id):
+            raise UploadRejected('Failed to record file', 500)
+
+    def _is_uploader(self, file_hash, user_id):
+        query = "SELECT user_id FROM ATTACHMENTUPLOADER WHERE file_hash = %s AND user_id = %s"
+        return bool(db.execute_query(query, (file_hash, user_id)))
+
+    def describe(self, file_hash):
+        """ATTACHMENT row for a hash, or None if unknown (or not a hash at all)"""
+        if not is_file_hash(file_hash):
+            return None
+        return self.describe_many([file_hash]).get(file_hash)
+
+    def describe_many(self, file_hashes):
+        """{file_hash: ATTACHMENT row} for the known hashes; misses cost one query"""
+        found = {}
+        with self._lock:
+            missing = []
+            for file_hash in set(file_hashes):
+                meta = self._meta.get(file_hash)
+                if meta is None:
+                    missing.append(file_hash)
+                else:
+                    found[file_hash] = meta
+        if not missing:
+            return found
+
+        placeholders = ', '.join(['%s'] * len(missing))
+        query = f"""
+            SELECT file_hash, size, mime_type, original_name, uploaded_by, width, height, thumbnail, created_at
+            FROM ATTACHMENT
+            WHERE file_hash IN ({placeholders})
+        """
+        loaded = {row['file_hash']: row for row in db.execute_query(query, tuple(missing)) or []}
+        with self._lock:
+            self._meta.update(loaded)
+            while len(self._meta) > ATTACHMENT_META_CACHE:
+                del self._meta[next(iter(self._meta))]
+        found.update(loaded)
+        return found
+
+    def attach_metadata(self, rows):
+        """Set attachment_name/type/size on every row that carries an attachment, in place"""
+        metas = self.describe_many([row['attachment_path'] for row in rows if row.get('attachment_path')])
+        for row in rows:
+            meta = metas.get(row.get('attachment_path'))
+            if meta is not None:
+                row['attachment_name'] = meta['original_name']
+                row['attachment_type'] = file_category(meta['mime_type'])
+                row['attachment_size'] = meta['size']
+                if meta['thumbnail']:
+                    row['thumbnail_url'] = thumbnail_url(meta['file_hash'])
+                    row['attachment_width'] = meta['width']
+                    row['attachment_height'] = meta['height']
+        return rows
+
+    def forget(self, file_hash):
+        """Drop a cached ATTACHMENT row after it was updated"""
+        with self._lock:
+            self._meta.pop(file_hash, None)
+
+    def readable(self, file_hash, user_id):
+        """ATTACHMENT row if user_id may read (and so attach) the file, else None"""
+        meta = self.describe(file_hash)
+        if meta is None or not self.can_access(file_hash, user_id, meta):
+            return None
+        return meta
+
+    def can_access(self, file_hash, user_id, meta):
+        """An uploader, or a participant of a conversation with a live or archived message carrying the file"""
+        if meta.get('uploaded_by') == user_id or self._is_uploader(file_hash, user_id):
+            return True
+        query = """
+            SELECT m.msg_id
+            FROM MESSAGE m
+            JOIN CONVERSATION_PARTICIPANT cp ON cp.conversation_id = m.conv_id AND cp.user_id = %s
+            WHERE m.attachment_path = %s AND m.deleted = FALSE
+            LIMIT 1
+        """
+        if db.execute_query(query, (user_id, file_hash)):
+            return True
+        archived_query = """
+            SELECT aa.conv_id
+            FROM ARCHIVEATTACHMENT aa
+            JOIN CONVERSATION_PARTICIPANT cp ON cp.conversation_id = aa.conv_id AND cp.user_id = %s
+            WHERE aa.file_hash = %s
+            LIMIT 1
+        """
+        return bool(db.execute_query(archived_query, (user_id, file_hash)))
+
+    # -------------------------------------------------
+    # Resumable uploads
+    # -------------------------------------------------
+    def _partial_path(self, upload_id, suffix):
+        return os.path.join(self.partial_dir, f'{upload_id}.{suffix}')
+
+    def start_upload(self, user_id, name, size, mime_type=None):
+        if not isinstance(size, int) or size <= 0:
+            raise UploadRejected('File size required')
+        if size > self.max_bytes:
+            raise UploadRejected('File too large', 413, max_bytes=self.max_bytes)
+        self._ensure_dirs()
+        if time.time() - self._swept_at >= UPLOAD_SWEEP_INTERVAL:
+            self.expire_uploads()
+
+        name = clean_name(name)
+        upload = _UploadSession(secrets.token_hex(16), user_id, name, guess_type(name, mime_type), size)
+        open(self._partial_path(upload.upload_id, 'part'), 'wb').close()
+        with open(self._partial_path(upload.upload_id, 'json'), 'w') as meta:
+            json.dump({'user_id': user_id, 'name': upload.name, 'mime_type': upload.mime_type, 'size': size}, meta)
+        with self._lock:
+            self._sessions[upload.upload_id] = upload
+        log.debug("attachments.upload_started", upload_id=upload.upload_id, user_id=user_id, size=size)
+        return upload
+
+    def get_upload(self, upload_id, user_id):
+        """The caller's upload session, reloaded from disk after a restart; None if unknown"""
+        if not isinstance(upload_id, str) or not _UPLOAD_ID.match(upload_id):
+            return None
+        with self._lock:
+            upload = self._sessions.get(upload_id)
+        if upload is None:
+            upload = self._reload(upload_id)
+        if upload is None or upload.user_id != user_id:
+            return None
+        return upload
+
+    def _reload(self, upload_id):
+        try:
+            with open(self._partial_path(upload_id, 'json')) as meta_file:
+                meta = json.load(meta_file)
+            part_path = self._partial_path(upload_id, 'part')
+            upload = _UploadSession(upload_id, meta['user_id'], meta['name'], meta['mime_type'], meta['size'])
+            # The hash state is not persisted; replay what is already on disk
+            with open(part_path, 'rb') as part:
+                upload.offset = copy_stream(part, upload.hasher.update)
+        except (OSError, ValueError, KeyError):
+            return None
+        with self._lock:
+            return self._sessions.setdefault(upload_id, upload)
+
+    def append_chunk(self, upload, offset, stream, length=None):
+        """Append a request body at offset; returns file info once the last byte arrives"""
+        if not upload.lock.acquire(blocking=False):
+            raise UploadRejected('Upload busy', 409, offset=upload.offset)
+        try:
+            if offset != upload.offset:
+                raise UploadRejected('Offset mismatch', 409, offset=upload.offset)
+            if length is not None and offset + length > upload.size:
+                raise UploadRejected('Chunk exceeds declared size', 400, offset=upload.offset)
+
+            part_path = self._partial_path(upload.upload_id, 'part')
+            with open(part_path, 'r+b') as part:
+                part.seek(upload.offset)
+                try:
+                    def write(chunk):
+                        if upload.offset + len(chunk) > upload.size:
+                            raise UploadRejected('Chunk exceeds declared size', 400, offset=upload.offset)
+                        part.write(chunk)
+                        upload.hasher.update(chunk)
+                        upload.offset += len(chunk)
+                    copy_stream(stream, write)
+                finally:
+                    # Drop anything written past the last chunk that made it into the hash
+                    part.truncate(upload.offset)
+
+            if upload.offset < upload.size:
+                return None
+            info = self._store(part_path, upload.hasher.hexdigest(), upload.size,
+                               upload.name, upload.mime_type, upload.user_id)
+            self._forget(upload.upload_id)
+            return info
+        finally:
+            upload.lock.release()
+
+    def cancel_upload(self, upload):
+        self._forget(upload.upload_id)
+        try:
+            os.unlink(self._partial_path(upload.upload_id, 'part'))
+        except FileNotFoundError:
+            pass
+
+    def _forget(self, upload_id):
+        with self._lock:
+            self._sessions.pop(upload_id, None)
+        try:
+            os.unlink(self._partial_path(upload_id, 'json'))
+        except FileNotFoundError:
+            pass
+
+    def expire_uploads(self, now=None):
+        """Delete resumable uploads and stray temp files untouched for UPLOAD_SESSION_TTL"""
+        now = time.time() if now is None else now
+        self._swept_at = now
+        expired = 0
+        try:
+            entries = list(os.scandir(self.partial_dir))
+        except FileNotFoundError:
+            return 0
+        for entry in entries:
+            # A session's .json is removed with its .part, whose mtime tracks the last chunk
+            if entry.name.endswith('.json'):
+                continue
+            try:
+                if now - entry.stat().st_mtime < UPLOAD_SESSION_TTL:
+                    continue
+                os.unlink(entry.path)
+            except FileNotFoundError:
+                continue
+            if entry.name.endswith('.part'):
+                self._forget(entry.name[:-len('.part')])
+            expired += 1
+        if expired:
+            log.info("attachments.uploads_expired", files=expired)
+        return expired
+
+
+attachment_store = AttachmentStore()
\ No newline at end of file
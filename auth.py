@@ -1,6 +1,8 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
 from werkzeug.security import generate_password_hash, check_password_hash
 from database.db import db
+from etags import bump_contact_lists_of
+from profiles import user_profiles
 import re
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
@@ -116,6 +118,8 @@ def login():
         # Update user status to online
         query = "UPDATE USER SET status = %s, last_active = NOW() WHERE user_id = %s"
         db.execute_update(query, ('online', user['user_id']))
+        user_profiles.set_status(user['user_id'], 'online')
+        bump_contact_lists_of(user['user_id'])
         
         # Create session
         session['user_id'] = user['user_id']
@@ -138,6 +142,8 @@ def logout():
         user_id = session['user_id']
         query = "UPDATE USER SET status = %s WHERE user_id = %s"
         db.execute_update(query, ('offline', user_id))
+        user_profiles.set_status(user_id, 'offline')
+        bump_contact_lists_of(user_id)
     
     # Clear session
     session.clear()
@@ -0,0 +1,362 @@
+"""End-to-end HTTP + Socket.IO load test for ChatFlow.
+
+Seeds users, contacts and groups, starts the app locally (SQLite backend by
+default, so no MySQL server is needed), then drives concurrent simulated
+clients through the python-socketio client and records per-operation
+throughput and latency percentiles as JSON.
+
+    python benchmark.py --users 50 --clients 20 --duration 30 --output bench.json
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+# Operation mix: name -> relative weight
+DEFAULT_MIX = {
+    'send_message': 30,
+    'send_group_message': 15,
+    'typing': 25,
+    'mark_read': 10,
+    'history': 12,
+    'group_history': 8,
+}
+
+PASSWORD = 'benchmark-password'
+
+
+# =====================================================
+# ARGUMENTS
+# =====================================================
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='ChatFlow end-to-end load test')
+    parser.add_argument('--users', type=int, default=50, help='number of seeded users')
+    parser.add_argument('--contacts', type=int, default=10, help='contacts per user')
+    parser.add_argument('--groups', type=int, default=10, help='number of seeded groups')
+    parser.add_argument('--group-size', type=int, default=10, help='members per group')
+    parser.add_argument('--clients', type=int, default=20, help='concurrent simulated clients')
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds each client runs')
+    parser.add_argument('--think-time', type=float, default=0.0, help='pause between operations (seconds)')
+    parser.add_argument('--transport', choices=['websocket', 'polling'], default='websocket')
+    parser.add_argument('--url', help='target an already running server instead of starting one')
+    parser.add_argument('--port', type=int, default=0, help='port for the local server (0 = pick a free one)')
+    parser.add_argument('--sqlite-path', help='SQLite file for the local server (default: temp file)')
+    parser.add_argument('--seed', type=int, default=1, help='random seed for data and operation choice')
+    parser.add_argument('--output', help='write JSON results to this file (default: stdout)')
+    return parser.parse_args(argv)
+
+
+# =====================================================
+# LOCAL SERVER
+# =====================================================
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port):
+    """Run the app with Socket.IO in a daemon thread and wait until it listens"""
+    from app import app, socketio
+
+    thread = threading.Thread(
+        target=socketio.run,
+        args=(app,),
+        kwargs={
+            'host': '127.0.0.1',
+            'port': port,
+            'debug': False,
+            'use_reloader': False,
+            'log_output': False,
+            'allow_unsafe_werkzeug': True,
+        },
+        daemon=True
+    )
+    thread.start()
+
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return f'http://127.0.0.1:{port}'
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'server did not start on port {port}')
+
+
+# =====================================================
+# SEEDING
+# =====================================================
+def seed(db, args, rng):
+    """Create benchmark users, contact edges and groups; return their ids"""
+    from werkzeug.security import generate_password_hash
+
+    tag = f'{int(time.time())}_{args.seed}'
+    password_hash = generate_password_hash(PASSWORD)
+
+    users = []
+    for i in range(args.users):
+        username = f'bench_{tag}_{i}'
+        db.execute_update(
+            "INSERT INTO USER (username, email, password_hash, status) VALUES (%s, %s, %s, 'offline')",
+            (username, f'{username}@bench.local', password_hash)
+        )
+        users.append({'user_id': db.get_insert_id(), 'username': username})
+
+    contacts = defaultdict(set)
+    for user in users:
+        others = [u['user_id'] for u in users if u['user_id'] != user['user_id']]
+        for contact_id in rng.sample(others, min(args.contacts, len(others))):
+            for a, b in ((user['user_id'], contact_id), (contact_id, user['user_id'])):
+                if b not in contacts[a]:
+                    db.execute_update(
+                        "INSERT INTO USERCONTACT (user_id, contact_user_id, added_at) VALUES (%s, %s, NOW())",
+                        (a, b)
+                    )
+                    contacts[a].add(b)
+
+    groups = defaultdict(list)
+    for g in range(args.groups):
+        members = rng.sample(users, min(args.group_size, len(users)))
+        creator = members[0]['user_id']
+        db.execute_update(
+            "INSERT INTO CONVERSATION (type, name, created_by, privacy_settings) VALUES ('group', %s, %s, 'private')",
+            (f'bench group {g}', creator)
+        )
+        group_id = db.get_insert_id()
+        for member in members:
+            role = 'admin' if member['user_id'] == creator else 'member'
+            db.execute_update(
+                "INSERT INTO CONVERSATION_PARTICIPANT (conversation_id, user_id, role) VALUES (%s, %s, %s)",
+                (group_id, member['user_id'], role)
+            )
+            groups[member['user_id']].append(group_id)
+
+    return users, contacts, groups
+
+
+# =====================================================
+# RESULTS
+# =====================================================
+class Recorder:
+    """Thread-safe collection of (operation, latency, ok) samples"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, op, seconds, ok=True):
+        with self.lock:
+            if ok:
+                self.samples[op].append(seconds)
+            else:
+                self.errors[op] += 1
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(recorder, elapsed):
+    operations = {}
+    total = 0
+    for op in sorted(set(recorder.samples) | set(recorder.errors)):
+        values = sorted(recorder.samples.get(op, []))
+        total += len(values)
+        operations[op] = {
+            'count': len(values),
+            'errors': recorder.errors.get(op, 0),
+            'throughput_per_s': round(len(values) / elapsed, 2) if elapsed else None,
+            'mean_ms': round(sum(values) / len(values) * 1000, 3) if values else None,
+            'p50_ms': round(percentile(values, 50) * 1000, 3) if values else None,
+            'p95_ms': round(percentile(values, 95) * 1000, 3) if values else None,
+            'p99_ms': round(percentile(values, 99) * 1000, 3) if values else None,
+            'max_ms': round(values[-1] * 1000, 3) if values else None,
+        }
+    return {
+        'elapsed_s': round(elapsed, 3),
+        'total_ops': total,
+        'throughput_per_s': round(total / elapsed, 2) if elapsed else None,
+        'operations': operations,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# =====================================================
+# SIMULATED CLIENT
+# =====================================================
+class SimulatedClient(threading.Thread):
+    """One logged-in user: an HTTP session plus a Socket.IO connection"""
+
+    def __init__(self, base_url, user, contacts, groups, args, recorder, rng_seed):
+        super().__init__(daemon=True)
+        self.base_url = base_url
+        self.user = user
+        self.contacts = sorted(contacts)
+        self.groups = groups
+        self.args = args
+        self.recorder = recorder
+        self.rng = random.Random(rng_seed)
+        self.mix = {op: weight for op, weight in DEFAULT_MIX.items() if self._available(op)}
+
+    def _available(self, op):
+        if op in ('send_group_message', 'group_history'):
+            return bool(self.groups)
+        return bool(self.contacts)
+
+    def _timed(self, op, fn):
+        start = time.perf_counter()
+        try:
+            ok = fn() is not False
+        except Exception:
+            ok = False
+        self.recorder.record(op, time.perf_counter() - start, ok)
+
+    def run(self):
+        import requests
+        import socketio
+
+        user_id = self.user['user_id']
+        http = requests.Session()
+
+        def login():
+            response = http.post(f'{self.base_url}/auth/login', data={
+                'username_or_email': self.user['username'],
+                'password': PASSWORD
+            }, allow_redirects=False)
+            return response.status_code == 302 and 'session' in http.cookies
+
+        self._timed('login', login)
+
+        sio = socketio.Client(reconnection=False, http_session=http)
+
+        def connect():
+            sio.connect(f'{self.base_url}?user_id={user_id}', transports=[self.args.transport], wait_timeout=10)
+
+        self._timed('connect', connect)
+        if not sio.connected:
+            return
+
+        ops = list(self.mix)
+        weights = [self.mix[op] for op in ops]
+        deadline = time.time() + self.args.duration
+
+        try:
+            while time.time() < deadline and ops:
+                op = self.rng.choices(ops, weights)[0]
+                self._timed(op, lambda: self._run_op(op, sio, http))
+                if self.args.think_time:
+                    time.sleep(self.args.think_time)
+        finally:
+            sio.disconnect()
+
+    def _run_op(self, op, sio, http):
+        user_id = self.user['user_id']
+        # Socket events are sent with an ack so latency covers the full server handler
+        if op == 'send_message':
+            sio.call('send_message', {
+                'sender_id': user_id,
+                'receiver_id': self.rng.choice(self.contacts),
+                'content': f'bench message {self.rng.random():.6f}'
+            }, timeout=30)
+        elif op == 'send_group_message':
+            sio.call('send_group_message', {
+                'sender_id': user_id,
+                'group_id': self.rng.choice(self.groups),
+                'content': f'bench group message {self.rng.random():.6f}'
+            }, timeout=30)
+        elif op == 'typing':
+            sio.call('typing', {
+                'sender_id': user_id,
+                'receiver_id': self.rng.choice(self.contacts),
+                'is_typing': self.rng.random() < 0.5
+            }, timeout=30)
+        elif op == 'mark_read':
+            sio.call('mark_read', {
+                'user_id': user_id,
+                'contact_id': self.rng.choice(self.contacts)
+            }, timeout=30)
+        elif op == 'history':
+            response = http.get(f'{self.base_url}/api/messages/history/{self.rng.choice(self.contacts)}')
+            return response.status_code == 200
+        elif op == 'group_history':
+            response = http.get(f'{self.base_url}/api/groups/{self.rng.choice(self.groups)}/messages')
+            return response.status_code == 200
+
+
+# =====================================================
+# MAIN
+# =====================================================
+def main(argv=None):
+    args = parse_args(argv)
+    rng = random.Random(args.seed)
+
+    if not args.url:
+        # The database module picks its backend at import time
+        os.environ.setdefault('DB_BACKEND', 'sqlite')
+        if os.environ['DB_BACKEND'] == 'sqlite':
+            os.environ['SQLITE_PATH'] = args.sqlite_path or os.path.join(
+                tempfile.mkdtemp(prefix='chatflow-bench-'), 'bench.db')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    from database.db import db
+
+    users, contacts, groups = seed(db, args, rng)
+    base_url = args.url or start_server(args.port or free_port())
+
+    recorder = Recorder()
+    clients = [
+        SimulatedClient(base_url, user, contacts[user['user_id']], groups[user['user_id']],
+                        args, recorder, args.seed * 100003 + i)
+        for i, user in enumerate(users[:args.clients])
+    ]
+
+    start = time.perf_counter()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.perf_counter() - start
+
+    results = {
+        'meta': {
+            'revision': git_revision(),
+            'backend': getattr(db, 'backend', None),
+            'started_server': not args.url,
+            'python': sys.version.split()[0],
+            'config': vars(args),
+        },
+        **summarize(recorder, elapsed),
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,82 @@
+from flask import Blueprint, jsonify, session
+from database.db import db
+from routes.auth import login_required
+from routes.contacts import load_contacts
+from routes.groups import load_user_groups
+from socketio_events import online_users
+from unread import unread_counters
+from logger import get_logger
+
+log = get_logger(__name__)
+
+bootstrap_bp = Blueprint('bootstrap', __name__, url_prefix='/api/bootstrap')
+
+RECENT_CONVERSATIONS_LIMIT = 20
+
+# =====================================================
+# QUERIES
+# =====================================================
+def unread_per_sender(user_id):
+    """Unread direct-message counts keyed by sender"""
+    return unread_counters.per_sender(user_id)
+
+
+def recent_conversations(user_id, limit=RECENT_CONVERSATIONS_LIMIT):
+    """Most recently active direct conversations with the other participant"""
+    query = """
+        SELECT c.conv_id, c.last_message_at, u.user_id as contact_id, u.username as contact_username
+        FROM CONVERSATION_PARTICIPANT cp1
+        JOIN CONVERSATION c ON c.conv_id = cp1.conversation_id
+        JOIN CONVERSATION_PARTICIPANT cp2 ON cp2.conversation_id = cp1.conversation_id
+                                          AND cp2.user_id != cp1.user_id
+        JOIN USER u ON u.user_id = cp2.user_id
+        WHERE cp1.user_id = %s AND c.type = 'direct' AND c.last_message_at IS NOT NULL
+        ORDER BY c.last_message_at DESC
+        LIMIT %s
+    """
+    rows = db.execute_query(query, (user_id, limit)) or []
+    return [{
+        'conv_id': row['conv_id'],
+        'contact_id': row['contact_id'],
+        'contact_username': row['contact_username'],
+        'last_message_at': row['last_message_at'].isoformat() if row['last_message_at'] else None
+    } for row in rows]
+
+
+# =====================================================
+# DASHBOARD BOOTSTRAP
+# =====================================================
+@bootstrap_bp.route('', methods=['GET'])
+@login_required
+def bootstrap():
+    """Everything the dashboard needs on load in one response"""
+    try:
+        current_user_id = session.get('user_id')
+
+        contacts = load_contacts(current_user_id)
+        unread = unread_per_sender(current_user_id)
+
+        # Presence comes from the live socket map, not the possibly stale USER.status
+        for contact in contacts:
+            contact['status'] = 'online' if contact['user_id'] in online_users else 'offline'
+            contact['unread_count'] = unread.get(contact['user_id'], 0)
+
+        response = {
+            'user': {
+                'user_id': current_user_id,
+                'username': session.get('username')
+            },
+            'contacts': contacts,
+            'groups': load_user_groups(current_user_id),
+            'unread': unread,
+            'recent_conversations': recent_conversations(current_user_id),
+            'online_users': list(online_users.keys())
+        }
+
+        log.debug("bootstrap.served", user_id=current_user_id, contacts=len(contacts),
+                  groups=len(response['groups']))
+        return jsonify(response)
+
+    except Exception as e:
+        log.exception("bootstrap.bootstrap_failed")
+        return jsonify({'success': False, 'error': str(e)}), 500
\ No newline at end of file
@@ -800,6 +800,88 @@ UNION ALL
 SELECT 'Messages Linked to Conversations', COUNT(*) FROM MESSAGE WHERE conv_id IS NOT NULL
 UNION ALL
 SELECT 'Orphan Messages (no conv_id)', COUNT(*) FROM MESSAGE WHERE conv_id IS NULL;
+
+
+-- ============================================
+-- DELTA SYNC CHANGE LOG
+-- ============================================
+
+-- One row per message change; change_id is the /api/sync cursor.
+-- 'read' rows cover every message in conv_id addressed to user_id.
+CREATE TABLE IF NOT EXISTS MESSAGECHANGELOG (
+    change_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    conv_id INT NOT NULL,
+    msg_id INT NULL,
+    user_id INT NOT NULL,
+    change_type ENUM('new', 'edit', 'delete', 'status', 'read') NOT NULL,
+    changed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (conv_id) REFERENCES CONVERSATION(conv_id) ON DELETE CASCADE,
+    INDEX idx_changelog_conv (conv_id, change_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+
+-- ============================================
+-- ATTACHMENT STORE
+-- ============================================
+
+-- One row per distinct file content. MESSAGE.attachment_path holds the
+-- SHA-256 hash; the bytes live under uploads/objects/ on disk. Images get
+-- width/height and thumbnail = TRUE once uploads/thumbs/ has their preview.
+CREATE TABLE IF NOT EXISTS ATTACHMENT (
+    file_hash CHAR(64) PRIMARY KEY,
+    size BIGINT NOT NULL,
+    mime_type VARCHAR(100) NOT NULL,
+    original_name VARCHAR(255) NOT NULL,
+    uploaded_by INT NULL,
+    width INT NULL,
+    height INT NULL,
+    thumbnail BOOLEAN DEFAULT FALSE,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (uploaded_by) REFERENCES USER(user_id) ON DELETE SET NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Everyone who uploaded the content, not just the first; they may attach it
+CREATE TABLE IF NOT EXISTS ATTACHMENTUPLOADER (
+    file_hash CHAR(64) NOT NULL,
+    user_id INT NOT NULL,
+    PRIMARY KEY (file_hash, user_id),
+    FOREIGN KEY (file_hash) REFERENCES ATTACHMENT(file_hash) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES USER(user_id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Download authorization looks up messages carrying a given file
+CREATE INDEX idx_message_attachment ON MESSAGE(attachment_path);
+
+
+-- ============================================
+-- MESSAGE ARCHIVE
+-- ============================================
+
+-- Offset index of archive/<xx>/<conv_id>.seg: one row per zlib-compressed
+-- segment of old messages moved out of MESSAGE, in conversation order.
+CREATE TABLE IF NOT EXISTS ARCHIVESEGMENT (
+    segment_id INT AUTO_INCREMENT PRIMARY KEY,
+    conv_id INT NOT NULL,
+    file_offset BIGINT NOT NULL,
+    byte_length INT NOT NULL,
+    message_count INT NOT NULL,
+    first_msg_id INT NOT NULL,
+    last_msg_id INT NOT NULL,
+    first_at DATETIME NOT NULL,
+    last_at DATETIME NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (conv_id) REFERENCES CONVERSATION(conv_id) ON DELETE CASCADE,
+    INDEX idx_archive_conv (conv_id, segment_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Attachments of archived messages, per conversation, for download authorization
+CREATE TABLE IF NOT EXISTS ARCHIVEATTACHMENT (
+    file_hash CHAR(64) NOT NULL,
+    conv_id INT NOT NULL,
+    PRIMARY KEY (file_hash, conv_id),
+    FOREIGN KEY (conv_id) REFERENCES CONVERSATION(conv_id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
 ```
 
 ---
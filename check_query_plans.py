@@ -0,0 +1,282 @@
+"""Query plan regression check for every SQL statement in the route modules.
+
+Extracts the SQL string literals from the route and socket modules, runs
+EXPLAIN on each against a seeded database and fails when a statement does
+a full scan or a filesort over one of the large tables. f-string SQL built
+from generated placeholder lists (IN lists, multi-row VALUES) is rendered
+with SAMPLE_PLACEHOLDERS entries first; one that cannot be rendered is a
+failure too. Exits non-zero on any violation so it can gate CI.
+
+    python check_query_plans.py                 # SQLite temp DB, seeded automatically
+    DB_BACKEND=mysql python check_query_plans.py  # against an existing seeded MySQL
+"""
+import argparse
+import ast
+import importlib
+import inspect
+import os
+import re
+import sys
+import tempfile
+
+MODULES = (
+    'routes.auth',
+    'routes.contacts',
+    'routes.messages',
+    'routes.groups',
+    'routes.sync',
+    'routes.bootstrap',
+    'socketio_events',
+    'etags',
+    'membership',
+    'profiles',
+    'unread',
+    'delivery',
+    'attachments',
+    'thumbnails',
+    'archive',
+    'purge',
+)
+
+# Entries per generated placeholder list when rendering f-string SQL
+SAMPLE_PLACEHOLDERS = 3
+
+# Tables that grow without bound; scanning or sorting them per request is a bug
+WATCHED_TABLES = {'MESSAGE', 'CONVERSATION_PARTICIPANT', 'MESSAGECHANGELOG'}
+
+# (module, function, problem) -> why it is acceptable
+ALLOWED = {
+    ('routes.groups', 'load_user_groups', 'filesort'):
+        "sorts one user's groups by recency; bounded by that user's memberships",
+    ('routes.groups', 'get_group_details', 'filesort'):
+        "sorts one group's member list; bounded by group size",
+    ('routes.sync', 'sync', 'filesort'):
+        "sorts only changes newer than the client's cursor in the user's conversations",
+    ('routes.bootstrap', 'recent_conversations', 'filesort'):
+        "sorts one user's direct conversations by recency; bounded by that user's memberships",
+    ('purge', 'run_cycle', 'full scan'):
+        "reads the first chunk of the log in primary-key order; LIMIT stops the scan",
+}
+
+SQL_START = re.compile(r'^\s*(SELECT|UPDATE|DELETE|INSERT)\b')
+SQL_SHAPE = re.compile(r'^\s*(SELECT\b.*\bFROM\b|UPDATE\s+\w+\s+SET\b|DELETE\s+FROM\b|INSERT\s+INTO\b)', re.DOTALL)
+TABLE_REF = re.compile(
+    r'\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(?!WHERE|ON|SET|JOIN|LEFT|INNER|ORDER|GROUP|LIMIT|VALUES)(\w+))?',
+    re.IGNORECASE
+)
+
+
+# =====================================================
+# EXTRACTION
+# =====================================================
+class Statement:
+    def __init__(self, module, function, line, sql):
+        self.module = module
+        self.function = function
+        self.line = line
+        self.sql = sql
+
+    @property
+    def kind(self):
+        return SQL_START.match(self.sql).group(1).upper()
+
+    def aliases(self):
+        """Map every alias (and bare table name) used in the statement to its table"""
+        mapping = {}
+        for table, alias in TABLE_REF.findall(self.sql):
+            mapping[table.upper()] = table.upper()
+            if alias:
+                mapping[alias.upper()] = table.upper()
+        return mapping
+
+    def __str__(self):
+        return f'{self.module}:{self.line} ({self.function})'
+
+
+def extract_statements(module_name):
+    module = importlib.import_module(module_name)
+    tree = ast.parse(inspect.getsource(module))
+    statements = []
+
+    def visit(node, function, assignments):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            function = node.name
+            assignments = {**assignments, **local_assignments(node)}
+        if isinstance(node, ast.JoinedStr):
+            literal = ''.join(value.value if isinstance(value, ast.Constant) else '{}' for value in node.values)
+            if SQL_SHAPE.match(literal):
+                sql = render_fstring(node, assignments)
+                statements.append(Statement(module_name, function, node.lineno,
+                                            ' '.join(sql.split()) if sql is not None else None))
+            return
+        if isinstance(node, ast.Constant) and isinstance(node.value, str) and SQL_SHAPE.match(node.value):
+            statements.append(Statement(module_name, function, node.lineno, ' '.join(node.value.split())))
+        for child in ast.iter_child_nodes(node):
+            visit(child, function, assignments)
+
+    visit(tree, '<module>', {})
+    return statements
+
+
+def local_assignments(function_node):
+    """name -> value expression for the simple `name = expr` assignments in a function"""
+    return {
+        node.targets[0].id: node.value
+        for node in ast.walk(function_node)
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name)
+    }
+
+
+def sample_placeholders(expr, assignments):
+    """Render `', '.join(['%s'] * n)` (directly or through a local name) with n = SAMPLE_PLACEHOLDERS"""
+    if isinstance(expr, ast.Name) and expr.id in assignments:
+        return sample_placeholders(assignments[expr.id], assignments)
+    if (isinstance(expr, ast.Call) and isinstance(expr.func, ast.Attribute) and expr.func.attr == 'join'
+            and isinstance(expr.func.value, ast.Constant) and len(expr.args) == 1
+            and isinstance(expr.args[0], ast.BinOp) and isinstance(expr.args[0].op, ast.Mult)
+            and isinstance(expr.args[0].left, ast.List) and len(expr.args[0].left.elts) == 1
+            and isinstance(expr.args[0].left.elts[0], ast.Constant)):
+        return expr.func.value.value.join([expr.args[0].left.elts[0].value] * SAMPLE_PLACEHOLDERS)
+    return None
+
+
+def render_fstring(node, assignments):
+    """The f-string with every interpolation rendered, or None if one is not a placeholder list"""
+    parts = []
+    for value in node.values:
+        if isinstance(value, ast.Constant):
+            parts.append(value.value)
+            continue
+        rendered = sample_placeholders(value.value, assignments)
+        if rendered is None:
+            return None
+        parts.append(rendered)
+    return ''.join(parts)
+
+
+def explainable(statement):
+    # Plain INSERT ... VALUES touches no existing rows
+    return statement.kind != 'INSERT' or re.search(r'\bSELECT\b', statement.sql, re.IGNORECASE)
+
+
+# =====================================================
+# PLAN INSPECTION
+# =====================================================
+def explain(db, statement):
+    params = (1,) * statement.sql.count('%s')
+    prefix = 'EXPLAIN QUERY PLAN ' if db.backend == 'sqlite' else 'EXPLAIN '
+    rows = db.execute_query(prefix + statement.sql, params or None)
+    if rows is None:
+        raise RuntimeError(f'EXPLAIN failed for {statement}')
+    return rows
+
+
+def plan_problems(db, statement, rows):
+    """Return [(problem, table, detail)] for scans/filesorts over watched tables"""
+    aliases = statement.aliases()
+    problems = []
+
+    if db.backend == 'sqlite':
+        driving_table = None
+        for row in rows:
+            detail = row['detail']
+            match = re.match(r'(SCAN|SEARCH) (?:TABLE )?(\w+)', detail)
+            if match:
+                table = aliases.get(match.group(2).upper(), match.group(2).upper())
+                if driving_table is None:
+                    driving_table = table
+                if match.group(1) == 'SCAN' and table in WATCHED_TABLES:
+                    problems.append(('full scan', table, detail))
+            elif 'TEMP B-TREE FOR ORDER BY' in detail and driving_table in WATCHED_TABLES:
+                problems.append(('filesort', driving_table, detail))
+    else:
+        for row in rows:
+            table = aliases.get(str(row.get('table') or '').upper())
+            if table not in WATCHED_TABLES:
+                continue
+            extra = row.get('Extra') or ''
+            if row.get('type') in ('ALL', 'index'):
+                problems.append(('full scan', table, f"type={row.get('type')} {extra}".strip()))
+            if 'Using filesort' in extra:
+                problems.append(('filesort', table, extra))
+
+    return problems
+
+
+# =====================================================
+# SEEDING
+# =====================================================
+def seed(db):
+    """Populate a small, skewed dataset and collect planner statistics"""
+    import seed_data
+
+    args = seed_data.parse_args(['--users', '500', '--groups', '40', '--messages', '20000',
+                                 '--max-group-size', '200'])
+    writer = seed_data.BatchInsertWriter(db, args.batch_size)
+    generator = seed_data.DatasetGenerator(args, writer, seed_data.current_max_ids(db))
+    generator.run()
+    seed_data.update_last_message_times(db, generator.last_message_at, args.batch_size)
+    db.execute_update("ANALYZE" if db.backend == 'sqlite' else "ANALYZE TABLE MESSAGE, CONVERSATION_PARTICIPANT")
+
+
+# =====================================================
+# MAIN
+# =====================================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='EXPLAIN every route query and fail on scans/filesorts')
+    parser.add_argument('--seed', action='store_true',
+                        help='seed data before checking (always done for a fresh SQLite file)')
+    parser.add_argument('--verbose', action='store_true', help='print the plan of every statement')
+    args = parser.parse_args(argv)
+
+    fresh_sqlite = False
+    os.environ.setdefault('DB_BACKEND', 'sqlite')
+    if os.environ['DB_BACKEND'] == 'sqlite' and 'SQLITE_PATH' not in os.environ:
+        os.environ['SQLITE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='chatflow-plans-'), 'plans.db')
+        fresh_sqlite = True
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    from database.db import db
+
+    if args.seed or fresh_sqlite:
+        seed(db)
+
+    failures = 0
+    checked = 0
+    for module_name in MODULES:
+        for statement in extract_statements(module_name):
+            if statement.sql is None:
+                reason = ALLOWED.get((statement.module, statement.function, 'not rendered'))
+                if reason:
+                    if args.verbose:
+                        print(f'{statement}\n  allowed unrendered f-string: {reason}')
+                    continue
+                failures += 1
+                print(f'FAIL {statement}: f-string SQL could not be rendered for EXPLAIN')
+                continue
+            if not explainable(statement):
+                continue
+            checked += 1
+            rows = explain(db, statement)
+            if args.verbose:
+                print(f'{statement}\n  {statement.sql}')
+                for row in rows:
+                    print(f'    {row}')
+
+            for problem, table, detail in plan_problems(db, statement, rows):
+                reason = ALLOWED.get((statement.module, statement.function, problem))
+                if reason:
+                    if args.verbose:
+                        print(f'  allowed {problem} on {table}: {reason}')
+                    continue
+                failures += 1
+                print(f'FAIL {statement}: {problem} on {table}\n'
+                      f'     {detail}\n'
+                      f'     {statement.sql}')
+
+    print(f'{checked} statements checked on {db.backend}, {failures} problem(s)')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
\ No newline at end of file
@@ -1,6 +1,7 @@
 from flask import Blueprint, jsonify, request, session
 from database.db import db
 from routes.auth import login_required
+from etags import is_fresh, make_etag, not_modified, versions, with_etag
 
 contacts_bp = Blueprint('contacts', __name__, url_prefix='/api/contacts')
 
@@ -56,13 +57,8 @@ def search_users():
 # =====================================================
 # LIST ALL CONTACTS
 # =====================================================
-@contacts_bp.route('/list', methods=['GET'])
-@login_required
-def list_contacts():
-    """Get all contacts for the current user"""
-    current_user_id = session.get('user_id')
-    
-    # Get all contacts with their current status
+def load_contacts(user_id):
+    """All contacts of a user with their current status"""
     query = """
         SELECT u.user_id, u.username, u.email, u.status, u.last_active
         FROM USERCONTACT uc
@@ -71,12 +67,21 @@ def list_contacts():
         ORDER BY u.username ASC
     """
     
-    contacts = db.execute_query(query, (current_user_id,))
+    return db.execute_query(query, (user_id,)) or []
+
+
+@contacts_bp.route('/list', methods=['GET'])
+@login_required
+def list_contacts():
+    """Get all contacts for the current user"""
+    current_user_id = session.get('user_id')
     
-    if not contacts:
-        return jsonify({'contacts': []})
+    # Bumped on add/remove/block and whenever a contact's presence changes
+    etag = make_etag('contacts', current_user_id, versions.get('contacts', current_user_id))
+    if is_fresh(etag):
+        return not_modified(etag)
     
-    return jsonify({'contacts': contacts})
+    return with_etag(jsonify({'contacts': load_contacts(current_user_id)}), etag)
 
 
 # =====================================================
@@ -130,6 +135,7 @@ def add_contact():
     result = db.execute_update(insert_query, (current_user_id, contact_user_id))
     
     if result:
+        versions.bump('contacts', current_user_id)
         return jsonify({'success': True, 'message': 'Contact added successfully'})
     else:
         return jsonify({'success': False, 'error': 'Failed to add contact'}), 500
@@ -151,6 +157,7 @@ def remove_contact(contact_user_id):
     result = db.execute_update(delete_query, (current_user_id, contact_user_id))
     
     if result:
+        versions.bump('contacts', current_user_id)
         return jsonify({'success': True, 'message': 'Contact removed'})
     else:
         return jsonify({'success': False, 'error': 'Failed to remove contact'}), 500
@@ -196,6 +203,7 @@ def block_user():
         WHERE user_id = %s AND contact_user_id = %s
     """
     db.execute_update(delete_query, (current_user_id, blocked_user_id))
+    versions.bump('contacts', current_user_id)
     
     return jsonify({'success': True, 'message': 'User blocked successfully'})
 
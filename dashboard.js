@@ -10,6 +10,8 @@ let contacts = [];
 let groups = [];
 let typingTimeout = null;
 let selectedFile = null;
+let syncCursor = null;
+let lastSeq = null;
 
 // =====================================================
 // SOCKET.IO CONNECTION
@@ -23,7 +25,17 @@ function connectSocket() {
     socket.on('connect', () => {
         console.log('âœ… Connected to server');
         showAlert('Connected to server', 'success');
-        socket.emit('get_online_users');
+        if (lastSeq === null) syncChanges();
+        socket.emit('resume', { last_seq: lastSeq }, (ack) => {
+            // Gap no longer in server memory: fall back to the database-backed sync
+            if (ack.status === 'resync_required') syncChanges();
+            if (lastSeq === null || ack.seq > lastSeq) lastSeq = ack.seq;
+        });
+    });
+    
+    // Remember the newest replayable event seen, for resume after a reconnect
+    socket.onAny((event, data) => {
+        if (data && data.seq && (lastSeq === null || data.seq > lastSeq)) lastSeq = data.seq;
     });
     
     socket.on('disconnect', () => {
@@ -55,6 +67,8 @@ function connectSocket() {
     // Message events
     socket.on('new_message', (data) => {
         console.log('ðŸ“¨ New message received:', data);
+        // Confirms delivery; the server persists acks in batches
+        socket.emit('ack_delivery', { msg_ids: [data.msg_id] });
         handleNewMessage(data);
     });
     
@@ -68,7 +82,7 @@ function connectSocket() {
     
     socket.on('message_delivered', (data) => {
         console.log('ðŸ“¬ Message delivered:', data);
-        updateMessageStatus(data.msg_id, 'delivered');
+        data.msg_ids.forEach(msgId => updateMessageStatus(msgId, 'delivered'));
     });
     
     socket.on('messages_read', (data) => {
@@ -125,8 +139,7 @@ document.addEventListener('DOMContentLoaded', () => {
     console.log('Current user:', currentUserId, currentUsername);
     
     connectSocket();
-    loadContacts();
-    loadGroups();
+    loadBootstrap();
     setupEventListeners();
     setupFileUpload();
     
@@ -284,6 +297,32 @@ function formatFileSize(bytes) {
     return Math.round(bytes / Math.pow(k, i) * 100) / 100 + ' ' + sizes[i];
 }
 
+// =====================================================
+// BOOTSTRAP (contacts, presence, groups, unread in one request)
+// =====================================================
+async function loadBootstrap() {
+    try {
+        const response = await fetch('/api/bootstrap');
+        
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        
+        const data = await response.json();
+        
+        contacts = data.contacts || [];
+        groups = data.groups || [];
+        renderContacts();
+        renderGroups();
+        
+        console.log('âœ… Bootstrap loaded:', contacts.length, 'contacts,', groups.length, 'groups');
+    } catch (error) {
+        console.error('âŒ Error loading bootstrap:', error);
+        loadContacts();
+        loadGroups();
+    }
+}
+
 // =====================================================
 // LOAD CONTACTS
 // =====================================================
@@ -651,10 +690,18 @@ function renderMessages(messages, isGroup = false) {
 
 
 
+// Original file names are user input; never put them into markup raw
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text;
+    return div.innerHTML.replace(/"/g, '&quot;');
+}
+
 // Updated function to create attachment HTML
 function createAttachmentHtml(msg, isMine) {
     const isImage = msg.attachment_type === 'images';
     const originalName = msg.attachment_name || 'download';
+    const safeName = escapeHtml(originalName);
     const downloadUrl = `/api/files/download/${msg.attachment_path}/${encodeURIComponent(originalName)}`;
     
     console.log('Creating attachment HTML:', {
@@ -665,9 +712,12 @@ function createAttachmentHtml(msg, isMine) {
     });
     
     if (isImage) {
+        // Small server-side preview when it is ready; the lightbox always opens the original
+        const previewUrl = msg.thumbnail_url || `/api/files/download/${msg.attachment_path}`;
+        const sizeAttrs = msg.attachment_width ? `width="${msg.attachment_width}" height="${msg.attachment_height}"` : '';
         return `
             <div class="attachment-preview">
-                <img src="/api/files/download/${msg.attachment_path}" alt="${msg.attachment_name}" 
+                <img src="${previewUrl}" alt="${safeName}" ${sizeAttrs} loading="lazy"
                      onclick="openLightbox('/api/files/download/${msg.attachment_path}')"
                      onerror="console.error('Failed to load image:', '/api/files/download/${msg.attachment_path}')">
             </div>
@@ -678,14 +728,14 @@ function createAttachmentHtml(msg, isMine) {
         
         return `
             <a href="${downloadUrl}" 
-               download="${originalName}" 
+               download="${safeName}" 
                class="attachment-document" 
                id="${attachmentId}"
                onclick="handleAttachmentClick(event, '${attachmentId}')"
                style="text-decoration: none;">
                 <i class="${icon} attachment-icon"></i>
                 <div class="attachment-info">
-                    <div class="attachment-name">${msg.attachment_name || 'Unknown file'}</div>
+                    <div class="attachment-name">${escapeHtml(msg.attachment_name || 'Unknown file')}</div>
                     <div class="attachment-size">${formatFileSize(msg.attachment_size || 0)}</div>
                 </div>
                 <i class="fas fa-download attachment-download"></i>
@@ -862,7 +912,15 @@ async function sendMessage() {
     removeFileAttachment();
 }
 
+// Larger files go through the resumable endpoints so a dropped connection only costs one chunk
+const RESUMABLE_UPLOAD_THRESHOLD = 8 * 1024 * 1024;
+const UPLOAD_CHUNK_RETRIES = 3;
+
 async function uploadFile(file) {
+    if (file.size > RESUMABLE_UPLOAD_THRESHOLD) {
+        return uploadFileResumable(file);
+    }
+    
     try {
         const formData = new FormData();
         formData.append('file', file);
@@ -886,6 +944,46 @@ async function uploadFile(file) {
     }
 }
 
+async function uploadFileResumable(file) {
+    try {
+        const start = await fetch('/api/files/uploads', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ name: file.name, size: file.size, type: file.type })
+        });
+        const upload = await start.json();
+        if (!upload.success) {
+            console.error('Upload failed:', upload.error);
+            return null;
+        }
+        
+        let offset = upload.offset;
+        let retries = 0;
+        while (true) {
+            try {
+                const response = await fetch(`/api/files/uploads/${upload.upload_id}?offset=${offset}`, {
+                    method: 'PUT',
+                    headers: { 'Content-Type': 'application/octet-stream' },
+                    body: file.slice(offset, offset + upload.chunk_size)
+                });
+                const data = await response.json();
+                if (data.file) return data.file;
+                if (!data.success && data.offset === undefined) throw new Error(data.error);
+                // On success or an offset mismatch, continue from where the server is
+                offset = data.offset;
+                retries = 0;
+            } catch (error) {
+                if (++retries > UPLOAD_CHUNK_RETRIES) throw error;
+                const status = await (await fetch(`/api/files/uploads/${upload.upload_id}`)).json();
+                offset = status.offset;
+            }
+        }
+    } catch (error) {
+        console.error('Error uploading file:', error);
+        return null;
+    }
+}
+
 // =====================================================
 // MESSAGE HANDLERS
 // =====================================================
@@ -954,35 +1052,78 @@ function handleMessageEdited(data) {
 }
 
 // =====================================================
-// DELETE/EDIT MESSAGE
+// RECONNECT CATCH-UP
 // =====================================================
-async function deleteMessage(msgId) {
-    if (!confirm('Delete this message?')) return;
-    
+async function syncChanges() {
+    // First connect only records the cursor; reconnects replay what was missed
     try {
-        const response = await fetch(`/api/messages/delete/${msgId}`, {
-            method: 'DELETE'
-        });
-        
-        const data = await response.json();
-        
-        if (data.success) {
-            socket.emit('delete_message', {
-                sender_id: currentUserId,
-                msg_id: msgId,
-                receiver_id: currentContact?.user_id,
-                group_id: currentGroup?.group_id
-            });
-        } else {
-            showAlert(data.error || 'Failed to delete message', 'danger');
+        let hasMore = true;
+        while (hasMore) {
+            const url = syncCursor === null ? '/api/sync' : `/api/sync?since=${syncCursor}`;
+            const response = await fetch(url);
+            const data = await response.json();
+            
+            if (data.resync_required) {
+                syncCursor = data.cursor;
+                loadContacts();
+                loadGroups();
+                if (currentContact) loadChat(currentContact.user_id);
+                if (currentGroup) loadGroupChat(currentGroup.group_id);
+                return;
+            }
+            
+            const firstSync = syncCursor === null;
+            syncCursor = data.cursor;
+            if (firstSync) return;
+            
+            data.messages.forEach(applySyncedMessage);
+            data.reads.forEach(read => updateMessagesReadStatus(read.reader_id));
+            hasMore = data.has_more;
         }
     } catch (error) {
-        console.error('Error deleting message:', error);
-        showAlert('Failed to delete message', 'danger');
+        console.error('Error syncing changes:', error);
+    }
+}
+
+function applySyncedMessage(msg) {
+    const existing = document.querySelector(`[data-msg-id="${msg.msg_id}"]`);
+    if (existing) {
+        if (msg.deleted) {
+            handleMessageDeleted(msg);
+        } else if (msg.edited) {
+            handleMessageEdited(msg);
+        }
+        updateMessageStatus(msg.msg_id, msg.status);
+        return;
+    }
+    
+    if (msg.is_group) {
+        handleNewGroupMessage(msg);
+    } else if (msg.is_mine) {
+        if (currentContact && msg.receiver_id === currentContact.user_id) {
+            appendMessage(msg, false);
+        }
+    } else {
+        handleNewMessage(msg);
     }
 }
 
-async function editMessage(msgId) {
+// =====================================================
+// DELETE/EDIT MESSAGE
+// =====================================================
+// The server authorizes by session, persists and broadcasts in one round trip;
+// the ack reports whether the change was applied
+function deleteMessage(msgId) {
+    if (!confirm('Delete this message?')) return;
+    
+    socket.emit('delete_message', { msg_id: msgId }, (data) => {
+        if (!data || !data.success) {
+            showAlert((data && data.error) || 'Failed to delete message', 'danger');
+        }
+    });
+}
+
+function editMessage(msgId) {
     const messageEl = document.querySelector(`[data-msg-id="${msgId}"]`);
     const contentEl = messageEl.querySelector('.message-bubble > div:first-child');
     const currentContent = contentEl.textContent;
@@ -991,30 +1132,11 @@ async function editMessage(msgId) {
     
     if (!newContent || newContent === currentContent) return;
     
-    try {
-        const response = await fetch(`/api/messages/edit/${msgId}`, {
-            method: 'PUT',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ content: newContent })
-        });
-        
-        const data = await response.json();
-        
-        if (data.success) {
-            socket.emit('edit_message', {
-                sender_id: currentUserId,
-                msg_id: msgId,
-                content: newContent,
-                receiver_id: currentContact?.user_id,
-                group_id: currentGroup?.group_id
-            });
-        } else {
-            showAlert(data.error || 'Failed to edit message', 'danger');
+    socket.emit('edit_message', { msg_id: msgId, content: newContent }, (data) => {
+        if (!data || !data.success) {
+            showAlert((data && data.error) || 'Failed to edit message', 'danger');
         }
-    } catch (error) {
-        console.error('Error editing message:', error);
-        showAlert('Failed to edit message', 'danger');
-    }
+    });
 }
 
 // =====================================================
@@ -1,19 +1,55 @@
 import mysql.connector
 from mysql.connector import Error, pooling
 import os
+import threading
+from contextlib import contextmanager
 from dotenv import load_dotenv
+from logger import get_logger
 
 # Load environment variables from .env file
 load_dotenv()
 
-print("Loading database configuration...")
+log = get_logger(__name__)
+
+log.debug("db.config_loading")
+
+class Transaction:
+    """Statements issued on one connection inside Database.transaction()"""
+    
+    def __init__(self, database, cursor):
+        self.database = database
+        self.cursor = cursor
+        self.lastrowid = None
+    
+    def execute(self, query, params=None):
+        """Run one statement and return its rowcount; driver errors propagate"""
+        if params:
+            self.cursor.execute(self.database._prepare(query), params)
+        else:
+            self.cursor.execute(self.database._prepare(query))
+        self.lastrowid = self.cursor.lastrowid
+        return self.cursor.rowcount
+    
+    def query(self, query, params=None):
+        """Run a SELECT and return its rows"""
+        self.execute(query, params)
+        return self.cursor.fetchall()
+
 
 class Database:
+    """MySQL backend using a mysql.connector connection pool"""
+    
+    backend = 'mysql'
+    driver_errors = (Error,)
+    
     def __init__(self):
         self.pool = None
         self.connection = None
         self.cursor = None
-        self._create_pool()
+        # Per-thread state (last insert id) so concurrent handlers don't clobber each other
+        self._local = threading.local()
+        # Created on first use, so importing the app opens no connections
+        self._pool_lock = threading.Lock()
     
     def _create_pool(self):
         """Create connection pool"""
@@ -28,19 +64,39 @@ class Database:
                 database=os.getenv('DB_NAME', 'messaging_app_db'),
                 autocommit=True
             )
-            print("✓ Database connection pool created")
+            log.info("db.pool_created", pool_size=5)
         except Error as e:
-            print(f"✗ Error creating pool: {e}")
+            log.error("db.pool_create_failed", error=str(e))
     
     def get_connection(self):
         """Get connection from pool"""
         try:
+            if self.pool is None:
+                with self._pool_lock:
+                    if self.pool is None:
+                        self._create_pool()
             if self.pool:
                 return self.pool.get_connection()
         except Error as e:
-            print(f"✗ Error getting connection: {e}")
+            log.error("db.get_connection_failed", error=str(e))
             return None
     
+    def release_connection(self, conn):
+        """Return a connection to the pool"""
+        conn.close()
+    
+    def _cursor(self, conn):
+        """Open a cursor that returns rows as dictionaries"""
+        return conn.cursor(dictionary=True)
+    
+    def _prepare(self, query):
+        """Translate a query into the backend's SQL dialect"""
+        return query
+    
+    def _begin(self, conn):
+        """Open an explicit transaction on an autocommit connection"""
+        conn.start_transaction()
+    
     def connect(self):
         """Connect to MySQL database"""
         try:
@@ -48,22 +104,22 @@ class Database:
             
             if self.connection and self.connection.is_connected():
                 self.cursor = self.connection.cursor(dictionary=True)
-                print("✓ Connected to MySQL database successfully")
+                log.info("db.connected")
                 return True
         
         except Error as e:
-            print(f"✗ Error connecting to MySQL: {e}")
+            log.error("db.connect_failed", error=str(e))
             return False
     
     def ensure_connection(self):
         """Ensure database connection is active, reconnect if needed"""
         try:
             if not self.connection or not self.connection.is_connected():
-                print("⚠ Connection lost, reconnecting...")
+                log.warning("db.connection_lost")
                 return self.connect()
             return True
         except Exception as e:
-            print(f"⚠ Connection check error: {e}")
+            log.warning("db.connection_check_failed", error=str(e))
             return self.connect()
     
     def disconnect(self):
@@ -75,9 +131,9 @@ class Database:
             if self.connection:
                 self.connection.close()
                 self.connection = None
-            print("✓ Disconnected from MySQL database")
+            log.info("db.disconnected")
         except Exception as e:
-            print(f"⚠ Disconnect warning: {e}")
+            log.warning("db.disconnect_failed", error=str(e))
     
     def execute_query(self, query, params=None):
         """Execute a SELECT query and return results"""
@@ -86,28 +142,28 @@ class Database:
         try:
             conn = self.get_connection()
             if not conn:
-                print("✗ Failed to get connection")
+                log.error("db.no_connection")
                 return None
             
-            cursor = conn.cursor(dictionary=True)
+            cursor = self._cursor(conn)
             
             if params:
-                cursor.execute(query, params)
+                cursor.execute(self._prepare(query), params)
             else:
-                cursor.execute(query)
+                cursor.execute(self._prepare(query))
             
             result = cursor.fetchall()
             return result
         
-        except Error as e:
-            print(f"✗ Error executing query: {e}")
+        except self.driver_errors as e:
+            log.error("db.query_failed", error=str(e))
             return None
         
         finally:
             if cursor:
                 cursor.close()
             if conn:
-                conn.close()
+                self.release_connection(conn)
     
     def execute_update(self, query, params=None):
         """Execute INSERT, UPDATE, or DELETE query"""
@@ -116,42 +172,107 @@ class Database:
         try:
             conn = self.get_connection()
             if not conn:
-                print("✗ Failed to get connection")
+                log.error("db.no_connection")
                 return None
             
-            cursor = conn.cursor(dictionary=True)
+            cursor = self._cursor(conn)
             
             if params:
-                cursor.execute(query, params)
+                cursor.execute(self._prepare(query), params)
             else:
-                cursor.execute(query)
+                cursor.execute(self._prepare(query))
             
             conn.commit()
             rowcount = cursor.rowcount
             lastrowid = cursor.lastrowid
             
-            print(f"✓ Query executed. Rows affected: {rowcount}")
+            log.debug("db.update_executed", rows=rowcount)
             
             # Store lastrowid for get_insert_id
-            self._last_insert_id = lastrowid
+            self._local.last_insert_id = lastrowid
             
             return rowcount
         
-        except Error as e:
+        except self.driver_errors as e:
+            if conn:
+                conn.rollback()
+            log.error("db.update_failed", error=str(e))
+            return None
+        
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                self.release_connection(conn)
+    
+    def execute_many(self, query, rows):
+        """Execute one INSERT/UPDATE for many parameter rows in a single transaction"""
+        conn = None
+        cursor = None
+        try:
+            conn = self.get_connection()
+            if not conn:
+                log.error("db.no_connection")
+                return None
+            
+            cursor = self._cursor(conn)
+            
+            # mysql.connector rewrites a batched INSERT into one multi-row statement
+            self._begin(conn)
+            cursor.executemany(self._prepare(query), rows)
+            conn.commit()
+            
+            rowcount = cursor.rowcount
+            log.debug("db.batch_executed", rows=rowcount)
+            return rowcount
+        
+        except self.driver_errors as e:
             if conn:
                 conn.rollback()
-            print(f"✗ Error executing update: {e}")
+            log.error("db.batch_failed", error=str(e))
             return None
         
         finally:
             if cursor:
                 cursor.close()
             if conn:
-                conn.close()
+                self.release_connection(conn)
+    
+    @contextmanager
+    def transaction(self):
+        """Run several statements atomically: commit on exit, roll back and re-raise on error"""
+        conn = self.get_connection()
+        if not conn:
+            log.error("db.no_connection")
+            raise RuntimeError('No database connection')
+        
+        cursor = self._cursor(conn)
+        try:
+            self._begin(conn)
+            yield Transaction(self, cursor)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            log.error("db.transaction_failed", error=str(e))
+            raise
+        finally:
+            cursor.close()
+            self.release_connection(conn)
     
     def get_insert_id(self):
         """Get the ID of the last inserted row"""
-        return getattr(self, '_last_insert_id', None)
+        return getattr(self._local, 'last_insert_id', None)
+
+
+def create_database():
+    """Build the Database for the backend selected by DB_BACKEND (mysql or sqlite)"""
+    backend = os.getenv('DB_BACKEND', 'mysql').lower()
+    
+    if backend == 'sqlite':
+        from database.sqlite_db import SQLiteDatabase
+        return SQLiteDatabase()
+    
+    return Database()
 
 # Create a global database instance
-db = Database()
\ No newline at end of file
+db = create_database()
\ No newline at end of file
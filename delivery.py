@@ -0,0 +1,152 @@
+import os
+import threading
+from database.db import db
+from logger import get_logger
+from routes.sync import record_changes
+from replay import replay_buffer
+from tail_cache import history_cache
+
+log = get_logger(__name__)
+
+# Seconds between two flushes of pending delivery acks
+DELIVERY_FLUSH_INTERVAL = float(os.getenv('DELIVERY_FLUSH_INTERVAL', '0.25'))
+# Messages per UPDATE ... WHERE msg_id IN (...) statement
+DELIVERY_BATCH_SIZE = int(os.getenv('DELIVERY_BATCH_SIZE', '500'))
+# Most msg_ids one ack_delivery event may carry; larger acks are dropped
+DELIVERY_MAX_ACK_IDS = int(os.getenv('DELIVERY_MAX_ACK_IDS', '200'))
+
+
+class DeliveryRace(Exception):
+    """Some acked messages changed status between the SELECT and the UPDATE"""
+
+
+# =====================================================
+# DELIVERY ACKS
+# =====================================================
+class DeliveryAcks:
+    """Collects client acks for new_message and persists them in batches.
+
+    A message becomes 'delivered' only once the receiver's client confirms
+    it. Acks are held in memory and flushed every DELIVERY_FLUSH_INTERVAL:
+    one SELECT and one UPDATE per batch, one change-log INSERT, and one
+    message_delivered notification per (sender, receiver) pair.
+    """
+
+    def __init__(self, batch_size=DELIVERY_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._pending = set()  # (msg_id, user_id that acked it)
+        self.received = 0
+        self.delivered = 0
+        self.flushes = 0
+
+    def ack(self, receiver_id, msg_ids):
+        """Queue a receiver's acks; persisted by the next flush()"""
+        with self._lock:
+            self._pending.update((msg_id, receiver_id) for msg_id in msg_ids)
+            self.received += len(msg_ids)
+
+    def flush(self):
+        """Persist pending acks; return [(sender_id, payload)] notifications to send"""
+        with self._lock:
+            pending, self._pending = self._pending, set()
+        if not pending:
+            return []
+
+        notices = {}  # (sender_id, receiver_id) -> [msg_id]
+        msg_ids = sorted({msg_id for msg_id, _ in pending})
+        for start in range(0, len(msg_ids), self.batch_size):
+            for row in self._deliver(msg_ids[start:start + self.batch_size], pending):
+                notices.setdefault((row['sender_id'], row['receiver_id']), []).append(row['msg_id'])
+
+        with self._lock:
+            self.flushes += 1
+        return [
+            (sender_id, {'receiver_id': receiver_id, 'msg_ids': delivered})
+            for (sender_id, receiver_id), delivered in notices.items()
+        ]
+
+    def _deliver(self, msg_ids, pending):
+        placeholders = ', '.join(['%s'] * len(msg_ids))
+        select_query = f"""
+            SELECT msg_id, sender_id, receiver_id, conv_id
+            FROM MESSAGE
+            WHERE msg_id IN ({placeholders}) AND status = 'sent'
+        """
+        rows = db.execute_query(select_query, tuple(msg_ids))
+        if rows is None:
+            log.error("delivery.select_failed", count=len(msg_ids))
+            return []
+
+        # Only the addressee can confirm delivery
+        rows = [row for row in rows if (row['msg_id'], row['receiver_id']) in pending]
+        if not rows:
+            return []
+
+        rows = self._mark_delivered(rows)
+        if not rows:
+            return []
+
+        for row in rows:
+            history_cache.update(row['conv_id'], row['msg_id'], status='delivered')
+        record_changes([(row['conv_id'], 'status', row['receiver_id'], row['msg_id']) for row in rows])
+
+        with self._lock:
+            self.delivered += len(rows)
+        return rows
+
+    def _mark_delivered(self, rows):
+        """The rows this UPDATE actually moved from 'sent' to 'delivered'.
+
+        A message read between the SELECT and here is not 'sent' any more and
+        must not be announced. If the batch changed fewer rows than it
+        covers, it is rolled back and applied row by row, which tells
+        exactly which ones changed.
+        """
+        placeholders = ', '.join(['%s'] * len(rows))
+        update_query = f"""
+            UPDATE MESSAGE SET status = 'delivered'
+            WHERE msg_id IN ({placeholders}) AND status = 'sent'
+        """
+        try:
+            with db.transaction() as tx:
+                if tx.execute(update_query, tuple(row['msg_id'] for row in rows)) != len(rows):
+                    raise DeliveryRace()
+            return rows
+        except DeliveryRace:
+            pass
+        except db.driver_errors:
+            log.error("delivery.update_failed", count=len(rows))
+            return []
+
+        single_query = "UPDATE MESSAGE SET status = 'delivered' WHERE msg_id = %s AND status = 'sent'"
+        return [row for row in rows if db.execute_update(single_query, (row['msg_id'],))]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'received': self.received,
+                'delivered': self.delivered,
+                'pending': len(self._pending),
+                'flushes': self.flushes
+            }
+
+
+delivery_acks = DeliveryAcks()
+
+
+def start_delivery_flusher(socketio, interval=DELIVERY_FLUSH_INTERVAL):
+    """Background task that persists delivery acks and notifies senders"""
+
+    def flush_loop():
+        while True:
+            socketio.sleep(interval)
+            try:
+                for sender_id, payload in delivery_acks.flush():
+                    room = f'user_{sender_id}'
+                    seq = replay_buffer.record(room, 'message_delivered', payload)
+                    socketio.emit('message_delivered', {**payload, 'seq': seq}, room=room)
+            except Exception:
+                log.exception("delivery.flush_failed")
+
+    return socketio.start_background_task(flush_loop)
\ No newline at end of file
@@ -0,0 +1,81 @@
+import hashlib
+import os
+import threading
+from flask import Response, request
+from database.db import db
+
+# Counters restart with the process, so every ETag embeds the boot id
+BOOT_ID = os.urandom(8).hex()
+
+
+# =====================================================
+# VERSION REGISTRY
+# =====================================================
+class VersionRegistry:
+    """In-memory monotonic counters for cached payloads.
+
+    Keys are (kind, id) pairs such as ('conversation', conv_id) or
+    ('contacts', user_id). Every write path that changes what a list or
+    history endpoint returns bumps the matching counter.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions = {}
+
+    def get(self, kind, key):
+        return self._versions.get((kind, key), 0)
+
+    def bump(self, kind, key):
+        with self._lock:
+            version = self._versions.get((kind, key), 0) + 1
+            self._versions[(kind, key)] = version
+            return version
+
+    def bump_many(self, kind, keys):
+        with self._lock:
+            for key in keys:
+                self._versions[(kind, key)] = self._versions.get((kind, key), 0) + 1
+
+
+versions = VersionRegistry()
+
+
+def bump_conversation(conv_id):
+    """Invalidate history/group payloads for one conversation"""
+    if conv_id:
+        versions.bump('conversation', int(conv_id))
+
+
+def bump_contact_lists_of(user_id):
+    """Invalidate the contact list of everyone who has user_id as a contact (presence changed)"""
+    query = "SELECT user_id FROM USERCONTACT WHERE contact_user_id = %s"
+    owners = db.execute_query(query, (user_id,))
+    if owners:
+        versions.bump_many('contacts', [row['user_id'] for row in owners])
+
+
+# =====================================================
+# CONDITIONAL RESPONSES
+# =====================================================
+def make_etag(*parts):
+    """Build an opaque ETag value from cheap version state"""
+    raw = '|'.join(str(part) for part in (BOOT_ID,) + parts)
+    return hashlib.sha1(raw.encode()).hexdigest()[:24]
+
+
+def is_fresh(etag):
+    """True when the client's If-None-Match already holds this version"""
+    return request.if_none_match.contains_weak(etag)
+
+
+def not_modified(etag):
+    response = Response(status=304)
+    return with_etag(response, etag)
+
+
+def with_etag(response, etag):
+    """Attach the ETag and force revalidation on every use"""
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
\ No newline at end of file
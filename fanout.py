@@ -0,0 +1,147 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from engineio import packet as eio_packet
+from socketio import packet
+from logger import get_logger
+
+log = get_logger(__name__)
+
+# Rooms with more participants than this are delivered in parallel shards
+FANOUT_SHARD_SIZE = int(os.getenv('FANOUT_SHARD_SIZE', '500'))
+FANOUT_WORKERS = int(os.getenv('FANOUT_WORKERS', '4'))
+
+NAMESPACE = '/'
+
+
+# =====================================================
+# FAN-OUT STATS
+# =====================================================
+class FanoutStats:
+    """Per-room delivery latency (publish -> last socket written)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.rooms = {}  # room -> {'count', 'total_ms', 'max_ms', 'last_ms', 'recipients'}
+
+    def record(self, room, latency_ms, recipients):
+        with self._lock:
+            entry = self.rooms.get(room)
+            if entry is None:
+                entry = self.rooms[room] = {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                                            'last_ms': 0.0, 'recipients': 0}
+            entry['count'] += 1
+            entry['total_ms'] += latency_ms
+            entry['max_ms'] = max(entry['max_ms'], latency_ms)
+            entry['last_ms'] = latency_ms
+            entry['recipients'] = recipients
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                room: {**entry, 'mean_ms': round(entry['total_ms'] / entry['count'], 3)}
+                for room, entry in self.rooms.items()
+            }
+
+
+# =====================================================
+# GROUP FAN-OUT
+# =====================================================
+class GroupFanout:
+    """Delivers room broadcasts off the sender's handler thread.
+
+    Each published event is encoded once. Rooms larger than
+    FANOUT_SHARD_SIZE are split into shards written in parallel by the shard
+    pool. Events for the same room are delivered strictly in publish order:
+    one drain task per room works through that room's queue and waits for
+    all shards of an event before starting the next.
+    """
+
+    def __init__(self, shard_size=FANOUT_SHARD_SIZE, workers=FANOUT_WORKERS):
+        self.shard_size = shard_size
+        self.workers = workers
+        self.server = None
+        self._sharded = False  # python-socketio exposes the internals the sharded send uses
+        self._lock = threading.Lock()
+        self._queues = {}  # room -> deque of pending events; present while a drain task runs
+        self._drainers = None
+        self._shards = None
+        self.stats = FanoutStats()
+
+    def attach(self, socketio):
+        """Bind to the Flask-SocketIO instance and start the worker pools"""
+        self.server = socketio.server
+        # _send_eio_packet and get_participants are not public API; see the pin in requirements.txt
+        self._sharded = (hasattr(self.server, '_send_eio_packet')
+                         and hasattr(self.server.manager, 'get_participants'))
+        if not self._sharded:
+            log.warning("fanout.sharding_unavailable")
+        if self._drainers is None:
+            self._drainers = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='fanout')
+            self._shards = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='fanout-shard')
+
+    def publish(self, event, data, room, skip_sid=None):
+        """Queue an event for every socket in room; returns immediately"""
+        item = (event, data, skip_sid, time.perf_counter())
+        with self._lock:
+            queue = self._queues.get(room)
+            if queue is not None:
+                queue.append(item)
+                return
+            self._queues[room] = deque([item])
+        self._drainers.submit(self._drain, room)
+
+    def _drain(self, room):
+        while True:
+            with self._lock:
+                queue = self._queues[room]
+                if not queue:
+                    del self._queues[room]
+                    return
+                event, data, skip_sid, published_at = queue.popleft()
+            try:
+                recipients = self._deliver(event, data, room, skip_sid)
+                latency_ms = (time.perf_counter() - published_at) * 1000
+                self.stats.record(room, latency_ms, recipients)
+                log.debug("fanout.delivered", room=room, socket_event=event, recipients=recipients,
+                          latency_ms=round(latency_ms, 3))
+            except Exception:
+                log.exception("fanout.deliver_failed", room=room, socket_event=event)
+
+    def _deliver(self, event, data, room, skip_sid):
+        if not self._sharded:
+            # Plain broadcast; the recipient count is not known without the manager internals
+            self.server.emit(event, data, to=room, skip_sid=skip_sid, namespace=NAMESPACE)
+            return 0
+
+        eio_sids = [eio_sid for sid, eio_sid in self.server.manager.get_participants(NAMESPACE, room)
+                    if sid != skip_sid]
+        if not eio_sids:
+            return 0
+
+        # Same framing as socketio's Manager.emit, built once for every recipient
+        encoded = self.server.packet_class(packet.EVENT, namespace=NAMESPACE, data=[event, data]).encode()
+        if not isinstance(encoded, list):
+            encoded = [encoded]
+        frames = [eio_packet.Packet(eio_packet.MESSAGE, part) for part in encoded]
+
+        if len(eio_sids) <= self.shard_size:
+            self._send_shard(eio_sids, frames)
+        else:
+            shards = [eio_sids[i:i + self.shard_size] for i in range(0, len(eio_sids), self.shard_size)]
+            wait([self._shards.submit(self._send_shard, shard, frames) for shard in shards])
+        return len(eio_sids)
+
+    def _send_shard(self, eio_sids, frames):
+        for eio_sid in eio_sids:
+            for frame in frames:
+                try:
+                    self.server._send_eio_packet(eio_sid, frame)
+                except Exception:
+                    # A socket closing mid fan-out must not stop the rest of the shard
+                    log.debug("fanout.send_failed", eio_sid=eio_sid)
+
+
+group_fanout = GroupFanout()
\ No newline at end of file
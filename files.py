@@ -0,0 +1,263 @@
+import os
+from flask import Blueprint, current_app, jsonify, request, session
+from werkzeug.formparser import parse_form_data
+from werkzeug.utils import send_file
+from routes.auth import login_required
+from attachments import UPLOAD_CHUNK_BYTES, UploadRejected, attachment_store, clean_name, copy_stream
+from thumbnails import thumbnail_service
+from logger import get_logger
+
+log = get_logger(__name__)
+
+files_bp = Blueprint('files', __name__, url_prefix='/api/files')
+
+# Room for multipart boundaries and headers on top of the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+# 'direct' streams from this process; 'x-sendfile' / 'x-accel' hand the transfer to a front proxy
+FILE_SERVE_MODE = os.getenv('FILE_SERVE_MODE', 'direct')
+# nginx `internal` location mapped onto the store's root directory (x-accel mode)
+X_ACCEL_PREFIX = os.getenv('X_ACCEL_PREFIX', '/protected-uploads').rstrip('/')
+# Stored files never change under their hash
+FILE_CACHE_MAX_AGE = 365 * 24 * 3600
+
+INLINE_TYPES = ('image/', 'video/', 'audio/', 'application/pdf', 'text/plain')
+
+
+def rejected(e):
+    return jsonify({'success': False, 'error': e.error, **e.extra}), e.status
+
+
+# =====================================================
+# ONE-SHOT UPLOAD
+# =====================================================
+@files_bp.route('/upload', methods=['POST'])
+@login_required
+def upload_file():
+    """Stream a file into the attachment store.
+
+    Accepts multipart/form-data with a 'file' field, or the raw bytes as the
+    body with the name in X-File-Name. Either way the body goes to disk in
+    chunks and is hashed as it is written.
+    """
+    writers = []
+    try:
+        current_user_id = session.get('user_id')
+
+        if (request.content_length or 0) > attachment_store.max_bytes + MULTIPART_OVERHEAD:
+            return jsonify({'success': False, 'error': 'File too large',
+                            'max_bytes': attachment_store.max_bytes}), 413
+
+        if request.mimetype == 'multipart/form-data':
+            def stream_factory(total_content_length, content_type, filename, content_length=None):
+                writer = attachment_store.writer()
+                writers.append(writer)
+                return writer
+
+            _, _, files = parse_form_data(request.environ, stream_factory=stream_factory, silent=False)
+            upload = files.get('file')
+            if upload is None or not upload.filename:
+                return jsonify({'success': False, 'error': 'No file provided'}), 400
+            writer = upload.stream
+            name, mime_type = upload.filename, upload.mimetype
+        else:
+            writer = attachment_store.writer()
+            writers.append(writer)
+            copy_stream(request.stream, writer.write)
+            name, mime_type = request.headers.get('X-File-Name'), request.mimetype
+
+        writers.remove(writer)
+        info = attachment_store.commit(writer, name, mime_type, current_user_id)
+        thumbnail_service.schedule(info)
+        return jsonify({'success': True, 'file': info})
+
+    except UploadRejected as e:
+        return rejected(e)
+
+    except Exception as e:
+        log.exception("files.upload_failed")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    finally:
+        # Other parts of the form, or everything if the upload failed
+        for writer in writers:
+            writer.discard()
+
+
+# =====================================================
+# RESUMABLE UPLOAD
+# =====================================================
+@files_bp.route('/uploads', methods=['POST'])
+@login_required
+def start_upload():
+    """Open a resumable upload for {name, size, type}; chunks are then PUT at ?offset="""
+    try:
+        current_user_id = session.get('user_id')
+        data = request.get_json() or {}
+
+        upload = attachment_store.start_upload(current_user_id, data.get('name'), data.get('size'), data.get('type'))
+        return jsonify({
+            'success': True,
+            'upload_id': upload.upload_id,
+            'offset': upload.offset,
+            'size': upload.size,
+            'chunk_size': UPLOAD_CHUNK_BYTES
+        }), 201
+
+    except UploadRejected as e:
+        return rejected(e)
+
+    except Exception as e:
+        log.exception("files.start_upload_failed")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@files_bp.route('/uploads/<upload_id>', methods=['GET'])
+@login_required
+def get_upload(upload_id):
+    """Where to resume: the number of bytes the server already holds"""
+    upload = attachment_store.get_upload(upload_id, session.get('user_id'))
+    if upload is None:
+        return jsonify({'success': False, 'error': 'Upload not found'}), 404
+    return jsonify({'success': True, 'upload_id': upload.upload_id, 'offset': upload.offset, 'size': upload.size})
+
+
+@files_bp.route('/uploads/<upload_id>', methods=['PUT'])
+@login_required
+def put_chunk(upload_id):
+    """Append the body at ?offset=; the response carries the file once the last byte is in"""
+    try:
+        upload = attachment_store.get_upload(upload_id, session.get('user_id'))
+        if upload is None:
+            return jsonify({'success': False, 'error': 'Upload not found'}), 404
+
+        offset = request.args.get('offset', type=int)
+        if offset is None:
+            return jsonify({'success': False, 'error': 'offset required', 'offset': upload.offset}), 400
+
+        info = attachment_store.append_chunk(upload, offset, request.stream, request.content_length)
+        if info is None:
+            return jsonify({'success': True, 'upload_id': upload.upload_id, 'offset': upload.offset,
+                            'size': upload.size})
+        thumbnail_service.schedule(info)
+        return jsonify({'success': True, 'upload_id': upload.upload_id, 'offset': upload.offset,
+                        'size': upload.size, 'file': info})
+
+    except UploadRejected as e:
+        return rejected(e)
+
+    except Exception as e:
+        log.exception("files.put_chunk_failed", upload_id=upload_id)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@files_bp.route('/uploads/<upload_id>', methods=['DELETE'])
+@login_required
+def cancel_upload(upload_id):
+    upload = attachment_store.get_upload(upload_id, session.get('user_id'))
+    if upload is None:
+        return jsonify({'success': False, 'error': 'Upload not found'}), 404
+    attachment_store.cancel_upload(upload)
+    return jsonify({'success': True})
+
+
+# =====================================================
+# DOWNLOAD
+# =====================================================
+def authorized_meta(file_hash):
+    """ATTACHMENT row if the current user may read the file, else None"""
+    return attachment_store.readable(file_hash, session.get('user_id'))
+
+
+def not_found():
+    # Same answer for unknown and forbidden files; hashes are not to be probed
+    return jsonify({'success': False, 'error': 'File not found'}), 404
+
+
+def serve_stored(path, mime_type, download_name, etag, as_attachment=False):
+    """Response for a file in the store: Range/conditional aware, cacheable for a year.
+
+    Range requests, If-None-Match and If-Range are answered by werkzeug from
+    the open file; the body is streamed through wsgi.file_wrapper (sendfile
+    where the server supports it), never read into memory. In the proxy
+    modes only the headers are sent and the proxy transfers the bytes.
+    """
+    proxied = FILE_SERVE_MODE in ('x-sendfile', 'x-accel')
+    response = send_file(
+        path,
+        request.environ,
+        mimetype=mime_type,
+        as_attachment=as_attachment,
+        download_name=download_name,
+        conditional=not proxied,
+        etag=etag,
+        max_age=FILE_CACHE_MAX_AGE,
+        use_x_sendfile=proxied,
+        response_class=current_app.response_class
+    )
+    # Authorized per user: browsers may keep it, shared caches may not
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+
+    if proxied:
+        # The proxy answers ranges itself; only the revalidation short-cut is ours
+        if etag in request.if_none_match:
+            response.status_code = 304
+            response.headers.pop('X-Sendfile', None)
+            return response
+        if FILE_SERVE_MODE == 'x-accel':
+            response.headers.pop('X-Sendfile', None)
+            relative = os.path.relpath(path, attachment_store.root).replace(os.sep, '/')
+            response.headers['X-Accel-Redirect'] = f'{X_ACCEL_PREFIX}/{relative}'
+    return response
+
+
+@files_bp.route('/download/<file_hash>', methods=['GET'])
+@files_bp.route('/download/<file_hash>/<path:name>', methods=['GET'])
+@login_required
+def download_file(file_hash, name=None):
+    """Serve an attachment to the uploader or a member of a conversation that carries it.
+
+    The optional trailing name is the download name; the same bytes may have
+    been uploaded under different names. The hash is the strong ETag.
+    """
+    try:
+        meta = authorized_meta(file_hash)
+        if meta is None:
+            return not_found()
+
+        path = attachment_store.path_for(file_hash)
+        if not os.path.exists(path):
+            log.error("files.object_missing", file_hash=file_hash)
+            return not_found()
+
+        mime_type = meta['mime_type']
+        as_attachment = bool(request.args.get('download')) or not mime_type.startswith(INLINE_TYPES)
+        return serve_stored(path, mime_type, clean_name(name) if name else meta['original_name'],
+                            file_hash, as_attachment)
+
+    except Exception as e:
+        log.exception("files.download_failed", file_hash=file_hash)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@files_bp.route('/thumbnail/<file_hash>', methods=['GET'])
+@login_required
+def download_thumbnail(file_hash):
+    """Downscaled JPEG preview of an image attachment; 404 until it has been generated"""
+    try:
+        meta = authorized_meta(file_hash)
+        if meta is None or not meta['thumbnail']:
+            return not_found()
+
+        path = attachment_store.thumbnail_path(file_hash)
+        if not os.path.exists(path):
+            log.error("files.thumbnail_missing", file_hash=file_hash)
+            return not_found()
+
+        return serve_stored(path, 'image/jpeg', f'{file_hash}.jpg', f'{file_hash}-thumb')
+
+    except Exception as e:
+        log.exception("files.thumbnail_failed", file_hash=file_hash)
+        return jsonify({'success': False, 'error': str(e)}), 500
\ No newline at end of file
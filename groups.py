@@ -1,10 +1,68 @@
 from flask import Blueprint, jsonify, request, session
 from database.db import db
 from routes.auth import login_required
-import traceback
+from logger import get_logger
+from routes.sync import record_change
+from rate_limit import group_conversation_key, send_admission
+from etags import bump_conversation, is_fresh, make_etag, not_modified, versions, with_etag
+from socketio_events import join_online_users
+from membership import group_members
+from tail_cache import for_viewer, history_cache, history_entry
+from profiles import user_profiles
+from attachments import attachment_fields, attachment_store
+from archive import TIMESTAMP_FORMAT, history_cursor, message_archive, parse_cursor
+
+log = get_logger(__name__)
 
 groups_bp = Blueprint('groups', __name__, url_prefix='/api/groups')
 
+GROUP_HISTORY_PAGE_SIZE = 200
+
+# Rows per multi-row participant INSERT (keeps SQLite under its bound-variable limit)
+PARTICIPANT_INSERT_BATCH = 500
+
+# =====================================================
+# MEMBERSHIP HELPERS
+# =====================================================
+def parse_user_ids(values):
+    """Normalize a list of user ids from JSON into unique ints (order kept); None if malformed"""
+    if not isinstance(values, list):
+        return None
+    try:
+        return list(dict.fromkeys(int(value) for value in values))
+    except (TypeError, ValueError):
+        return None
+
+
+def classify_candidates(group_id, user_ids):
+    """Split user_ids into (existing users, already members of group_id) with one query"""
+    placeholders = ', '.join(['%s'] * len(user_ids))
+    query = f"""
+        SELECT u.user_id, cp.user_id as member_id
+        FROM USER u
+        LEFT JOIN CONVERSATION_PARTICIPANT cp ON cp.conversation_id = %s AND cp.user_id = u.user_id
+        WHERE u.user_id IN ({placeholders})
+    """
+    rows = db.execute_query(query, (group_id, *user_ids))
+    if rows is None:
+        return None, None
+    found = {row['user_id'] for row in rows}
+    members = {row['user_id'] for row in rows if row['member_id'] is not None}
+    return found, members
+
+
+def insert_participants(tx, group_id, members):
+    """Insert [(user_id, role)] into a group using multi-row INSERTs inside tx"""
+    for start in range(0, len(members), PARTICIPANT_INSERT_BATCH):
+        batch = members[start:start + PARTICIPANT_INSERT_BATCH]
+        values = ', '.join(['(%s, %s, %s)'] * len(batch))
+        params = [value for user_id, role in batch for value in (group_id, user_id, role)]
+        tx.execute(
+            f"INSERT INTO CONVERSATION_PARTICIPANT (conversation_id, user_id, role) VALUES {values}",
+            params
+        )
+
+
 # =====================================================
 # CREATE GROUP
 # =====================================================
@@ -17,48 +75,49 @@ def create_group():
         data = request.get_json()
         
         group_name = data.get('name', '').strip()
-        member_ids = data.get('members', [])  # List of user IDs
+        member_ids = parse_user_ids(data.get('members', []))  # List of user IDs
         privacy = data.get('privacy', 'private')
         
         if not group_name:
             return jsonify({'success': False, 'error': 'Group name required'}), 400
         
+        if member_ids is None:
+            return jsonify({'success': False, 'error': 'Members must be a list of user IDs'}), 400
+        
+        member_ids = [member_id for member_id in member_ids if member_id != current_user_id]
+        
         if len(member_ids) < 1:
             return jsonify({'success': False, 'error': 'At least 1 member required'}), 400
         
-        # Ensure current user is included
-        if current_user_id not in member_ids:
-            member_ids.append(current_user_id)
+        # Validate every member in one query (the group does not exist yet, so nobody is a member)
+        found, _ = classify_candidates(None, member_ids)
+        if found is None:
+            return jsonify({'success': False, 'error': 'Failed to create group'}), 500
+        
+        missing = [member_id for member_id in member_ids if member_id not in found]
+        if missing:
+            return jsonify({'success': False, 'error': 'Unknown users', 'user_ids': missing}), 400
         
-        # Create conversation
+        # Conversation and all participants commit together or not at all
         create_query = """
             INSERT INTO CONVERSATION (type, name, created_by, privacy_settings)
             VALUES ('group', %s, %s, %s)
         """
-        result = db.execute_update(create_query, (group_name, current_user_id, privacy))
+        with db.transaction() as tx:
+            tx.execute(create_query, (group_name, current_user_id, privacy))
+            group_id = tx.lastrowid
+            
+            # Creator is admin, everyone else a member
+            insert_participants(tx, group_id, [(current_user_id, 'admin')] +
+                                [(member_id, 'member') for member_id in member_ids])
         
-        if not result:
-            return jsonify({'success': False, 'error': 'Failed to create group'}), 500
+        group_members.set_group(group_id, {current_user_id: 'admin',
+                                           **{member_id: 'member' for member_id in member_ids}})
         
-        group_id = db.get_insert_id()
+        # Put members who are online into the room now instead of on their next connect
+        joined = join_online_users([current_user_id] + member_ids, f'group_{group_id}')
         
-        # Add creator as admin
-        add_creator_query = """
-            INSERT INTO CONVERSATION_PARTICIPANT (conversation_id, user_id, role)
-            VALUES (%s, %s, 'admin')
-        """
-        db.execute_update(add_creator_query, (group_id, current_user_id))
-        
-        # Add other members
-        for member_id in member_ids:
-            if member_id != current_user_id:
-                add_member_query = """
-                    INSERT INTO CONVERSATION_PARTICIPANT (conversation_id, user_id, role)
-                    VALUES (%s, %s, 'member')
-                """
-                db.execute_update(add_member_query, (group_id, member_id))
-        
-        print(f"[DEBUG] Created group {group_id}: {group_name} with {len(member_ids)} members")
+        log.info("groups.created", group_id=group_id, members=len(member_ids) + 1, joined=joined)
         
         return jsonify({
             'success': True,
@@ -67,14 +126,47 @@ def create_group():
         })
     
     except Exception as e:
-        print(f"[ERROR] Exception in create_group: {str(e)}")
-        print(traceback.format_exc())
+        log.exception("groups.create_group_failed")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
 # =====================================================
 # LIST USER'S GROUPS
 # =====================================================
+def load_user_groups(user_id):
+    """Groups the user belongs to, most recently active first, formatted for the frontend"""
+    query = """
+        SELECT c.conv_id, c.name, c.created_by, c.created_at, c.last_message_at,
+               c.privacy_settings,
+               cp.role,
+               (SELECT COUNT(*) FROM CONVERSATION_PARTICIPANT 
+                WHERE conversation_id = c.conv_id) as member_count,
+               (SELECT COUNT(*) FROM MESSAGE 
+                WHERE conv_id = c.conv_id AND receiver_id = %s AND status != 'read') as unread_count
+        FROM CONVERSATION c
+        JOIN CONVERSATION_PARTICIPANT cp ON cp.conversation_id = c.conv_id
+        WHERE c.type = 'group' AND cp.user_id = %s
+        ORDER BY c.last_message_at DESC, c.created_at DESC
+    """
+    
+    groups = db.execute_query(query, (user_id, user_id))
+    
+    if not groups:
+        return []
+    
+    return [{
+        'group_id': group['conv_id'],
+        'name': group['name'],
+        'created_by': group['created_by'],
+        'created_at': group['created_at'].isoformat() if group['created_at'] else None,
+        'last_message_at': group['last_message_at'].isoformat() if group['last_message_at'] else None,
+        'privacy': group['privacy_settings'],
+        'role': group['role'],
+        'member_count': group['member_count'],
+        'unread_count': group['unread_count'] or 0
+    } for group in groups]
+
+
 @groups_bp.route('/list', methods=['GET'])
 @login_required
 def list_groups():
@@ -82,45 +174,25 @@ def list_groups():
     try:
         current_user_id = session.get('user_id')
         
-        query = """
-            SELECT c.conv_id, c.name, c.created_by, c.created_at, c.last_message_at,
-                   c.privacy_settings,
-                   cp.role,
-                   (SELECT COUNT(*) FROM CONVERSATION_PARTICIPANT 
-                    WHERE conversation_id = c.conv_id) as member_count,
-                   (SELECT COUNT(*) FROM MESSAGE 
-                    WHERE conv_id = c.conv_id AND receiver_id = %s AND status != 'read') as unread_count
-            FROM CONVERSATION c
-            JOIN CONVERSATION_PARTICIPANT cp ON cp.conversation_id = c.conv_id
-            WHERE c.type = 'group' AND cp.user_id = %s
-            ORDER BY c.last_message_at DESC, c.created_at DESC
+        # Version state: which groups, when each last changed
+        version_query = """
+            SELECT cp.conversation_id, c.last_message_at
+            FROM CONVERSATION_PARTICIPANT cp
+            JOIN CONVERSATION c ON c.conv_id = cp.conversation_id
+            WHERE cp.user_id = %s AND c.type = 'group'
         """
-        
-        groups = db.execute_query(query, (current_user_id, current_user_id))
-        
-        if not groups:
-            return jsonify({'groups': []})
-        
-        # Format groups for frontend
-        formatted_groups = []
-        for group in groups:
-            formatted_groups.append({
-                'group_id': group['conv_id'],
-                'name': group['name'],
-                'created_by': group['created_by'],
-                'created_at': group['created_at'].isoformat() if group['created_at'] else None,
-                'last_message_at': group['last_message_at'].isoformat() if group['last_message_at'] else None,
-                'privacy': group['privacy_settings'],
-                'role': group['role'],
-                'member_count': group['member_count'],
-                'unread_count': group['unread_count'] or 0
-            })
-        
-        return jsonify({'groups': formatted_groups})
+        memberships = db.execute_query(version_query, (current_user_id,)) or []
+        etag = make_etag('groups', current_user_id, sorted(
+            (row['conversation_id'], str(row['last_message_at']), versions.get('conversation', row['conversation_id']))
+            for row in memberships
+        ))
+        if is_fresh(etag):
+            return not_modified(etag)
+        
+        return with_etag(jsonify({'groups': load_user_groups(current_user_id)}), etag)
     
     except Exception as e:
-        print(f"[ERROR] Exception in list_groups: {str(e)}")
-        print(traceback.format_exc())
+        log.exception("groups.list_groups_failed")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
@@ -135,13 +207,9 @@ def get_group_details(group_id):
         current_user_id = session.get('user_id')
         
         # Check if user is member
-        member_check = """
-            SELECT role FROM CONVERSATION_PARTICIPANT
-            WHERE conversation_id = %s AND user_id = %s
-        """
-        membership = db.execute_query(member_check, (group_id, current_user_id))
+        user_role = group_members.role(group_id, current_user_id)
         
-        if not membership:
+        if not user_role:
             return jsonify({'success': False, 'error': 'Not a member of this group'}), 403
         
         # Get group info
@@ -177,7 +245,7 @@ def get_group_details(group_id):
                 'creator_username': group_data['creator_username'],
                 'created_at': group_data['created_at'].isoformat() if group_data['created_at'] else None,
                 'privacy': group_data['privacy_settings'],
-                'user_role': membership[0]['role'],
+                'user_role': user_role,
                 'members': [{
                     'user_id': m['user_id'],
                     'username': m['username'],
@@ -190,8 +258,7 @@ def get_group_details(group_id):
         })
     
     except Exception as e:
-        print(f"[ERROR] Exception in get_group_details: {str(e)}")
-        print(traceback.format_exc())
+        log.exception("groups.get_group_details_failed")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
@@ -201,58 +268,78 @@ def get_group_details(group_id):
 @groups_bp.route('/<int:group_id>/messages', methods=['GET'])
 @login_required
 def get_group_messages(group_id):
-    """Get all messages in a group"""
+    """Get the messages of a group, newest page first; ?before= pages back into the archive"""
     try:
         current_user_id = session.get('user_id')
         
-        # Check if user is member
-        member_check = """
-            SELECT 1 FROM CONVERSATION_PARTICIPANT
-            WHERE conversation_id = %s AND user_id = %s
-        """
-        membership = db.execute_query(member_check, (group_id, current_user_id))
+        before = request.args.get('before')
+        try:
+            cursor = parse_cursor(before) if before else None
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Invalid cursor'}), 400
         
-        if not membership:
+        # Check if user is member
+        if not group_members.is_member(group_id, current_user_id):
             return jsonify({'success': False, 'error': 'Not a member of this group'}), 403
         
-        # Get messages
+        # Opening a dormant group subscribes this user's socket to its room
+        join_online_users([current_user_id], f'group_{group_id}')
+        
+        # Revalidate from cheap state before touching MESSAGE; the in-process version
+        # alone misses writes made by other workers or after a restart
+        conv_result = db.execute_query("SELECT last_message_at FROM CONVERSATION WHERE conv_id = %s", (group_id,))
+        if not conv_result:
+            return jsonify({'success': False, 'error': 'Group not found'}), 404
+        etag = make_etag('group_messages', current_user_id, group_id, conv_result[0]['last_message_at'],
+                         versions.get('conversation', group_id), before)
+        if is_fresh(etag):
+            return not_modified(etag)
+        
+        # Newest page of the group, from the tail cache when it is hot
         query = """
             SELECT m.msg_id, m.sender_id, m.content, m.timestamp, 
-                   m.status, m.attachment_path, m.edited, m.deleted,
-                   u.username as sender_username
+                   m.status, m.attachment_path, m.edited, m.deleted
             FROM MESSAGE m
-            JOIN USER u ON m.sender_id = u.user_id
             WHERE m.conv_id = %s
-            ORDER BY m.timestamp ASC
-            LIMIT 200
+            ORDER BY m.timestamp DESC, m.msg_id DESC
+            LIMIT %s
+        """
+        
+        older_query = """
+            SELECT m.msg_id, m.sender_id, m.content, m.timestamp, 
+                   m.status, m.attachment_path, m.edited, m.deleted
+            FROM MESSAGE m
+            WHERE m.conv_id = %s AND m.timestamp <= %s
+              AND (m.timestamp < %s OR m.msg_id < %s)
+            ORDER BY m.timestamp DESC, m.msg_id DESC
+            LIMIT %s
         """
         
-        messages = db.execute_query(query, (group_id,))
+        def load_page():
+            if cursor is None:
+                rows = db.execute_query(query, (group_id, GROUP_HISTORY_PAGE_SIZE))
+            else:
+                at = cursor[0].strftime(TIMESTAMP_FORMAT)
+                rows = db.execute_query(older_query, (group_id, at, at, cursor[1], GROUP_HISTORY_PAGE_SIZE))
+            if rows is None:
+                return None
+            rows += message_archive.read(group_id, cursor, GROUP_HISTORY_PAGE_SIZE - len(rows))
+            attachment_store.attach_metadata(user_profiles.attach_usernames(rows))
+            return [history_entry(row) for row in reversed(rows)]
+        
+        if cursor is None:
+            messages = history_cache.get_or_load(group_id, GROUP_HISTORY_PAGE_SIZE, load_page)
+        else:
+            messages = load_page()
         
         if not messages:
-            return jsonify({'messages': []})
-        
-        # Format messages
-        formatted_messages = []
-        for msg in messages:
-            formatted_messages.append({
-                'msg_id': msg['msg_id'],
-                'sender_id': msg['sender_id'],
-                'sender_username': msg['sender_username'],
-                'content': msg['content'],
-                'timestamp': msg['timestamp'].isoformat() if msg['timestamp'] else None,
-                'status': msg['status'],
-                'attachment_path': msg['attachment_path'],
-                'is_mine': msg['sender_id'] == current_user_id,
-                'edited': msg.get('edited', False),
-                'deleted': msg.get('deleted', False)
-            })
+            return with_etag(jsonify({'messages': [], 'before': None}), etag)
         
-        return jsonify({'messages': formatted_messages})
+        return with_etag(jsonify({'messages': for_viewer(messages, current_user_id),
+                                  'before': history_cursor(messages, GROUP_HISTORY_PAGE_SIZE)}), etag)
     
     except Exception as e:
-        print(f"[ERROR] Exception in get_group_messages: {str(e)}")
-        print(traceback.format_exc())
+        log.exception("groups.get_group_messages_failed")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
@@ -268,26 +355,31 @@ def send_group_message(group_id):
         data = request.get_json()
         
         content = data.get('content', '').strip()
+        attachment_path = data.get('attachment_path') or None
         
-        if not content:
+        if not (content or attachment_path):
             return jsonify({'success': False, 'error': 'Message content required'}), 400
         
-        # Check if user is member
-        member_check = """
-            SELECT 1 FROM CONVERSATION_PARTICIPANT
-            WHERE conversation_id = %s AND user_id = %s
-        """
-        membership = db.execute_query(member_check, (group_id, current_user_id))
+        # Only a file the sender can already read; knowing its hash is not enough
+        if attachment_path and not attachment_store.readable(attachment_path, current_user_id):
+            return jsonify({'success': False, 'error': 'Unknown attachment'}), 400
         
-        if not membership:
+        # Members only, before spending from the group's budget
+        if not group_members.is_member(group_id, current_user_id):
             return jsonify({'success': False, 'error': 'Not a member of this group'}), 403
         
+        rejection = send_admission.admit(current_user_id, group_conversation_key(group_id))
+        if rejection:
+            response = jsonify({'success': False, **rejection})
+            response.headers['Retry-After'] = str(max(1, round(rejection['retry_after'])))
+            return response, 429
+        
         # Insert message (receiver_id = sender_id for group messages)
         insert_query = """
-            INSERT INTO MESSAGE (sender_id, receiver_id, content, conv_id, timestamp, status, pinned)
-            VALUES (%s, %s, %s, %s, NOW(), 'sent', FALSE)
+            INSERT INTO MESSAGE (sender_id, receiver_id, content, conv_id, attachment_path, timestamp, status, pinned)
+            VALUES (%s, %s, %s, %s, %s, NOW(), 'sent', FALSE)
         """
-        result = db.execute_update(insert_query, (current_user_id, current_user_id, content, group_id))
+        result = db.execute_update(insert_query, (current_user_id, current_user_id, content, group_id, attachment_path))
         
         if not result:
             return jsonify({'success': False, 'error': 'Failed to send message'}), 500
@@ -301,19 +393,19 @@ def send_group_message(group_id):
             WHERE conv_id = %s
         """
         db.execute_update(update_conv_query, (group_id,))
+        record_change(group_id, 'new', current_user_id, msg_id)
         
         # Get the message details
         msg_query = """
-            SELECT m.msg_id, m.sender_id, m.content, m.timestamp, m.status,
-                   u.username as sender_username
+            SELECT m.msg_id, m.sender_id, m.content, m.timestamp, m.status, m.attachment_path
             FROM MESSAGE m
-            JOIN USER u ON m.sender_id = u.user_id
             WHERE m.msg_id = %s
         """
         message = db.execute_query(msg_query, (msg_id,))
         
         if message:
-            msg = message[0]
+            msg = attachment_store.attach_metadata(user_profiles.attach_usernames(message))[0]
+            history_cache.append(group_id, history_entry(msg))
             return jsonify({
                 'success': True,
                 'message': {
@@ -323,22 +415,51 @@ def send_group_message(group_id):
                     'content': msg['content'],
                     'timestamp': msg['timestamp'].isoformat() if msg['timestamp'] else None,
                     'status': msg['status'],
+                    'attachment_path': msg['attachment_path'],
+                    **attachment_fields(msg),
                     'is_mine': True,
                     'group_id': group_id
                 }
             })
         
+        history_cache.invalidate(group_id)
         return jsonify({'success': True})
     
     except Exception as e:
-        print(f"[ERROR] Exception in send_group_message: {str(e)}")
-        print(traceback.format_exc())
+        log.exception("groups.send_group_message_failed")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
 # =====================================================
-# ADD MEMBER TO GROUP
+# ADD MEMBERS TO GROUP
 # =====================================================
+def is_group_admin(group_id, user_id):
+    return group_members.role(group_id, user_id) == 'admin'
+
+
+def add_members_to_group(group_id, user_ids):
+    """Validate and add user_ids to a group in one transaction.
+
+    Returns (added, already_members, not_found), or None if validation failed.
+    """
+    found, members = classify_candidates(group_id, user_ids)
+    if found is None:
+        return None
+    
+    added = [user_id for user_id in user_ids if user_id in found and user_id not in members]
+    already_members = [user_id for user_id in user_ids if user_id in members]
+    not_found = [user_id for user_id in user_ids if user_id not in found]
+    
+    if added:
+        with db.transaction() as tx:
+            insert_participants(tx, group_id, [(user_id, 'member') for user_id in added])
+        group_members.add(group_id, added)
+        bump_conversation(group_id)
+        join_online_users(added, f'group_{group_id}')
+    
+    return added, already_members, not_found
+
+
 @groups_bp.route('/<int:group_id>/add-member', methods=['POST'])
 @login_required
 def add_member(group_id):
@@ -352,41 +473,64 @@ def add_member(group_id):
         if not new_member_id:
             return jsonify({'success': False, 'error': 'User ID required'}), 400
         
-        # Check if current user is admin
-        role_check = """
-            SELECT role FROM CONVERSATION_PARTICIPANT
-            WHERE conversation_id = %s AND user_id = %s
-        """
-        user_role = db.execute_query(role_check, (group_id, current_user_id))
+        new_member_ids = parse_user_ids([new_member_id])
+        if new_member_ids is None:
+            return jsonify({'success': False, 'error': 'Invalid user ID'}), 400
         
-        if not user_role or user_role[0]['role'] != 'admin':
+        # Check if current user is admin
+        if not is_group_admin(group_id, current_user_id):
             return jsonify({'success': False, 'error': 'Only admins can add members'}), 403
         
-        # Check if user already member
-        member_check = """
-            SELECT 1 FROM CONVERSATION_PARTICIPANT
-            WHERE conversation_id = %s AND user_id = %s
-        """
-        existing = db.execute_query(member_check, (group_id, new_member_id))
+        result = add_members_to_group(group_id, new_member_ids)
+        if result is None:
+            return jsonify({'success': False, 'error': 'Failed to add member'}), 500
         
-        if existing:
+        added, already_members, not_found = result
+        if already_members:
             return jsonify({'success': False, 'error': 'User already in group'}), 400
+        if not_found:
+            return jsonify({'success': False, 'error': 'User not found'}), 404
         
-        # Add member
-        add_query = """
-            INSERT INTO CONVERSATION_PARTICIPANT (conversation_id, user_id, role)
-            VALUES (%s, %s, 'member')
-        """
-        result = db.execute_update(add_query, (group_id, new_member_id))
+        return jsonify({'success': True, 'message': 'Member added successfully'})
+    
+    except Exception as e:
+        log.exception("groups.add_member_failed")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@groups_bp.route('/<int:group_id>/add-members', methods=['POST'])
+@login_required
+def add_members(group_id):
+    """Add many members to a group in one request (admin only)"""
+    try:
+        current_user_id = session.get('user_id')
+        data = request.get_json() or {}
         
-        if result:
-            return jsonify({'success': True, 'message': 'Member added successfully'})
-        else:
-            return jsonify({'success': False, 'error': 'Failed to add member'}), 500
+        user_ids = parse_user_ids(data.get('user_ids'))
+        
+        if not user_ids:
+            return jsonify({'success': False, 'error': 'user_ids must be a non-empty list of user IDs'}), 400
+        
+        if not is_group_admin(group_id, current_user_id):
+            return jsonify({'success': False, 'error': 'Only admins can add members'}), 403
+        
+        result = add_members_to_group(group_id, user_ids)
+        if result is None:
+            return jsonify({'success': False, 'error': 'Failed to add members'}), 500
+        
+        added, already_members, not_found = result
+        log.info("groups.members_added", group_id=group_id, added=len(added),
+                 already_members=len(already_members), not_found=len(not_found))
+        
+        return jsonify({
+            'success': True,
+            'added': added,
+            'already_members': already_members,
+            'not_found': not_found
+        })
     
     except Exception as e:
-        print(f"[ERROR] Exception in add_member: {str(e)}")
-        print(traceback.format_exc())
+        log.exception("groups.add_members_failed")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
@@ -401,13 +545,7 @@ def remove_member(group_id, member_id):
         current_user_id = session.get('user_id')
         
         # Check if current user is admin
-        role_check = """
-            SELECT role FROM CONVERSATION_PARTICIPANT
-            WHERE conversation_id = %s AND user_id = %s
-        """
-        user_role = db.execute_query(role_check, (group_id, current_user_id))
-        
-        if not user_role or user_role[0]['role'] != 'admin':
+        if not is_group_admin(group_id, current_user_id):
             return jsonify({'success': False, 'error': 'Only admins can remove members'}), 403
         
         # Cannot remove creator
@@ -427,13 +565,14 @@ def remove_member(group_id, member_id):
         result = db.execute_update(delete_query, (group_id, member_id))
         
         if result:
+            group_members.remove(group_id, member_id)
+            bump_conversation(group_id)
             return jsonify({'success': True, 'message': 'Member removed'})
         else:
             return jsonify({'success': False, 'error': 'Failed to remove member'}), 500
     
     except Exception as e:
-        print(f"[ERROR] Exception in remove_member: {str(e)}")
-        print(traceback.format_exc())
+        log.exception("groups.remove_member_failed")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
@@ -464,13 +603,14 @@ def leave_group(group_id):
         result = db.execute_update(delete_query, (group_id, current_user_id))
         
         if result:
+            group_members.remove(group_id, current_user_id)
+            bump_conversation(group_id)
             return jsonify({'success': True, 'message': 'Left group successfully'})
         else:
             return jsonify({'success': False, 'error': 'Failed to leave group'}), 500
     
     except Exception as e:
-        print(f"[ERROR] Exception in leave_group: {str(e)}")
-        print(traceback.format_exc())
+        log.exception("groups.leave_group_failed")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
@@ -493,18 +633,21 @@ def delete_group(group_id):
         if not creator or creator[0]['created_by'] != current_user_id:
             return jsonify({'success': False, 'error': 'Only creator can delete group'}), 403
         
-        # Delete group (cascade will delete participants and messages)
+        # Cascades to participants, change log and archive index, and on MySQL to MESSAGE through
+        # fk_message_conversation. Without that key (SQLite) the purge worker removes the orphans.
         delete_query = """
             DELETE FROM CONVERSATION WHERE conv_id = %s
         """
         result = db.execute_update(delete_query, (group_id,))
         
         if result:
+            group_members.drop(group_id)
+            history_cache.invalidate(group_id)
+            message_archive.drop(group_id)
             return jsonify({'success': True, 'message': 'Group deleted successfully'})
         else:
             return jsonify({'success': False, 'error': 'Failed to delete group'}), 500
     
     except Exception as e:
-        print(f"[ERROR] Exception in delete_group: {str(e)}")
-        print(traceback.format_exc())
+        log.exception("groups.delete_group_failed")
         return jsonify({'success': False, 'error': str(e)}), 500
\ No newline at end of file
@@ -0,0 +1,45 @@
+"""Image work run inside the thumbnail worker processes.
+
+Kept free of database, logging and Flask imports so the module stays cheap to
+load; Pillow is optional (without it no thumbnails are made). Spawned workers
+also re-import the app's main module, which opens no database connections
+and starts no background tasks on import.
+"""
+import os
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+PIL_AVAILABLE = Image is not None
+
+# Formats Pillow cannot rasterize or that gain nothing from a preview
+UNSUPPORTED_TYPES = ('image/svg+xml', 'image/x-icon', 'image/vnd.microsoft.icon')
+
+
+def can_thumbnail(mime_type):
+    return PIL_AVAILABLE and mime_type.startswith('image/') and mime_type not in UNSUPPORTED_TYPES
+
+
+def make_thumbnail(source_path, target_path, max_edge, quality=80):
+    """Write a JPEG no larger than max_edge on either side; returns the original's dimensions.
+
+    An existing target is kept (same hash, same bytes), so repeated calls
+    only read the image header.
+    """
+    with Image.open(source_path) as image:
+        width, height = image.size
+        if not os.path.exists(target_path):
+            # Let the JPEG decoder downscale while decoding instead of after
+            image.draft('RGB', (max_edge, max_edge))
+            thumbnail = ImageOps.exif_transpose(image)
+            thumbnail.thumbnail((max_edge, max_edge))
+            if thumbnail.mode != 'RGB':
+                thumbnail = thumbnail.convert('RGB')
+
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            temp_path = f'{target_path}.{os.getpid()}.tmp'
+            thumbnail.save(temp_path, 'JPEG', quality=quality, optimize=True)
+            os.replace(temp_path, target_path)
+    return {'width': width, 'height': height}
\ No newline at end of file
@@ -0,0 +1,166 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+
+ROOT_LOGGER_NAME = 'chatflow'
+
+_listener = None
+_setup_lock = threading.Lock()
+
+
+# =====================================================
+# FORMATTERS
+# =====================================================
+class StructuredFormatter(logging.Formatter):
+    """Render a record as one line: either key=value text or JSON"""
+
+    def __init__(self, fmt_type='text'):
+        super().__init__()
+        self.fmt_type = fmt_type
+
+    def format(self, record):
+        fields = getattr(record, 'fields', None) or {}
+        timestamp = datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat()
+
+        if self.fmt_type == 'json':
+            entry = {
+                'ts': timestamp,
+                'level': record.levelname,
+                'logger': record.name,
+                'event': record.getMessage(),
+                'thread': record.threadName,
+            }
+            entry.update(fields)
+            if record.exc_info:
+                entry['exc'] = self.formatException(record.exc_info)
+            return json.dumps(entry, default=str)
+
+        line = f"{timestamp} {record.levelname:<7} {record.name} {record.getMessage()}"
+        if fields:
+            line += ' ' + ' '.join(f"{key}={value}" for key, value in fields.items())
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line
+
+
+# =====================================================
+# QUEUE HANDLER (formatting happens on the writer thread)
+# =====================================================
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Hand records to the background writer without formatting or blocking"""
+
+    dropped = 0
+
+    def prepare(self, record):
+        # Records never leave the process, so skip the eager formatting that
+        # the stock QueueHandler does on the calling thread.
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            NonBlockingQueueHandler.dropped += 1
+
+
+# =====================================================
+# STRUCTURED LOGGER
+# =====================================================
+class StructuredLogger:
+    """Thin wrapper taking an event name plus keyword fields.
+
+    The level check happens before any record is built, so disabled
+    debug calls cost one integer comparison.
+    """
+
+    def __init__(self, logger):
+        self._logger = logger
+
+    def is_enabled(self, level):
+        return self._logger.isEnabledFor(level)
+
+    def _log(self, level, event, fields, exc_info=None):
+        if not self._logger.isEnabledFor(level):
+            return
+        self._logger.log(level, event, extra={'fields': fields}, exc_info=exc_info)
+
+    def debug(self, event, **fields):
+        self._log(logging.DEBUG, event, fields)
+
+    def info(self, event, **fields):
+        self._log(logging.INFO, event, fields)
+
+    def warning(self, event, **fields):
+        self._log(logging.WARNING, event, fields)
+
+    def error(self, event, **fields):
+        self._log(logging.ERROR, event, fields)
+
+    def exception(self, event, **fields):
+        """Log at ERROR level with the current exception's traceback"""
+        self._log(logging.ERROR, event, fields, exc_info=True)
+
+
+# =====================================================
+# SETUP
+# =====================================================
+def setup_logging(level=None, fmt_type=None, stream=None):
+    """Attach the queue handler and start the background writer (idempotent)"""
+    global _listener
+
+    with _setup_lock:
+        if _listener is not None:
+            return _listener
+
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+
+        writer = logging.StreamHandler(stream or sys.stdout)
+        writer.setFormatter(StructuredFormatter(fmt_type or LOG_FORMAT))
+
+        root = logging.getLogger(ROOT_LOGGER_NAME)
+        root.setLevel(level or LOG_LEVEL)
+        root.addHandler(NonBlockingQueueHandler(log_queue))
+        root.propagate = False
+
+        _listener = logging.handlers.QueueListener(log_queue, writer, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+        return _listener
+
+
+def shutdown_logging():
+    """Flush queued records and stop the background writer"""
+    global _listener
+
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+            root = logging.getLogger(ROOT_LOGGER_NAME)
+            for handler in list(root.handlers):
+                if isinstance(handler, NonBlockingQueueHandler):
+                    root.removeHandler(handler)
+
+
+def get_logger(name):
+    """Get a structured logger under the app's logger namespace"""
+    setup_logging()
+    if not name.startswith(ROOT_LOGGER_NAME):
+        name = f"{ROOT_LOGGER_NAME}.{name}"
+    return StructuredLogger(logging.getLogger(name))
\ No newline at end of file
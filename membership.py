@@ -0,0 +1,114 @@
+import os
+import threading
+from collections import OrderedDict
+from database.db import db
+from logger import get_logger
+
+log = get_logger(__name__)
+
+# Groups whose member lists are kept in memory (least recently used are evicted)
+MEMBERSHIP_CACHE_GROUPS = int(os.getenv('MEMBERSHIP_CACHE_GROUPS', '10000'))
+
+
+# =====================================================
+# MEMBERSHIP INDEX
+# =====================================================
+class MembershipIndex:
+    """group_id -> {user_id: role}, loaded from CONVERSATION_PARTICIPANT on first use.
+
+    Every route that changes group membership (create, add, remove, leave,
+    delete) updates the index after its write commits, so authorization on
+    the send and read paths is a dict lookup. Evicted or never-seen groups
+    are reloaded with one indexed query.
+    """
+
+    def __init__(self, capacity=MEMBERSHIP_CACHE_GROUPS):
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._groups = OrderedDict()
+        self._writes = 0  # bumped by every mutation; guards lazy loads against racing writes
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self, group_id):
+        query = "SELECT user_id, role FROM CONVERSATION_PARTICIPANT WHERE conversation_id = %s"
+        rows = db.execute_query(query, (group_id,))
+        if rows is None:
+            # Query failed; don't cache a wrong answer
+            return None
+        return {row['user_id']: row['role'] for row in rows}
+
+    def _store(self, group_id, members):
+        self._groups[group_id] = members
+        self._groups.move_to_end(group_id)
+        while len(self._groups) > self.capacity:
+            self._groups.popitem(last=False)
+
+    def members(self, group_id):
+        """{user_id: role} for a group; empty if it has no members or does not exist"""
+        group_id = int(group_id)
+        with self._lock:
+            members = self._groups.get(group_id)
+            if members is not None:
+                self._groups.move_to_end(group_id)
+                self.hits += 1
+                return members
+            self.misses += 1
+            writes = self._writes
+
+        members = self._load(group_id)
+        if members is None:
+            return {}
+        with self._lock:
+            # A membership write during the load may have made these rows stale; serve them
+            # for this call but let the next lookup reload
+            if members and self._writes == writes and group_id not in self._groups:
+                self._store(group_id, members)
+        return members
+
+    def role(self, group_id, user_id):
+        """The user's role in the group, or None if not a member"""
+        return self.members(group_id).get(int(user_id))
+
+    def is_member(self, group_id, user_id):
+        return self.role(group_id, user_id) is not None
+
+    def set_group(self, group_id, members):
+        """Replace a group's member map (e.g. right after it was created)"""
+        with self._lock:
+            self._writes += 1
+            self._store(int(group_id), dict(members))
+
+    def add(self, group_id, user_ids, role='member'):
+        group_id = int(group_id)
+        with self._lock:
+            self._writes += 1
+            members = self._groups.get(group_id)
+            # Not cached: the next lookup loads the committed rows anyway
+            if members is not None:
+                self._groups[group_id] = {**members, **{int(user_id): role for user_id in user_ids}}
+
+    def remove(self, group_id, user_id):
+        group_id = int(group_id)
+        with self._lock:
+            self._writes += 1
+            members = self._groups.get(group_id)
+            if members is not None:
+                self._groups[group_id] = {uid: role for uid, role in members.items() if uid != int(user_id)}
+
+    def drop(self, group_id):
+        """Forget a deleted group"""
+        with self._lock:
+            self._writes += 1
+            self._groups.pop(int(group_id), None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'groups': len(self._groups),
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+group_members = MembershipIndex()
\ No newline at end of file
@@ -2,25 +2,49 @@ from flask import Blueprint, jsonify, request, session
 from database.db import db
 from routes.auth import login_required
 from datetime import datetime
-import traceback
+from logger import get_logger
+from routes.sync import record_change
+from rate_limit import direct_conversation_key, send_admission
+from etags import is_fresh, make_etag, not_modified, versions, with_etag
+from tail_cache import for_viewer, history_cache, history_entry
+from profiles import user_profiles
+from unread import unread_counters
+from attachments import attachment_fields, attachment_store
+from archive import TIMESTAMP_FORMAT, history_cursor, message_archive, parse_cursor
+from socketio_events import push_unread
+
+log = get_logger(__name__)
 
 messages_bp = Blueprint('messages', __name__, url_prefix='/api/messages')
 
+HISTORY_PAGE_SIZE = 100
+
 # =====================================================
 # GET CHAT HISTORY (UPDATED FOR CONVERSATIONS)
 # =====================================================
 @messages_bp.route('/history/<int:contact_id>', methods=['GET'])
 @login_required
 def get_chat_history(contact_id):
-    """Get all messages between current user and a contact"""
+    """Get messages between current user and a contact, a page at a time.
+
+    Without ?before= this is the newest page; each response's `before`
+    cursor fetches the page preceding it, from MESSAGE and then from the
+    archive, and is null once the start of the conversation is reached.
+    """
     try:
         current_user_id = session.get('user_id')
         
-        print(f"[DEBUG] Getting chat history between {current_user_id} and {contact_id}")
+        before = request.args.get('before')
+        try:
+            cursor = parse_cursor(before) if before else None
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Invalid cursor'}), 400
+        
+        log.debug("messages.history_requested", user_id=current_user_id, contact_id=contact_id)
         
         # First, find the conversation between these users
         conv_query = """
-            SELECT cp1.conversation_id
+            SELECT cp1.conversation_id, c.last_message_at
             FROM CONVERSATION_PARTICIPANT cp1
             JOIN CONVERSATION_PARTICIPANT cp2 ON cp1.conversation_id = cp2.conversation_id
             JOIN CONVERSATION c ON c.conv_id = cp1.conversation_id
@@ -32,52 +56,70 @@ def get_chat_history(contact_id):
         conv_result = db.execute_query(conv_query, (current_user_id, contact_id))
         
         if not conv_result:
-            print(f"[DEBUG] No conversation exists yet between {current_user_id} and {contact_id}")
+            log.debug("messages.history_no_conversation", user_id=current_user_id, contact_id=contact_id)
             return jsonify({'messages': []})
         
         conv_id = conv_result[0]['conversation_id']
-        print(f"[DEBUG] Found conversation: {conv_id}")
+        log.debug("messages.history_conversation", conv_id=conv_id)
+        
+        # Revalidate from cheap state before touching MESSAGE
+        etag = make_etag('history', current_user_id, conv_id, conv_result[0]['last_message_at'],
+                         versions.get('conversation', conv_id), before)
+        if is_fresh(etag):
+            log.debug("messages.history_not_modified", conv_id=conv_id)
+            return not_modified(etag)
         
-        # Get messages from this conversation
+        # Newest page of this conversation, from the tail cache when it is hot
         query = """
             SELECT m.msg_id, m.sender_id, m.receiver_id, m.content, 
-                   m.timestamp, m.status, m.attachment_path, m.edited, m.deleted,
-                   u.username as sender_username
+                   m.timestamp, m.status, m.attachment_path, m.edited, m.deleted
             FROM MESSAGE m
-            JOIN USER u ON m.sender_id = u.user_id
             WHERE m.conv_id = %s
-            ORDER BY m.timestamp ASC
-            LIMIT 100
+            ORDER BY m.timestamp DESC, m.msg_id DESC
+            LIMIT %s
         """
         
-        messages = db.execute_query(query, (conv_id,))
+        # Older pages: keyset on (timestamp, msg_id) below the cursor
+        older_query = """
+            SELECT m.msg_id, m.sender_id, m.receiver_id, m.content, 
+                   m.timestamp, m.status, m.attachment_path, m.edited, m.deleted
+            FROM MESSAGE m
+            WHERE m.conv_id = %s AND m.timestamp <= %s
+              AND (m.timestamp < %s OR m.msg_id < %s)
+            ORDER BY m.timestamp DESC, m.msg_id DESC
+            LIMIT %s
+        """
+        
+        def load_page():
+            if cursor is None:
+                rows = db.execute_query(query, (conv_id, HISTORY_PAGE_SIZE))
+            else:
+                at = cursor[0].strftime(TIMESTAMP_FORMAT)
+                rows = db.execute_query(older_query, (conv_id, at, at, cursor[1], HISTORY_PAGE_SIZE))
+            if rows is None:
+                return None
+            # Archived messages are all older than the hot ones
+            rows += message_archive.read(conv_id, cursor, HISTORY_PAGE_SIZE - len(rows))
+            attachment_store.attach_metadata(user_profiles.attach_usernames(rows))
+            return [history_entry(row) for row in reversed(rows)]
+        
+        if cursor is None:
+            messages = history_cache.get_or_load(conv_id, HISTORY_PAGE_SIZE, load_page)
+        else:
+            messages = load_page()
         
         if not messages:
-            return jsonify({'messages': []})
+            return with_etag(jsonify({'messages': [], 'before': None}), etag)
         
         # Format messages for frontend
-        formatted_messages = []
-        for msg in messages:
-            formatted_messages.append({
-                'msg_id': msg['msg_id'],
-                'sender_id': msg['sender_id'],
-                'receiver_id': msg['receiver_id'],
-                'content': msg['content'],
-                'timestamp': msg['timestamp'].isoformat() if msg['timestamp'] else None,
-                'status': msg['status'],
-                'attachment_path': msg['attachment_path'],
-                'sender_username': msg['sender_username'],
-                'is_mine': msg['sender_id'] == current_user_id,
-                'edited': msg.get('edited', False),
-                'deleted': msg.get('deleted', False)
-            })
+        formatted_messages = for_viewer(messages, current_user_id)
         
-        print(f"[DEBUG] Returning {len(formatted_messages)} messages")
-        return jsonify({'messages': formatted_messages})
+        log.debug("messages.history_returned", conv_id=conv_id, count=len(formatted_messages))
+        return with_etag(jsonify({'messages': formatted_messages,
+                                  'before': history_cursor(messages, HISTORY_PAGE_SIZE)}), etag)
     
     except Exception as e:
-        print(f"[ERROR] Exception in get_chat_history: {str(e)}")
-        print(traceback.format_exc())
+        log.exception("messages.get_chat_history_failed")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
@@ -94,18 +136,29 @@ def send_message():
         
         receiver_id = data.get('receiver_id')
         content = data.get('content', '').strip()
+        attachment_path = data.get('attachment_path') or None
         
-        print(f"[DEBUG] Sending message from {current_user_id} to {receiver_id}")
+        log.debug("messages.send_requested", sender_id=current_user_id, receiver_id=receiver_id)
         
-        if not receiver_id or not content:
+        if not receiver_id or not (content or attachment_path):
             return jsonify({'success': False, 'error': 'Receiver and content required'}), 400
         
+        # Only a file the sender can already read; knowing its hash is not enough
+        if attachment_path and not attachment_store.readable(attachment_path, current_user_id):
+            return jsonify({'success': False, 'error': 'Unknown attachment'}), 400
+        
+        rejection = send_admission.admit(current_user_id, direct_conversation_key(current_user_id, receiver_id))
+        if rejection:
+            response = jsonify({'success': False, **rejection})
+            response.headers['Retry-After'] = str(max(1, round(rejection['retry_after'])))
+            return response, 429
+        
         # Check if receiver exists
         user_query = "SELECT user_id FROM USER WHERE user_id = %s"
         user = db.execute_query(user_query, (receiver_id,))
         
         if not user:
-            print(f"[ERROR] User {receiver_id} not found")
+            log.warning("messages.receiver_not_found", receiver_id=receiver_id)
             return jsonify({'success': False, 'error': 'User not found'}), 404
         
         # Check if blocked
@@ -118,7 +171,7 @@ def send_message():
                                                   receiver_id, current_user_id))
         
         if blocked:
-            print(f"[ERROR] User {current_user_id} and {receiver_id} have blocking relationship")
+            log.info("messages.send_blocked", sender_id=current_user_id, receiver_id=receiver_id)
             return jsonify({'success': False, 'error': 'Cannot send message'}), 403
         
         # Get or create conversation
@@ -136,10 +189,10 @@ def send_message():
         
         if conv_result:
             conv_id = conv_result[0]['conversation_id']
-            print(f"[DEBUG] Using existing conversation: {conv_id}")
+            log.debug("messages.conversation_found", conv_id=conv_id)
         else:
             # Create new conversation
-            print(f"[DEBUG] Creating new conversation between {current_user_id} and {receiver_id}")
+            log.debug("messages.conversation_creating", sender_id=current_user_id, receiver_id=receiver_id)
             create_conv_query = """
                 INSERT INTO CONVERSATION (type, created_by)
                 VALUES ('direct', %s)
@@ -147,11 +200,11 @@ def send_message():
             result = db.execute_update(create_conv_query, (current_user_id,))
             
             if not result:
-                print("[ERROR] Failed to create conversation")
+                log.error("messages.conversation_create_failed", sender_id=current_user_id, receiver_id=receiver_id)
                 return jsonify({'success': False, 'error': 'Failed to create conversation'}), 500
             
             conv_id = db.get_insert_id()
-            print(f"[DEBUG] Created conversation: {conv_id}")
+            log.debug("messages.conversation_created", conv_id=conv_id)
             
             # Add both participants
             add_participants_query = """
@@ -159,22 +212,22 @@ def send_message():
                 VALUES (%s, %s), (%s, %s)
             """
             db.execute_update(add_participants_query, (conv_id, current_user_id, conv_id, receiver_id))
-            print(f"[DEBUG] Added participants to conversation {conv_id}")
+            log.debug("messages.participants_added", conv_id=conv_id)
         
         # Insert message
         insert_query = """
-            INSERT INTO MESSAGE (sender_id, receiver_id, content, conv_id, timestamp, status, pinned) 
-            VALUES (%s, %s, %s, %s, NOW(), 'sent', FALSE)
+            INSERT INTO MESSAGE (sender_id, receiver_id, content, conv_id, attachment_path, timestamp, status, pinned) 
+            VALUES (%s, %s, %s, %s, %s, NOW(), 'sent', FALSE)
         """
-        result = db.execute_update(insert_query, (current_user_id, receiver_id, content, conv_id))
+        result = db.execute_update(insert_query, (current_user_id, receiver_id, content, conv_id, attachment_path))
         
         if not result:
-            print("[ERROR] Failed to insert message")
+            log.error("messages.insert_failed", conv_id=conv_id)
             return jsonify({'success': False, 'error': 'Failed to send message'}), 500
         
         # Get the inserted message ID
         msg_id = db.get_insert_id()
-        print(f"[DEBUG] Inserted message: {msg_id}")
+        log.debug("messages.inserted", msg_id=msg_id, conv_id=conv_id, length=len(content))
         
         # Update conversation last_message_at
         update_conv_query = """
@@ -183,20 +236,22 @@ def send_message():
             WHERE conv_id = %s
         """
         db.execute_update(update_conv_query, (conv_id,))
+        record_change(conv_id, 'new', current_user_id, msg_id)
+        unread_counters.incr(receiver_id, current_user_id)
+        push_unread(receiver_id, current_user_id, 1)
         
         # Get the full message details
         msg_query = """
             SELECT m.msg_id, m.sender_id, m.receiver_id, m.content, 
-                   m.timestamp, m.status, m.attachment_path,
-                   u.username as sender_username
+                   m.timestamp, m.status, m.attachment_path
             FROM MESSAGE m
-            JOIN USER u ON m.sender_id = u.user_id
             WHERE m.msg_id = %s
         """
         message = db.execute_query(msg_query, (msg_id,))
         
         if message:
-            msg = message[0]
+            msg = attachment_store.attach_metadata(user_profiles.attach_usernames(message))[0]
+            history_cache.append(conv_id, history_entry(msg))
             return jsonify({
                 'success': True,
                 'message': {
@@ -206,17 +261,19 @@ def send_message():
                     'content': msg['content'],
                     'timestamp': msg['timestamp'].isoformat() if msg['timestamp'] else None,
                     'status': msg['status'],
+                    'attachment_path': msg['attachment_path'],
+                    **attachment_fields(msg),
                     'sender_username': msg['sender_username'],
                     'is_mine': True,
                     'conv_id': conv_id
                 }
             })
         
+        history_cache.invalidate(conv_id)
         return jsonify({'success': True})
     
     except Exception as e:
-        print(f"[ERROR] Exception in send_message: {str(e)}")
-        print(traceback.format_exc())
+        log.exception("messages.send_message_failed")
         return jsonify({'success': False, 'error': f'Server error: {str(e)}'}), 500
 
 
@@ -230,7 +287,7 @@ def mark_messages_read(contact_id):
     try:
         current_user_id = session.get('user_id')
         
-        print(f"[DEBUG] Marking messages as read: user={current_user_id}, contact={contact_id}")
+        log.debug("messages.mark_read_requested", user_id=current_user_id, contact_id=contact_id)
         
         # Find conversation
         conv_query = """
@@ -260,12 +317,17 @@ def mark_messages_read(contact_id):
         """
         
         result = db.execute_update(update_query, (conv_id, current_user_id))
+        if result:
+            history_cache.mark_read(conv_id, current_user_id)
+            record_change(conv_id, 'read', current_user_id)
+            unread_counters.clear(current_user_id, contact_id)
+            push_unread(current_user_id, contact_id, -result)
         
-        print(f"[DEBUG] Marked {result} messages as read")
+        log.debug("messages.marked_read", conv_id=conv_id, updated=result)
         return jsonify({'success': True, 'updated': result if result else 0})
     
     except Exception as e:
-        print(f"[ERROR] Exception in mark_messages_read: {str(e)}")
+        log.exception("messages.mark_messages_read_failed")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
@@ -279,7 +341,7 @@ def delete_message(msg_id):
     current_user_id = session.get('user_id')
     
     # Check if user owns the message
-    check_query = "SELECT sender_id, receiver_id FROM MESSAGE WHERE msg_id = %s"
+    check_query = "SELECT sender_id, receiver_id, conv_id FROM MESSAGE WHERE msg_id = %s"
     message = db.execute_query(check_query, (msg_id,))
     
     if not message or message[0]['sender_id'] != current_user_id:
@@ -296,6 +358,8 @@ def delete_message(msg_id):
     result = db.execute_update(delete_query, (msg_id,))
     
     if result:
+        history_cache.update(message[0]['conv_id'], msg_id, deleted=True, content='This message was deleted')
+        record_change(message[0]['conv_id'], 'delete', current_user_id, msg_id)
         return jsonify({'success': True, 'message': 'Message deleted', 'receiver_id': receiver_id, 'msg_id': msg_id})
     else:
         return jsonify({'success': False, 'error': 'Failed to delete message'}), 500
@@ -316,7 +380,7 @@ def edit_message(msg_id):
         return jsonify({'success': False, 'error': 'Message content required'}), 400
     
     # Check if user owns the message
-    check_query = "SELECT sender_id, receiver_id FROM MESSAGE WHERE msg_id = %s"
+    check_query = "SELECT sender_id, receiver_id, conv_id FROM MESSAGE WHERE msg_id = %s"
     message = db.execute_query(check_query, (msg_id,))
     
     if not message or message[0]['sender_id'] != current_user_id:
@@ -333,6 +397,8 @@ def edit_message(msg_id):
     result = db.execute_update(update_query, (new_content, msg_id))
     
     if result:
+        history_cache.update(message[0]['conv_id'], msg_id, content=new_content, edited=True)
+        record_change(message[0]['conv_id'], 'edit', current_user_id, msg_id)
         return jsonify({
             'success': True, 
             'message': 'Message updated',
@@ -353,18 +419,7 @@ def get_unread_count():
     """Get unread message count for current user"""
     current_user_id = session.get('user_id')
     
-    query = """
-        SELECT COUNT(*) as unread_count
-        FROM MESSAGE 
-        WHERE receiver_id = %s AND status != 'read'
-    """
-    
-    result = db.execute_query(query, (current_user_id,))
-    
-    if result:
-        return jsonify({'unread_count': result[0]['unread_count']})
-    
-    return jsonify({'unread_count': 0})
+    return jsonify({'unread_count': unread_counters.total(current_user_id)})
 
 
 # =====================================================
@@ -376,19 +431,4 @@ def get_unread_per_contact():
     """Get unread message count for each contact"""
     current_user_id = session.get('user_id')
     
-    query = """
-        SELECT sender_id, COUNT(*) as unread_count
-        FROM MESSAGE 
-        WHERE receiver_id = %s AND status != 'read'
-        GROUP BY sender_id
-    """
-    
-    result = db.execute_query(query, (current_user_id,))
-    
-    if not result:
-        return jsonify({'unread': {}})
-    
-    # Format as dictionary
-    unread_dict = {row['sender_id']: row['unread_count'] for row in result}
-    
-    return jsonify({'unread': unread_dict})
\ No newline at end of file
+    return jsonify({'unread': unread_counters.per_sender(current_user_id)})
\ No newline at end of file
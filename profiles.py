@@ -0,0 +1,89 @@
+import os
+import sys
+import threading
+from database.db import db
+from logger import get_logger
+
+log = get_logger(__name__)
+
+# Profiles kept in memory; the oldest loaded are dropped first beyond this
+PROFILE_CACHE_USERS = int(os.getenv('PROFILE_CACHE_USERS', '100000'))
+
+
+# =====================================================
+# USER PROFILE CACHE
+# =====================================================
+class UserProfileCache:
+    """Process-wide user_id -> (username, status) map, filled lazily from USER.
+
+    Usernames never change after signup, so message queries read MESSAGE
+    alone and attach sender_username here. Status is refreshed by the
+    presence write paths. Each profile is one tuple of interned strings.
+    """
+
+    def __init__(self, capacity=PROFILE_CACHE_USERS):
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._profiles = {}  # user_id -> (username, status)
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self, user_ids):
+        placeholders = ', '.join(['%s'] * len(user_ids))
+        query = f"SELECT user_id, username, status FROM USER WHERE user_id IN ({placeholders})"
+        rows = db.execute_query(query, tuple(user_ids)) or []
+        loaded = {row['user_id']: (sys.intern(row['username']), sys.intern(row['status'] or 'offline'))
+                  for row in rows}
+        with self._lock:
+            self._profiles.update(loaded)
+            # dicts keep insertion order, so the front holds the profiles loaded longest ago
+            while len(self._profiles) > self.capacity:
+                del self._profiles[next(iter(self._profiles))]
+        return loaded
+
+    def get_many(self, user_ids):
+        """{user_id: (username, status)} for every id that exists; misses cost one query"""
+        found = {}
+        missing = []
+        with self._lock:
+            for user_id in set(user_ids):
+                profile = self._profiles.get(user_id)
+                if profile is None:
+                    missing.append(user_id)
+                else:
+                    found[user_id] = profile
+            self.hits += len(found)
+            self.misses += len(missing)
+        if missing:
+            found.update(self._load(missing))
+        return found
+
+    def username(self, user_id):
+        profile = self.get_many([user_id]).get(user_id)
+        return profile[0] if profile else None
+
+    def attach_usernames(self, rows, id_key='sender_id', name_key='sender_username'):
+        """Set row[name_key] from row[id_key] on every row, in place"""
+        profiles = self.get_many([row[id_key] for row in rows])
+        for row in rows:
+            profile = profiles.get(row[id_key])
+            row[name_key] = profile[0] if profile else None
+        return rows
+
+    def set_status(self, user_id, status):
+        """Keep a cached profile's status in step with UPDATE USER SET status"""
+        with self._lock:
+            profile = self._profiles.get(user_id)
+            if profile is not None:
+                self._profiles[user_id] = (profile[0], sys.intern(status))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'users': len(self._profiles),
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+user_profiles = UserProfileCache()
\ No newline at end of file
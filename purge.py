@@ -0,0 +1,265 @@
+"""Retention purge: hard-deletes rows nobody will read again, a small chunk at a time.
+
+Policies (days to keep; 0 keeps rows forever):
+
+    PURGE_DELETED_MESSAGES_DAYS  soft-deleted messages, counted from deleted_at
+    PURGE_ORPHANED_MESSAGES      messages of deleted conversations (1 = on)
+    PURGE_ACTIVITY_LOG_DAYS      USERACTIVITYLOG
+    PURGE_CHANGE_LOG_DAYS        MESSAGECHANGELOG (older sync cursors get resync_required)
+
+Every statement touches at most one chunk of primary keys, and the worker
+pauses between chunks for at least as long as the chunk took, so it never
+holds long locks or produces one huge replicated transaction.
+
+Run a cycle by hand or from cron (python purge.py), or set PURGE_INTERVAL
+to let the app run cycles in the background.
+"""
+import argparse
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from database.db import db
+from logger import get_logger
+from etags import bump_conversation
+from tail_cache import history_cache
+from unread import unread_counters
+from archive import TIMESTAMP_FORMAT, message_archive
+
+log = get_logger(__name__)
+
+PURGE_DELETED_MESSAGES_DAYS = int(os.getenv('PURGE_DELETED_MESSAGES_DAYS', '30'))
+PURGE_ORPHANED_MESSAGES = os.getenv('PURGE_ORPHANED_MESSAGES', '1') == '1'
+PURGE_ACTIVITY_LOG_DAYS = int(os.getenv('PURGE_ACTIVITY_LOG_DAYS', '90'))
+PURGE_CHANGE_LOG_DAYS = int(os.getenv('PURGE_CHANGE_LOG_DAYS', '30'))
+# Rows deleted per statement
+PURGE_CHUNK_ROWS = int(os.getenv('PURGE_CHUNK_ROWS', '500'))
+# Primary keys of MESSAGE examined per step when looking for deleted or orphaned messages
+PURGE_SCAN_ROWS = int(os.getenv('PURGE_SCAN_ROWS', '5000'))
+# Minimum pause between two chunks, in seconds
+PURGE_THROTTLE = float(os.getenv('PURGE_THROTTLE', '0.1'))
+# Chunks per policy per cycle; the next cycle continues where this one stopped
+PURGE_MAX_CHUNKS = int(os.getenv('PURGE_MAX_CHUNKS', '200'))
+# Seconds between background cycles; 0 leaves purging to an external job
+PURGE_INTERVAL = float(os.getenv('PURGE_INTERVAL', '0'))
+
+POLICIES = ('deleted_messages', 'orphaned_messages', 'activity_log', 'change_log')
+
+
+def _cutoff(days):
+    return datetime.now() - timedelta(days=days)
+
+
+# =====================================================
+# RETENTION PURGE
+# =====================================================
+class RetentionPurge:
+    """Walks MESSAGE by primary key for deleted and orphaned messages, and
+    trims the oldest rows of the two logs, in throttled chunks.
+
+    The MESSAGE walk keeps its position between cycles, so a large table
+    is covered over several cycles instead of in one long one.
+    """
+
+    def __init__(self, deleted_days=PURGE_DELETED_MESSAGES_DAYS, orphans=PURGE_ORPHANED_MESSAGES,
+                 activity_days=PURGE_ACTIVITY_LOG_DAYS, change_log_days=PURGE_CHANGE_LOG_DAYS,
+                 chunk_rows=PURGE_CHUNK_ROWS, scan_rows=PURGE_SCAN_ROWS,
+                 throttle=PURGE_THROTTLE, max_chunks=PURGE_MAX_CHUNKS):
+        self.deleted_days = deleted_days
+        self.orphans = orphans
+        self.activity_days = activity_days
+        self.change_log_days = change_log_days
+        self.chunk_rows = chunk_rows
+        self.scan_rows = scan_rows
+        self.throttle = throttle
+        self.max_chunks = max_chunks
+        self._lock = threading.Lock()
+        self._msg_cursor = 0  # last msg_id examined by the MESSAGE walk
+        self._metrics = {name: {'deleted': 0, 'chunks': 0, 'last_run': None} for name in POLICIES}
+        self.cycles = 0
+
+    def run_cycle(self, sleep=time.sleep):
+        """One pass over every enabled policy; returns {policy: rows deleted}"""
+        deleted = {name: 0 for name in POLICIES}
+        if self.deleted_days or self.orphans:
+            for name, count in self._purge_messages(sleep).items():
+                deleted[name] += count
+        if self.activity_days:
+            deleted['activity_log'] = self._purge_oldest('activity_log', """
+                SELECT log_id AS row_id, timestamp AS at
+                FROM USERACTIVITYLOG
+                ORDER BY log_id
+                LIMIT %s
+            """, """
+                DELETE FROM USERACTIVITYLOG
+                WHERE log_id <= %s AND timestamp < %s
+            """, _cutoff(self.activity_days), sleep)
+        if self.change_log_days:
+            deleted['change_log'] = self._purge_oldest('change_log', """
+                SELECT change_id AS row_id, changed_at AS at
+                FROM MESSAGECHANGELOG
+                ORDER BY change_id
+                LIMIT %s
+            """, """
+                DELETE FROM MESSAGECHANGELOG
+                WHERE change_id <= %s AND changed_at < %s
+            """, _cutoff(self.change_log_days), sleep)
+
+        now = datetime.now().isoformat()
+        with self._lock:
+            self.cycles += 1
+            for name in POLICIES:
+                self._metrics[name]['last_run'] = now
+        log.info("purge.cycle_finished", msg_cursor=self._msg_cursor, **deleted)
+        return deleted
+
+    def _pause(self, started, sleep):
+        # At most half of the wall time goes to purge statements
+        sleep(max(self.throttle, time.monotonic() - started))
+
+    def _count(self, name, deleted):
+        with self._lock:
+            self._metrics[name]['deleted'] += deleted
+            self._metrics[name]['chunks'] += 1
+
+    # -------------------------------------------------
+    # MESSAGE
+    # -------------------------------------------------
+    def _purge_messages(self, sleep):
+        deleted = {'deleted_messages': 0, 'orphaned_messages': 0}
+        rows = db.execute_query("SELECT MAX(msg_id) AS last_id FROM MESSAGE")
+        if not rows or rows[0]['last_id'] is None:
+            return deleted
+        last_id = rows[0]['last_id']
+        deleted_before = _cutoff(self.deleted_days) if self.deleted_days else None
+
+        scan_query = """
+            SELECT m.msg_id, m.conv_id, m.sender_id, m.receiver_id, m.status,
+                   m.deleted, m.deleted_at, c.conv_id AS live_conv_id
+            FROM MESSAGE m
+            LEFT JOIN CONVERSATION c ON c.conv_id = m.conv_id
+            WHERE m.msg_id > %s AND m.msg_id <= %s
+              AND (m.deleted = TRUE OR c.conv_id IS NULL)
+        """
+        for _ in range(self.max_chunks):
+            if self._msg_cursor >= last_id:
+                # Whole table covered; the next cycle starts over
+                self._msg_cursor = 0
+                break
+            started = time.monotonic()
+            window_end = self._msg_cursor + self.scan_rows
+            rows = db.execute_query(scan_query, (self._msg_cursor, window_end))
+            if rows is None:
+                log.error("purge.scan_failed", msg_cursor=self._msg_cursor)
+                break
+
+            orphaned = [row for row in rows
+                        if self.orphans and row['conv_id'] is not None and row['live_conv_id'] is None]
+            expired = [row for row in rows
+                       if deleted_before and row['deleted'] and row['live_conv_id'] is not None
+                       and row['deleted_at'] is not None and row['deleted_at'] < deleted_before]
+            for name, victims in (('orphaned_messages', orphaned), ('deleted_messages', expired)):
+                for start in range(0, len(victims), self.chunk_rows):
+                    count = self._delete_messages(victims[start:start + self.chunk_rows])
+                    if count is None:
+                        return deleted
+                    deleted[name] += count
+                    self._count(name, count)
+
+            self._msg_cursor = window_end
+            self._pause(started, sleep)
+        return deleted
+
+    def _delete_messages(self, rows):
+        placeholders = ', '.join(['%s'] * len(rows))
+        delete_query = f"DELETE FROM MESSAGE WHERE msg_id IN ({placeholders})"
+        count = db.execute_update(delete_query, tuple(row['msg_id'] for row in rows))
+        if count is None:
+            log.error("purge.delete_failed", table='MESSAGE', rows=len(rows))
+            return None
+
+        for conv_id in {row['conv_id'] for row in rows if row['live_conv_id'] is not None}:
+            history_cache.invalidate(conv_id)
+            bump_conversation(conv_id)
+        for conv_id in {row['conv_id'] for row in rows if row['live_conv_id'] is None}:
+            message_archive.drop(conv_id)
+        # An unread message that was deleted still counts as unread until it is gone
+        for receiver_id in {row['receiver_id'] for row in rows
+                            if row['status'] != 'read' and row['sender_id'] != row['receiver_id']}:
+            unread_counters.forget(receiver_id)
+        return count
+
+    # -------------------------------------------------
+    # Logs
+    # -------------------------------------------------
+    def _purge_oldest(self, name, select_query, delete_query, cutoff, sleep):
+        """Delete the oldest rows of an append-only log while they are older than cutoff"""
+        total = 0
+        for _ in range(self.max_chunks):
+            started = time.monotonic()
+            rows = db.execute_query(select_query, (self.chunk_rows,))
+            if not rows:
+                break
+            expired = 0
+            while expired < len(rows) and rows[expired]['at'] is not None and rows[expired]['at'] < cutoff:
+                expired += 1
+            if not expired:
+                break
+
+            count = db.execute_update(delete_query, (rows[expired - 1]['row_id'], cutoff.strftime(TIMESTAMP_FORMAT)))
+            if count is None:
+                log.error("purge.delete_failed", policy=name)
+                break
+            total += count
+            self._count(name, count)
+            if expired < len(rows):
+                break
+            self._pause(started, sleep)
+        return total
+
+    def stats(self):
+        with self._lock:
+            return {
+                'cycles': self.cycles,
+                'msg_cursor': self._msg_cursor,
+                'policies': {name: dict(metrics) for name, metrics in self._metrics.items()}
+            }
+
+
+retention_purge = RetentionPurge()
+
+
+def start_purger(socketio, interval=PURGE_INTERVAL):
+    """Background task running a purge cycle every `interval` seconds (if enabled)"""
+    if interval <= 0:
+        return None
+
+    def purge_loop():
+        while True:
+            socketio.sleep(interval)
+            try:
+                retention_purge.run_cycle(sleep=socketio.sleep)
+            except Exception:
+                log.exception("purge.cycle_failed")
+
+    return socketio.start_background_task(purge_loop)
+
+
+# =====================================================
+# MAIN
+# =====================================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Delete expired rows in small throttled chunks')
+    parser.add_argument('--until-done', action='store_true',
+                        help='repeat cycles until a full MESSAGE walk finds nothing left to delete')
+    args = parser.parse_args(argv)
+
+    while True:
+        deleted = retention_purge.run_cycle()
+        print(', '.join(f'{name}: {count}' for name, count in deleted.items()))
+        if not args.until_done or (retention_purge.stats()['msg_cursor'] == 0 and not any(deleted.values())):
+            break
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,126 @@
+import os
+import threading
+import time
+from logger import get_logger
+
+log = get_logger(__name__)
+
+SEND_RATE_PER_USER = float(os.getenv('SEND_RATE_PER_USER', '10'))
+SEND_BURST_PER_USER = float(os.getenv('SEND_BURST_PER_USER', '30'))
+SEND_RATE_PER_CONVERSATION = float(os.getenv('SEND_RATE_PER_CONVERSATION', '30'))
+SEND_BURST_PER_CONVERSATION = float(os.getenv('SEND_BURST_PER_CONVERSATION', '60'))
+
+# Drop refilled (idle) buckets every N checks so memory tracks active senders only
+_PRUNE_EVERY = 10000
+
+
+# =====================================================
+# TOKEN BUCKET
+# =====================================================
+class TokenBucketLimiter:
+    """In-memory token buckets keyed by anything hashable; O(1) per check"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._buckets = {}  # key -> [tokens, updated_at]
+        self._checks = 0
+
+    def _refill(self, key, now):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [self.burst, now]
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        return bucket
+
+    def acquire(self, key, now=None):
+        """Take one token; return 0 on success or the seconds until one is available"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._checks += 1
+            if self._checks % _PRUNE_EVERY == 0:
+                self._prune(now)
+            bucket = self._refill(key, now)
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0
+            return (1 - bucket[0]) / self.rate
+
+    def refund(self, key):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket[0] = min(self.burst, bucket[0] + 1)
+
+    def _prune(self, now):
+        idle = [key for key, (tokens, updated_at) in self._buckets.items()
+                if tokens + (now - updated_at) * self.rate >= self.burst]
+        for key in idle:
+            del self._buckets[key]
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+# =====================================================
+# SEND ADMISSION
+# =====================================================
+class SendAdmission:
+    """Per-user and per-conversation admission control in front of the send handlers"""
+
+    def __init__(self):
+        self.per_user = TokenBucketLimiter(SEND_RATE_PER_USER, SEND_BURST_PER_USER)
+        self.per_conversation = TokenBucketLimiter(SEND_RATE_PER_CONVERSATION, SEND_BURST_PER_CONVERSATION)
+        self._lock = threading.Lock()
+        self.counters = {'admitted': 0, 'rejected_user': 0, 'rejected_conversation': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def admit(self, user_id, conversation_key):
+        """Return None when the send may proceed, else a back-pressure dict for the client"""
+        user_id = str(user_id)
+        wait = self.per_user.acquire(user_id)
+        if wait:
+            self._count('rejected_user')
+            log.debug("rate_limit.rejected", scope='user', user_id=user_id, retry_after=round(wait, 3))
+            return {'error': 'Sending too fast, slow down', 'code': 'rate_limited',
+                    'scope': 'user', 'retry_after': round(wait, 3)}
+
+        wait = self.per_conversation.acquire(conversation_key)
+        if wait:
+            # The message is not sent, so it must not cost the user a token either
+            self.per_user.refund(user_id)
+            self._count('rejected_conversation')
+            log.debug("rate_limit.rejected", scope='conversation', user_id=user_id,
+                      conversation=conversation_key, retry_after=round(wait, 3))
+            return {'error': 'This conversation is busy, try again shortly', 'code': 'rate_limited',
+                    'scope': 'conversation', 'retry_after': round(wait, 3)}
+
+        self._count('admitted')
+        return None
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+        counters['tracked_users'] = len(self.per_user)
+        counters['tracked_conversations'] = len(self.per_conversation)
+        return counters
+
+
+send_admission = SendAdmission()
+
+
+def direct_conversation_key(user_a, user_b):
+    """Rate-limit key for a direct chat, known before the conversation row is looked up"""
+    # str() so ids arriving as JSON numbers or strings share one bucket
+    a, b = sorted((str(user_a), str(user_b)))
+    return ('direct', a, b)
+
+
+def group_conversation_key(group_id):
+    return ('group', str(group_id))
\ No newline at end of file
@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+from collections import deque
+from logger import get_logger
+
+log = get_logger(__name__)
+
+REPLAY_BUFFER_SIZE = int(os.getenv('REPLAY_BUFFER_SIZE', '200'))
+REPLAY_MAX_AGE = float(os.getenv('REPLAY_MAX_AGE', '300'))
+
+# Full sweep of idle buffers every N recorded events
+_SWEEP_EVERY = 1000
+
+
+# =====================================================
+# EVENT REPLAY BUFFER
+# =====================================================
+class EventReplayBuffer:
+    """Bounded ring buffers of recent socket events, one per room.
+
+    Every recorded event gets a global, monotonically increasing seq. A
+    reconnecting client sends the highest seq it saw; the events it missed
+    are the ones with a higher seq in its own user room and its group rooms.
+    When one of those rooms has already dropped an event newer than the
+    client's seq (capacity or age), the gap cannot be filled from memory.
+    """
+
+    def __init__(self, capacity=REPLAY_BUFFER_SIZE, max_age=REPLAY_MAX_AGE):
+        self.capacity = capacity
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._buffers = {}  # room -> deque of (seq, recorded_at, event, data)
+        self._dropped = {}  # room with a buffer -> highest seq no longer held
+        self._evicted = 0  # highest seq dropped by any room whose buffer is gone
+        self._recorded = 0
+
+    @property
+    def head(self):
+        return self._seq
+
+    def _expire(self, room, now):
+        buffer = self._buffers.get(room)
+        while buffer and now - buffer[0][1] > self.max_age:
+            self._dropped[room] = buffer.popleft()[0]
+        if buffer is not None and not buffer:
+            # Fold the room's watermark into the global one so idle rooms cost nothing
+            del self._buffers[room]
+            self._evicted = max(self._evicted, self._dropped.pop(room, 0))
+
+    def record(self, room, event, data):
+        """Store an event for room and return its seq"""
+        now = time.monotonic()
+        with self._lock:
+            self._seq += 1
+            buffer = self._buffers.get(room)
+            if buffer is None:
+                buffer = self._buffers[room] = deque()
+            elif len(buffer) >= self.capacity:
+                self._dropped[room] = buffer.popleft()[0]
+            buffer.append((self._seq, now, event, data))
+
+            self._recorded += 1
+            if self._recorded % _SWEEP_EVERY == 0:
+                for key in list(self._buffers):
+                    self._expire(key, now)
+            return self._seq
+
+    def since(self, rooms, last_seq):
+        """Return (events, complete) for every event after last_seq in rooms.
+
+        events is a seq-ordered list of (seq, event, data). complete is False
+        when part of the gap has already been dropped.
+        """
+        now = time.monotonic()
+        events = []
+        with self._lock:
+            for room in rooms:
+                self._expire(room, now)
+                # A room without its own entry may have lost events with its buffer
+                if self._dropped.get(room, self._evicted) > last_seq:
+                    return [], False
+                for seq, _, event, data in self._buffers.get(room, ()):
+                    if seq > last_seq:
+                        events.append((seq, event, data))
+        events.sort(key=lambda item: item[0])
+        return events, True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rooms': len(self._buffers),
+                'events': sum(len(buffer) for buffer in self._buffers.values()),
+                'head': self._seq
+            }
+
+
+replay_buffer = EventReplayBuffer()
\ No newline at end of file
@@ -0,0 +1,57 @@
+"""Periodic snapshot of the in-process caches, limiters and workers.
+
+Each component keeps cheap counters behind stats(); this module gathers them
+into one structured log line every STATS_LOG_INTERVAL seconds, so send
+rejections, cache hit rates and queue depths can be watched and tuned.
+"""
+import os
+from logger import get_logger
+from rate_limit import send_admission
+from tail_cache import history_cache
+from membership import group_members
+from profiles import user_profiles
+from unread import unread_counters
+from delivery import delivery_acks
+from replay import replay_buffer
+from typing_indicators import typing_coalescer
+from thumbnails import thumbnail_service
+from archive import message_archive
+from purge import retention_purge
+
+log = get_logger(__name__)
+
+# Seconds between stats log lines; 0 turns them off
+STATS_LOG_INTERVAL = float(os.getenv('STATS_LOG_INTERVAL', '60'))
+
+
+def collect():
+    """stats() of every in-process component, keyed by component"""
+    return {
+        'send_admission': send_admission.stats(),
+        'history_cache': history_cache.stats(),
+        'group_members': group_members.stats(),
+        'user_profiles': user_profiles.stats(),
+        'unread_counters': unread_counters.stats(),
+        'delivery_acks': delivery_acks.stats(),
+        'replay_buffer': replay_buffer.stats(),
+        'typing': typing_coalescer.stats(),
+        'thumbnails': thumbnail_service.stats(),
+        'archive': message_archive.stats(),
+        'purge': retention_purge.stats(),
+    }
+
+
+def start_stats_logger(socketio, interval=STATS_LOG_INTERVAL):
+    """Background task logging collect() every `interval` seconds (if enabled)"""
+    if interval <= 0:
+        return None
+
+    def stats_loop():
+        while True:
+            socketio.sleep(interval)
+            try:
+                log.info("stats.snapshot", **collect())
+            except Exception:
+                log.exception("stats.snapshot_failed")
+
+    return socketio.start_background_task(stats_loop)
\ No newline at end of file
@@ -0,0 +1,382 @@
+"""Bulk data generator for large, realistic ChatFlow datasets.
+
+Generates users, USERCONTACT edges, direct and group CONVERSATIONs with
+their participants, and MESSAGE rows. Activity follows a power law: a few
+users and conversations are very busy, most are quiet. Output is fully
+determined by --seed.
+
+Rows are written through multi-row batched INSERTs (any backend) or, for
+MySQL, through tab-separated files loaded with LOAD DATA LOCAL INFILE.
+
+    python seed_data.py --users 100000 --groups 5000 --messages 20000000
+    python seed_data.py --mode infile --messages 50000000
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from itertools import accumulate
+from logger import get_logger
+
+log = get_logger(__name__)
+
+COLUMNS = {
+    'USER': ('user_id', 'username', 'email', 'password_hash', 'status', 'last_active', 'created_at'),
+    'USERCONTACT': ('user_id', 'contact_user_id', 'added_at'),
+    'CONVERSATION': ('conv_id', 'type', 'name', 'created_by', 'created_at', 'privacy_settings'),
+    'CONVERSATION_PARTICIPANT': ('conversation_id', 'user_id', 'role', 'joined_at'),
+    'MESSAGE': ('msg_id', 'sender_id', 'receiver_id', 'conv_id', 'content', 'timestamp',
+                'status', 'pinned', 'edited', 'deleted'),
+}
+
+# Write order respects foreign keys
+TABLE_ORDER = ('USER', 'USERCONTACT', 'CONVERSATION', 'CONVERSATION_PARTICIPANT', 'MESSAGE')
+
+WORDS = (
+    'hey hi hello ok okay sure thanks yes no maybe later today tomorrow tonight meeting call '
+    'lunch dinner coffee project deadline review code deploy bug fix test build release plan '
+    'great cool nice awesome sorry what when where why how see you soon on my way here now '
+    'sounds good let me check will do done working on it can you send the file please'
+).split()
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+# =====================================================
+# ARGUMENTS
+# =====================================================
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a large, skewed ChatFlow dataset')
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--contacts', type=int, default=20, help='median contacts per user')
+    parser.add_argument('--max-contacts', type=int, default=2000)
+    parser.add_argument('--direct-ratio', type=float, default=0.6,
+                        help='share of contact pairs that have a direct conversation')
+    parser.add_argument('--groups', type=int, default=500)
+    parser.add_argument('--group-size', type=int, default=8, help='median group size')
+    parser.add_argument('--max-group-size', type=int, default=5000)
+    parser.add_argument('--messages', type=int, default=1000000)
+    parser.add_argument('--alpha', type=float, default=1.1,
+                        help='power-law exponent for user and conversation activity')
+    parser.add_argument('--days', type=float, default=365, help='time span covered by messages')
+    parser.add_argument('--end', default='2026-01-01 00:00:00',
+                        help='timestamp of the newest message (fixed so runs are reproducible)')
+    parser.add_argument('--unread-days', type=float, default=2,
+                        help='messages newer than this are left sent/delivered instead of read')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch-size', type=int, default=1000, help='rows per multi-row INSERT')
+    parser.add_argument('--mode', choices=['insert', 'infile'], default='insert')
+    parser.add_argument('--infile-dir', help='keep LOAD DATA files here instead of a temp dir')
+    return parser.parse_args(argv)
+
+
+# =====================================================
+# WRITERS
+# =====================================================
+class BatchInsertWriter:
+    """Buffer rows per table and flush them as multi-row INSERTs"""
+
+    def __init__(self, db, batch_size):
+        self.db = db
+        self.batch_size = batch_size
+        self.buffers = {table: [] for table in COLUMNS}
+        self.written = {table: 0 for table in COLUMNS}
+
+    def add(self, table, row):
+        buffer = self.buffers[table]
+        buffer.append(row)
+        if len(buffer) >= self.batch_size:
+            self.flush(table)
+
+    def flush(self, table):
+        # Parent tables go first so foreign keys always resolve
+        for parent in TABLE_ORDER[:TABLE_ORDER.index(table)]:
+            self._flush_one(parent)
+        self._flush_one(table)
+
+    def _flush_one(self, table):
+        buffer = self.buffers[table]
+        if not buffer:
+            return
+        columns = COLUMNS[table]
+        query = (f"INSERT INTO {table} ({', '.join(columns)}) "
+                 f"VALUES ({', '.join(['%s'] * len(columns))})")
+        if self.db.execute_many(query, buffer) is None:
+            raise RuntimeError(f'batch insert into {table} failed')
+        self.written[table] += len(buffer)
+        buffer.clear()
+
+    def close(self):
+        for table in TABLE_ORDER:
+            self.flush(table)
+
+
+class InfileWriter:
+    """Stream rows into tab-separated files, then LOAD DATA LOCAL INFILE them (MySQL only)"""
+
+    def __init__(self, directory=None):
+        self.keep = directory is not None
+        self.directory = directory or tempfile.mkdtemp(prefix='chatflow-seed-')
+        os.makedirs(self.directory, exist_ok=True)
+        self.files = {
+            table: open(os.path.join(self.directory, f'{table}.tsv'), 'w', encoding='utf-8', newline='\n')
+            for table in COLUMNS
+        }
+        self.written = {table: 0 for table in COLUMNS}
+
+    @staticmethod
+    def _field(value):
+        if value is None:
+            return '\\N'
+        return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+                .replace('\n', '\\n').replace('\r', '\\r'))
+
+    def add(self, table, row):
+        self.files[table].write('\t'.join(self._field(value) for value in row) + '\n')
+        self.written[table] += 1
+
+    def flush(self, table):
+        self.files[table].flush()
+
+    def close(self):
+        import mysql.connector
+
+        for f in self.files.values():
+            f.close()
+
+        conn = mysql.connector.connect(
+            host=os.getenv('DB_HOST', 'localhost'),
+            user=os.getenv('DB_USER', 'root'),
+            password=os.getenv('DB_PASSWORD', ''),
+            database=os.getenv('DB_NAME', 'messaging_app_db'),
+            allow_local_infile=True
+        )
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+            cursor.execute("SET UNIQUE_CHECKS = 0")
+            for table in TABLE_ORDER:
+                path = os.path.join(self.directory, f'{table}.tsv')
+                cursor.execute(
+                    f"LOAD DATA LOCAL INFILE %s INTO TABLE {table} "
+                    f"CHARACTER SET utf8mb4 FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' "
+                    f"({', '.join(COLUMNS[table])})",
+                    (path,)
+                )
+                conn.commit()
+                log.info("seed.table_loaded", table=table, rows=self.written[table])
+            cursor.execute("SET UNIQUE_CHECKS = 1")
+            cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+            cursor.close()
+        finally:
+            conn.close()
+            if not self.keep:
+                shutil.rmtree(self.directory, ignore_errors=True)
+
+
+# =====================================================
+# GENERATOR
+# =====================================================
+class DatasetGenerator:
+    """Deterministic, power-law-skewed dataset built on explicit primary keys"""
+
+    def __init__(self, args, writer, id_offsets):
+        self.args = args
+        self.writer = writer
+        self.rng = random.Random(args.seed)
+        self.end = datetime.strptime(args.end, TIME_FORMAT)
+        self.start = self.end - timedelta(days=args.days)
+        self.next_user_id = id_offsets['user_id'] + 1
+        self.next_conv_id = id_offsets['conv_id'] + 1
+        self.next_msg_id = id_offsets['msg_id'] + 1
+        self.tag = f's{args.seed}_{self.next_user_id}'
+
+        self.user_ids = []
+        self.user_cum_weights = []
+        self.conversations = []  # (conv_id, type, members)
+        self.last_message_at = {}
+
+    def _power_law_cum_weights(self, count):
+        """Cumulative Zipf weights over a shuffled ranking, for O(log n) weighted picks"""
+        ranks = list(range(1, count + 1))
+        self.rng.shuffle(ranks)
+        return list(accumulate(1.0 / rank ** self.args.alpha for rank in ranks))
+
+    def _pick(self, population, cum_weights):
+        index = bisect_left(cum_weights, self.rng.random() * cum_weights[-1])
+        return population[min(index, len(population) - 1)]
+
+    def _skewed_size(self, median, low, high):
+        # Pareto tail scaled so roughly half the draws fall below the median
+        size = int(median / 2 ** (1 / self.args.alpha) * self.rng.paretovariate(self.args.alpha))
+        return max(low, min(high, size))
+
+    def _time_before(self, latest):
+        seconds = self.rng.random() * max(1.0, (latest - self.start).total_seconds())
+        return self.start + timedelta(seconds=seconds)
+
+    def users(self):
+        from werkzeug.security import generate_password_hash
+
+        # One hash for everybody: hashing millions of passwords would dominate the run
+        password_hash = generate_password_hash('password123')
+        for _ in range(self.args.users):
+            user_id = self.next_user_id
+            self.next_user_id += 1
+            created = self._time_before(self.end).strftime(TIME_FORMAT)
+            username = f'user_{self.tag}_{user_id}'
+            self.writer.add('USER', (user_id, username, f'{username}@example.com',
+                                     password_hash, 'offline', created, created))
+            self.user_ids.append(user_id)
+        self.user_cum_weights = self._power_law_cum_weights(len(self.user_ids))
+        self.writer.flush('USER')
+        log.info("seed.users_done", count=len(self.user_ids))
+
+    def contacts_and_direct_conversations(self):
+        seen = set()
+        edges = 0
+        max_contacts = min(self.args.max_contacts, len(self.user_ids) - 1)
+        for user_id in self.user_ids:
+            degree = self._skewed_size(self.args.contacts, 1, max_contacts)
+            for _ in range(degree):
+                other = self._pick(self.user_ids, self.user_cum_weights)
+                if other == user_id:
+                    continue
+                pair = (min(user_id, other), max(user_id, other))
+                if pair in seen:
+                    continue
+                seen.add(pair)
+
+                added = self._time_before(self.end).strftime(TIME_FORMAT)
+                self.writer.add('USERCONTACT', (user_id, other, added))
+                self.writer.add('USERCONTACT', (other, user_id, added))
+                edges += 1
+
+                if self.rng.random() < self.args.direct_ratio:
+                    conv_id = self.next_conv_id
+                    self.next_conv_id += 1
+                    self.writer.add('CONVERSATION', (conv_id, 'direct', None, pair[0], added, 'private'))
+                    self.writer.add('CONVERSATION_PARTICIPANT', (conv_id, pair[0], 'member', added))
+                    self.writer.add('CONVERSATION_PARTICIPANT', (conv_id, pair[1], 'member', added))
+                    self.conversations.append((conv_id, 'direct', pair))
+        log.info("seed.contacts_done", pairs=edges, direct_conversations=len(self.conversations))
+
+    def groups(self):
+        max_size = min(self.args.max_group_size, len(self.user_ids))
+        for g in range(self.args.groups):
+            size = self._skewed_size(self.args.group_size, min(3, max_size), max_size)
+            members = set()
+            attempts = 0
+            while len(members) < size and attempts < size * 20:
+                members.add(self._pick(self.user_ids, self.user_cum_weights))
+                attempts += 1
+            if len(members) < size:
+                # Very large groups exhaust the popular users; top up uniformly
+                rest = [u for u in self.user_ids if u not in members]
+                members.update(self.rng.sample(rest, size - len(members)))
+            members = sorted(members)
+            creator = self.rng.choice(members)
+
+            conv_id = self.next_conv_id
+            self.next_conv_id += 1
+            created = self._time_before(self.end).strftime(TIME_FORMAT)
+            self.writer.add('CONVERSATION', (conv_id, 'group', f'Group {g}', creator, created, 'private'))
+            for member in members:
+                role = 'admin' if member == creator else 'member'
+                self.writer.add('CONVERSATION_PARTICIPANT', (conv_id, member, role, created))
+            self.conversations.append((conv_id, 'group', tuple(members)))
+        log.info("seed.groups_done", count=self.args.groups)
+
+    def messages(self):
+        total = self.args.messages
+        if not self.conversations or not total:
+            return
+        for table in ('CONVERSATION', 'CONVERSATION_PARTICIPANT', 'USERCONTACT'):
+            self.writer.flush(table)
+
+        conv_cum_weights = self._power_law_cum_weights(len(self.conversations))
+        span = (self.end - self.start).total_seconds()
+        unread_after = self.end - timedelta(days=self.args.unread_days)
+        step = span / total
+        report_every = max(1, total // 20)
+
+        for i in range(total):
+            conv_id, conv_type, members = self._pick(self.conversations, conv_cum_weights)
+            sender = self.rng.choice(members)
+            if conv_type == 'direct':
+                receiver = members[1] if sender == members[0] else members[0]
+            else:
+                receiver = sender  # group convention used by the send paths
+
+            # Messages are generated in time order so msg_id order matches timestamp order
+            sent_at = self.start + timedelta(seconds=i * step + self.rng.random() * step)
+            if sent_at < unread_after:
+                status = 'read'
+            else:
+                status = self.rng.choice(('sent', 'delivered', 'read'))
+
+            length = max(1, int(self.rng.lognormvariate(1.6, 0.8)))
+            content = ' '.join(self.rng.choice(WORDS) for _ in range(length))
+
+            msg_id = self.next_msg_id
+            self.next_msg_id += 1
+            timestamp = sent_at.strftime(TIME_FORMAT)
+            self.writer.add('MESSAGE', (msg_id, sender, receiver, conv_id, content,
+                                        timestamp, status, 0, 0, 0))
+            self.last_message_at[conv_id] = timestamp
+
+            if (i + 1) % report_every == 0:
+                log.info("seed.messages_progress", written=i + 1, total=total)
+
+    def run(self):
+        self.users()
+        self.contacts_and_direct_conversations()
+        self.groups()
+        self.messages()
+        self.writer.close()
+
+
+def current_max_ids(db):
+    """Highest existing ids, so generated rows never collide with real data"""
+    offsets = {}
+    for key, table in (('user_id', 'USER'), ('conv_id', 'CONVERSATION'), ('msg_id', 'MESSAGE')):
+        result = db.execute_query(f"SELECT MAX({key}) AS max_id FROM {table}")
+        offsets[key] = (result[0]['max_id'] if result else None) or 0
+    return offsets
+
+
+def update_last_message_times(db, last_message_at, batch_size):
+    rows = [(timestamp, conv_id) for conv_id, timestamp in last_message_at.items()]
+    query = "UPDATE CONVERSATION SET last_message_at = %s WHERE conv_id = %s"
+    for i in range(0, len(rows), batch_size):
+        db.execute_many(query, rows[i:i + batch_size])
+
+
+# =====================================================
+# MAIN
+# =====================================================
+def main(argv=None):
+    args = parse_args(argv)
+
+    from database.db import db
+
+    if args.mode == 'infile' and db.backend != 'mysql':
+        raise SystemExit('--mode infile needs the MySQL backend')
+
+    writer = (InfileWriter(args.infile_dir) if args.mode == 'infile'
+              else BatchInsertWriter(db, args.batch_size))
+
+    started = time.perf_counter()
+    generator = DatasetGenerator(args, writer, current_max_ids(db))
+    generator.run()
+    update_last_message_times(db, generator.last_message_at, args.batch_size)
+
+    log.info("seed.done", seconds=round(time.perf_counter() - started, 1), **writer.written)
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -1,13 +1,96 @@
-from flask_socketio import emit, join_room, leave_room
-from flask import request
+import os
+import time
+from datetime import datetime, timedelta
+from flask_socketio import emit, join_room, leave_room, rooms
+from flask import request, session
 from database.db import db
+from logger import get_logger
+from etags import bump_contact_lists_of
+from routes.sync import record_change
+from replay import replay_buffer
+from typing_indicators import start_typing_sweeper, typing_coalescer
+from rate_limit import direct_conversation_key, group_conversation_key, send_admission
+from fanout import group_fanout
+from membership import group_members
+from tail_cache import history_cache, history_entry
+from profiles import user_profiles
+from unread import unread_counters
+from attachments import attachment_fields, attachment_store
+from delivery import DELIVERY_MAX_ACK_IDS, delivery_acks, start_delivery_flusher
+from archive import start_archiver
+from purge import start_purger
+from runtime_stats import start_stats_logger
+
+log = get_logger(__name__)
 
 # Store online users: {user_id: socket_id}
 online_users = {}
 
+# Groups with a message in this window are joined on connect; older ones are joined on demand
+GROUP_ACTIVE_DAYS = float(os.getenv('GROUP_ACTIVE_DAYS', '7'))
+
+# Groups that carried traffic in this process: {group_id: monotonic time of last broadcast}
+active_groups = {}
+
+def emit_replayable(event, data, buffer_room, **kwargs):
+    """Emit an event and keep it in buffer_room's replay buffer for clients that reconnect"""
+    seq = replay_buffer.record(buffer_room, event, data)
+    emit(event, {**data, 'seq': seq}, **kwargs)
+
+def broadcast_group(event, data, group_id, skip_sid=None):
+    """Record a group event for replay and hand delivery to the fan-out workers"""
+    room = f'group_{group_id}'
+    activate_group(group_id)
+    seq = replay_buffer.record(room, event, data)
+    group_fanout.publish(event, {**data, 'seq': seq}, room, skip_sid=skip_sid)
+
+def join_online_users(user_ids, room):
+    """Subscribe the live sockets of user_ids to room in one pass; callable from HTTP routes"""
+    sids = [online_users[user_id] for user_id in user_ids if user_id in online_users]
+    for sid in sids:
+        join_room(room, sid=sid, namespace='/')
+    return len(sids)
+
+def push_unread(user_id, contact_id, delta):
+    """Send a user's live socket its new unread count for one contact; callable from HTTP routes"""
+    user_id, contact_id = int(user_id), int(contact_id)
+    if user_id not in online_users:
+        return
+    counts = unread_counters.per_sender(user_id)
+    emit('unread_delta', {
+        'contact_id': contact_id,
+        'delta': delta,
+        'unread': counts.get(contact_id, 0),
+        'total': sum(counts.values())
+    }, to=f'user_{user_id}', namespace='/')
+
+def activate_group(group_id):
+    """Subscribe online members to a group that was dormant, before its first broadcast.
+
+    Members who connected while the group was quiet skipped its room; one
+    pass over the member set catches them up. Busy groups skip the pass.
+    """
+    group_id = int(group_id)
+    now = time.monotonic()
+    last_seen = active_groups.get(group_id)
+    active_groups[group_id] = now
+    if last_seen is not None and now - last_seen < GROUP_ACTIVE_DAYS * 86400:
+        return 0
+    return join_online_users(group_members.members(group_id), f'group_{group_id}')
+
+def start_background_tasks(socketio):
+    """Start the periodic server tasks; called once by the process that runs the server"""
+    start_typing_sweeper(socketio)
+    start_delivery_flusher(socketio)
+    start_archiver(socketio)
+    start_purger(socketio)
+    start_stats_logger(socketio)
+
 def register_socketio_events(socketio):
     """Register all Socket.IO event handlers"""
     
+    group_fanout.attach(socketio)
+    
     @socketio.on('connect')
     def handle_connect(auth=None):
         """Handle user connection"""
@@ -21,33 +104,37 @@ def register_socketio_events(socketio):
             try:
                 query = "UPDATE USER SET status = 'online', last_active = NOW() WHERE user_id = %s"
                 db.execute_update(query, (user_id,))
+                user_profiles.set_status(user_id, 'online')
+                bump_contact_lists_of(user_id)
             except Exception as e:
-                print(f"✗ Error updating user status: {e}")
+                log.error("socket.status_update_failed", user_id=user_id, error=str(e))
             
             # Join personal room
             join_room(f'user_{user_id}')
             
-            # Join all group rooms that user is member of
+            # Join the rooms of recently active groups only; dormant ones are joined when
+            # opened or when a message arrives (activate_group)
             try:
+                active_since = (datetime.now() - timedelta(days=GROUP_ACTIVE_DAYS)).strftime('%Y-%m-%d %H:%M:%S')
                 group_query = """
-                    SELECT conversation_id FROM CONVERSATION_PARTICIPANT
-                    WHERE user_id = %s
+                    SELECT cp.conversation_id
+                    FROM CONVERSATION_PARTICIPANT cp
+                    JOIN CONVERSATION c ON c.conv_id = cp.conversation_id
+                    WHERE cp.user_id = %s AND c.type = 'group' AND c.last_message_at >= %s
                 """
-                groups = db.execute_query(group_query, (user_id,))
-                if groups:
-                    for group in groups:
-                        join_room(f'group_{group["conversation_id"]}')
-                        print(f"✓ User {user_id} joined group room {group['conversation_id']}")
+                groups = db.execute_query(group_query, (user_id, active_since)) or []
+                for room in {f'group_{group["conversation_id"]}' for group in groups}:
+                    join_room(room)
             except Exception as e:
-                print(f"✗ Error joining group rooms: {e}")
+                log.error("socket.join_group_rooms_failed", user_id=user_id, error=str(e))
             
             # Notify contacts that user is online
             emit('user_online', {'user_id': user_id}, broadcast=True)
             
-            print(f"✓ User {user_id} connected - Online users: {len(online_users)}")
+            log.info("socket.connected", user_id=user_id, online=len(online_users))
             return {'status': 'connected', 'user_id': user_id}
         else:
-            print("✗ Connection rejected - No user_id")
+            log.warning("socket.connect_rejected", reason="missing user_id")
             return False
     
     
@@ -62,13 +149,16 @@ def register_socketio_events(socketio):
         
         if user_id:
             online_users.pop(user_id, None)
+            typing_coalescer.stop_user(user_id)
             
             # Update user status to offline
             try:
                 query = "UPDATE USER SET status = 'offline', last_active = NOW() WHERE user_id = %s"
                 db.execute_update(query, (user_id,))
+                user_profiles.set_status(user_id, 'offline')
+                bump_contact_lists_of(user_id)
             except Exception as e:
-                print(f"✗ Error updating user status: {e}")
+                log.error("socket.status_update_failed", user_id=user_id, error=str(e))
             
             # Leave personal room
             leave_room(f'user_{user_id}')
@@ -76,22 +166,34 @@ def register_socketio_events(socketio):
             # Notify contacts that user is offline
             emit('user_offline', {'user_id': user_id}, broadcast=True)
             
-            print(f"✓ User {user_id} disconnected - Online users: {len(online_users)}")
+            log.info("socket.disconnected", user_id=user_id, online=len(online_users))
     
     
     @socketio.on('send_message')
     def handle_send_message(data):
         """Handle real-time message sending - Direct messages only"""
-        sender_id = data.get('sender_id')
+        # The sender is the socket's user, whatever the payload claims
+        sender_id = session.get('user_id')
         receiver_id = data.get('receiver_id')
         content = data.get('content', '').strip()
+        attachment_path = data.get('attachment_path') or None
         
-        print(f"📨 Received message: sender={sender_id}, receiver={receiver_id}, content={content}")
+        log.debug("socket.send_message", sender_id=sender_id, receiver_id=receiver_id, length=len(content))
         
-        if not receiver_id or not content or not sender_id:
+        if not receiver_id or not (content or attachment_path) or not sender_id:
             emit('message_error', {'error': 'Missing data'})
             return
         
+        # Only a file the sender can already read; knowing its hash is not enough
+        if attachment_path and not attachment_store.readable(attachment_path, sender_id):
+            emit('message_error', {'error': 'Unknown attachment'})
+            return
+        
+        rejection = send_admission.admit(sender_id, direct_conversation_key(sender_id, receiver_id))
+        if rejection:
+            emit('message_error', rejection)
+            return
+        
         try:
             # Get or create conversation
             conv_query = """
@@ -108,17 +210,17 @@ def register_socketio_events(socketio):
             
             if conv_result:
                 conv_id = conv_result[0]['conversation_id']
-                print(f"✓ Using existing conversation: {conv_id}")
+                log.debug("socket.conversation_found", conv_id=conv_id)
             else:
                 # Create new conversation
-                print(f"🆕 Creating new conversation between {sender_id} and {receiver_id}")
+                log.debug("socket.conversation_creating", sender_id=sender_id, receiver_id=receiver_id)
                 create_conv_query = """
                     INSERT INTO CONVERSATION (type, created_by)
                     VALUES ('direct', %s)
                 """
                 db.execute_update(create_conv_query, (sender_id,))
                 conv_id = db.get_insert_id()
-                print(f"✓ Created conversation: {conv_id}")
+                log.debug("socket.conversation_created", conv_id=conv_id)
                 
                 # Add both participants
                 add_participants_query = """
@@ -126,22 +228,21 @@ def register_socketio_events(socketio):
                     VALUES (%s, %s), (%s, %s)
                 """
                 db.execute_update(add_participants_query, (conv_id, sender_id, conv_id, receiver_id))
-                print(f"✓ Added participants to conversation {conv_id}")
             
             # Insert message WITH conv_id
             insert_query = """
-                INSERT INTO MESSAGE (sender_id, receiver_id, content, conv_id, timestamp, status, pinned) 
-                VALUES (%s, %s, %s, %s, NOW(), 'sent', FALSE)
+                INSERT INTO MESSAGE (sender_id, receiver_id, content, conv_id, attachment_path, timestamp, status, pinned) 
+                VALUES (%s, %s, %s, %s, %s, NOW(), 'sent', FALSE)
             """
-            result = db.execute_update(insert_query, (sender_id, receiver_id, content, conv_id))
+            result = db.execute_update(insert_query, (sender_id, receiver_id, content, conv_id, attachment_path))
             
             if not result:
                 emit('message_error', {'error': 'Failed to send message'})
-                print("✗ Failed to insert message")
+                log.error("socket.message_insert_failed", conv_id=conv_id)
                 return
             
             msg_id = db.get_insert_id()
-            print(f"✓ Message saved with ID: {msg_id}")
+            log.debug("socket.message_saved", msg_id=msg_id, conv_id=conv_id)
             
             # Update conversation last_message_at
             update_conv_query = """
@@ -150,19 +251,24 @@ def register_socketio_events(socketio):
                 WHERE conv_id = %s
             """
             db.execute_update(update_conv_query, (conv_id,))
+            record_change(conv_id, 'new', sender_id, msg_id)
+            unread_counters.incr(receiver_id, sender_id)
+            push_unread(receiver_id, sender_id, 1)
             
             # Get message details
             msg_query = """
                 SELECT m.msg_id, m.sender_id, m.receiver_id, m.content, 
-                       m.timestamp, m.status, u.username as sender_username
+                       m.timestamp, m.status, m.attachment_path
                 FROM MESSAGE m
-                JOIN USER u ON m.sender_id = u.user_id
                 WHERE m.msg_id = %s
             """
             message = db.execute_query(msg_query, (msg_id,))
             
-            if message:
-                msg = message[0]
+            if not message:
+                history_cache.invalidate(conv_id)
+            else:
+                msg = attachment_store.attach_metadata(user_profiles.attach_usernames(message))[0]
+                history_cache.append(conv_id, history_entry(msg))
                 message_data = {
                     'msg_id': msg['msg_id'],
                     'sender_id': msg['sender_id'],
@@ -170,73 +276,70 @@ def register_socketio_events(socketio):
                     'content': msg['content'],
                     'timestamp': msg['timestamp'].isoformat() if msg['timestamp'] else None,
                     'status': msg['status'],
+                    'attachment_path': msg['attachment_path'],
+                    **attachment_fields(msg),
                     'sender_username': msg['sender_username'],
                     'conv_id': conv_id
                 }
                 
                 # Send to sender (confirmation)
-                emit('message_sent', {**message_data, 'is_mine': True})
-                print(f"✓ Sent confirmation to sender {sender_id}")
+                emit_replayable('message_sent', {**message_data, 'is_mine': True}, f'user_{sender_id}')
                 
                 # Send to receiver (if online)
-                emit('new_message', {**message_data, 'is_mine': False}, 
-                     room=f'user_{receiver_id}')
-                print(f"✓ Sent message to receiver room user_{receiver_id}")
-                
-                # Update message status to delivered if receiver is online
-                if receiver_id in online_users:
-                    update_query = "UPDATE MESSAGE SET status = 'delivered' WHERE msg_id = %s"
-                    db.execute_update(update_query, (msg_id,))
-                    
-                    emit('message_delivered', {'msg_id': msg_id, 'receiver_id': receiver_id})
-                    print(f"✓ Message marked as delivered")
+                emit_replayable('new_message', {**message_data, 'is_mine': False}, 
+                                f'user_{receiver_id}', room=f'user_{receiver_id}')
+                log.debug("socket.message_dispatched", msg_id=msg_id, receiver_id=receiver_id)
+                # Stays 'sent' until the receiver's client acks it (see ack_delivery)
         
         except Exception as e:
-            print(f"✗ Error in send_message: {e}")
-            import traceback
-            print(traceback.format_exc())
+            log.exception("socket.send_message_failed", sender_id=sender_id)
             emit('message_error', {'error': str(e)})
     
     
     @socketio.on('send_group_message')
     def handle_send_group_message(data):
         """Handle real-time group message sending"""
-        sender_id = data.get('sender_id')
+        sender_id = session.get('user_id')
         group_id = data.get('group_id')
         content = data.get('content', '').strip()
+        attachment_path = data.get('attachment_path') or None
         
-        print(f"📨 Group message: sender={sender_id}, group={group_id}, content={content}")
+        log.debug("socket.send_group_message", sender_id=sender_id, group_id=group_id, length=len(content))
         
-        if not group_id or not content or not sender_id:
+        if not group_id or not (content or attachment_path) or not sender_id:
             emit('group_message_error', {'error': 'Missing data'})
             return
         
+        # Only a file the sender can already read; knowing its hash is not enough
+        if attachment_path and not attachment_store.readable(attachment_path, sender_id):
+            emit('group_message_error', {'error': 'Unknown attachment'})
+            return
+        
+        # Members only, before spending from the group's budget
+        if not group_members.is_member(group_id, sender_id):
+            emit('group_message_error', {'error': 'Not a member of this group'})
+            return
+        
+        rejection = send_admission.admit(sender_id, group_conversation_key(group_id))
+        if rejection:
+            emit('group_message_error', {**rejection, 'group_id': group_id})
+            return
+        
         try:
-            # Check if user is member
-            member_check = """
-                SELECT 1 FROM CONVERSATION_PARTICIPANT
-                WHERE conversation_id = %s AND user_id = %s
-            """
-            membership = db.execute_query(member_check, (group_id, sender_id))
-            
-            if not membership:
-                emit('group_message_error', {'error': 'Not a member of this group'})
-                return
-            
             # Insert message (receiver_id = sender_id for group messages)
             insert_query = """
-                INSERT INTO MESSAGE (sender_id, receiver_id, content, conv_id, timestamp, status, pinned)
-                VALUES (%s, %s, %s, %s, NOW(), 'sent', FALSE)
+                INSERT INTO MESSAGE (sender_id, receiver_id, content, conv_id, attachment_path, timestamp, status, pinned)
+                VALUES (%s, %s, %s, %s, %s, NOW(), 'sent', FALSE)
             """
-            result = db.execute_update(insert_query, (sender_id, sender_id, content, group_id))
+            result = db.execute_update(insert_query, (sender_id, sender_id, content, group_id, attachment_path))
             
             if not result:
                 emit('group_message_error', {'error': 'Failed to send message'})
-                print("✗ Failed to insert group message")
+                log.error("socket.group_message_insert_failed", group_id=group_id)
                 return
             
             msg_id = db.get_insert_id()
-            print(f"✓ Group message saved with ID: {msg_id}")
+            log.debug("socket.group_message_saved", msg_id=msg_id, group_id=group_id)
             
             # Update conversation last_message_at
             update_conv_query = """
@@ -245,19 +348,21 @@ def register_socketio_events(socketio):
                 WHERE conv_id = %s
             """
             db.execute_update(update_conv_query, (group_id,))
+            record_change(group_id, 'new', sender_id, msg_id)
             
             # Get message details
             msg_query = """
-                SELECT m.msg_id, m.sender_id, m.content, m.timestamp, m.status,
-                       u.username as sender_username
+                SELECT m.msg_id, m.sender_id, m.content, m.timestamp, m.status, m.attachment_path
                 FROM MESSAGE m
-                JOIN USER u ON m.sender_id = u.user_id
                 WHERE m.msg_id = %s
             """
             message = db.execute_query(msg_query, (msg_id,))
             
-            if message:
-                msg = message[0]
+            if not message:
+                history_cache.invalidate(group_id)
+            else:
+                msg = attachment_store.attach_metadata(user_profiles.attach_usernames(message))[0]
+                history_cache.append(group_id, history_entry(msg))
                 message_data = {
                     'msg_id': msg['msg_id'],
                     'sender_id': msg['sender_id'],
@@ -265,18 +370,17 @@ def register_socketio_events(socketio):
                     'content': msg['content'],
                     'timestamp': msg['timestamp'].isoformat() if msg['timestamp'] else None,
                     'status': msg['status'],
+                    'attachment_path': msg['attachment_path'],
+                    **attachment_fields(msg),
                     'group_id': group_id,
                     'is_group': True
                 }
                 
                 # Broadcast to all group members (including sender for confirmation)
-                emit('new_group_message', message_data, room=f'group_{group_id}')
-                print(f"✓ Broadcast group message to group_{group_id}")
+                broadcast_group('new_group_message', message_data, group_id)
         
         except Exception as e:
-            print(f"✗ Error in send_group_message: {e}")
-            import traceback
-            print(traceback.format_exc())
+            log.exception("socket.send_group_message_failed", sender_id=sender_id, group_id=group_id)
             emit('group_message_error', {'error': str(e)})
     
     
@@ -288,7 +392,7 @@ def register_socketio_events(socketio):
         
         if user_id and group_id:
             join_room(f'group_{group_id}')
-            print(f"✓ User {user_id} joined group room {group_id}")
+            log.debug("socket.joined_group_room", user_id=user_id, group_id=group_id)
             emit('joined_group', {'group_id': group_id})
     
     
@@ -300,7 +404,7 @@ def register_socketio_events(socketio):
         
         if user_id and group_id:
             leave_room(f'group_{group_id}')
-            print(f"✓ User {user_id} left group room {group_id}")
+            log.debug("socket.left_group_room", user_id=user_id, group_id=group_id)
     
     
     @socketio.on('group_typing')
@@ -311,16 +415,19 @@ def register_socketio_events(socketio):
         is_typing = data.get('is_typing', False)
         sender_username = data.get('sender_username', 'Someone')
         
-        print(f"⌨️ Group typing event: sender={sender_id}, group={group_id}, typing={is_typing}")
+        log.debug("socket.group_typing", sender_id=sender_id, group_id=group_id, is_typing=is_typing)
         
         if group_id:
-            emit('group_user_typing', {
+            payload = {
                 'user_id': sender_id,
                 'username': sender_username,
                 'is_typing': is_typing,
                 'group_id': group_id
-            }, room=f'group_{group_id}', include_self=False)
-            print(f"✓ Sent typing indicator to group_{group_id}")
+            }
+            # Only state changes go out, at most one per window; the sweeper flushes the rest
+            if typing_coalescer.update(('group', sender_id, group_id), is_typing, 'group_user_typing',
+                                       payload, f'group_{group_id}', skip_sid=request.sid):
+                emit('group_user_typing', payload, room=f'group_{group_id}', include_self=False)
     
     
     @socketio.on('typing')
@@ -330,23 +437,46 @@ def register_socketio_events(socketio):
         receiver_id = data.get('receiver_id')
         is_typing = data.get('is_typing', False)
         
-        print(f"⌨️ Typing event: sender={sender_id}, receiver={receiver_id}, typing={is_typing}")
+        log.debug("socket.typing", sender_id=sender_id, receiver_id=receiver_id, is_typing=is_typing)
         
         if receiver_id:
-            emit('user_typing', {
+            payload = {
                 'user_id': sender_id,
                 'is_typing': is_typing
-            }, room=f'user_{receiver_id}')
-            print(f"✓ Sent typing indicator to user_{receiver_id}")
+            }
+            if typing_coalescer.update(('user', sender_id, receiver_id), is_typing, 'user_typing',
+                                       payload, f'user_{receiver_id}'):
+                emit('user_typing', payload, room=f'user_{receiver_id}')
+    
+    
+    @socketio.on('ack_delivery')
+    def handle_ack_delivery(data):
+        """Receiver confirms new_message events reached it; persisted by the delivery flusher"""
+        user_id = session.get('user_id')
+        
+        raw_ids = data.get('msg_ids') or []
+        if not isinstance(raw_ids, list) or len(raw_ids) > DELIVERY_MAX_ACK_IDS:
+            return
+        try:
+            msg_ids = {int(msg_id) for msg_id in raw_ids}
+        except (TypeError, ValueError):
+            return
+        
+        if not user_id or not msg_ids:
+            return
+        
+        delivery_acks.ack(user_id, list(msg_ids))
+        log.debug("socket.ack_delivery", user_id=user_id, count=len(msg_ids))
     
     
     @socketio.on('mark_read')
     def handle_mark_read(data):
         """Handle marking messages as read"""
-        user_id = data.get('user_id')
+        # The reader is the session user; a user_id in the payload is ignored
+        user_id = session.get('user_id')
         contact_id = data.get('contact_id')
         
-        print(f"👁️ Mark read: user={user_id}, contact={contact_id}")
+        log.debug("socket.mark_read", user_id=user_id, contact_id=contact_id)
         
         if not contact_id or not user_id:
             return
@@ -366,7 +496,7 @@ def register_socketio_events(socketio):
             conv_result = db.execute_query(conv_query, (user_id, contact_id))
             
             if not conv_result:
-                print(f"⚠️ No conversation found between {user_id} and {contact_id}")
+                log.debug("socket.mark_read_no_conversation", user_id=user_id, contact_id=contact_id)
                 return
             
             conv_id = conv_result[0]['conversation_id']
@@ -379,86 +509,148 @@ def register_socketio_events(socketio):
                 AND receiver_id = %s 
                 AND status != 'read'
             """
-            db.execute_update(update_query, (conv_id, user_id))
+            updated = db.execute_update(update_query, (conv_id, user_id))
+            if updated:
+                history_cache.mark_read(conv_id, user_id)
+                record_change(conv_id, 'read', user_id)
+                unread_counters.clear(user_id, contact_id)
+                push_unread(user_id, contact_id, -updated)
             
             # Notify sender
-            emit('messages_read', {
+            emit_replayable('messages_read', {
                 'reader_id': user_id,
                 'sender_id': contact_id
-            }, room=f'user_{contact_id}')
-            print(f"✓ Notified sender {contact_id} that messages were read")
+            }, f'user_{contact_id}', room=f'user_{contact_id}')
             
-        except Exception as e:
-            print(f"✗ Error in mark_read: {e}")
-            import traceback
-            print(traceback.format_exc())
+        except Exception:
+            log.exception("socket.mark_read_failed", user_id=user_id, contact_id=contact_id)
+    
+    
+    @socketio.on('resume')
+    def handle_resume(data=None):
+        """Replay events missed while disconnected (from memory, no DB access)"""
+        last_seq = (data or {}).get('last_seq')
+        
+        # First connect: just tell the client where the stream is
+        if last_seq is None:
+            return {'status': 'ok', 'seq': replay_buffer.head, 'replayed': 0}
+        
+        events, complete = replay_buffer.since(rooms(), int(last_seq))
+        if not complete:
+            log.info("socket.resume_gap_lost", sid=request.sid, last_seq=last_seq)
+            return {'status': 'resync_required', 'seq': replay_buffer.head}
+        
+        for seq, event, payload in events:
+            emit(event, {**payload, 'seq': seq})
+        
+        log.debug("socket.resumed", sid=request.sid, last_seq=last_seq, replayed=len(events))
+        return {'status': 'ok', 'seq': replay_buffer.head, 'replayed': len(events)}
     
     
     @socketio.on('get_online_users')
     def handle_get_online_users():
         """Get list of online users"""
         emit('online_users_list', {'users': list(online_users.keys())})
-        print(f"📋 Sent online users list: {list(online_users.keys())}")
+        log.debug("socket.online_users_sent", count=len(online_users))
+    
+    
+    def load_message_route(msg_id):
+        """Conversation, sender and receiver of a message, for routing change notifications"""
+        route_query = """
+            SELECT m.conv_id, m.sender_id, m.receiver_id, c.type
+            FROM MESSAGE m
+            JOIN CONVERSATION c ON c.conv_id = m.conv_id
+            WHERE m.msg_id = %s
+        """
+        route = db.execute_query(route_query, (msg_id,))
+        return route[0] if route else None
+    
+    
+    def notify_message_change(event, payload, route):
+        """Confirm a persisted edit/delete to the sender and notify the other side"""
+        emit_replayable(event, payload, f'user_{route["sender_id"]}')
+        
+        if route['type'] == 'group':
+            # Group message - notify all members
+            broadcast_group(event, payload, route['conv_id'], skip_sid=request.sid)
+        else:
+            # Direct message - notify receiver
+            receiver_id = route['receiver_id']
+            emit_replayable(event, payload, f'user_{receiver_id}', room=f'user_{receiver_id}')
     
     
     @socketio.on('delete_message')
     def handle_delete_message(data):
-        """Handle real-time message deletion"""
-        sender_id = data.get('sender_id')
+        """Delete (soft) the caller's own message and broadcast it; acks {success, error}"""
+        user_id = session.get('user_id')
         msg_id = data.get('msg_id')
-        receiver_id = data.get('receiver_id')
-        group_id = data.get('group_id')
-        
-        print(f"🗑️ Delete message: msg_id={msg_id}, sender={sender_id}")
         
-        if not msg_id or not sender_id:
-            return
+        log.debug("socket.delete_message", msg_id=msg_id, user_id=user_id)
         
-        delete_data = {'msg_id': msg_id, 'deleted': True}
+        if not msg_id or not user_id:
+            return {'success': False, 'error': 'Missing data'}
         
-        # Confirm deletion to sender
-        emit('message_deleted', delete_data)
+        try:
+            msg_id = int(msg_id)
+            
+            # Ownership check and write in one statement: only the sender's live message matches
+            delete_query = """
+                UPDATE MESSAGE 
+                SET deleted = TRUE, deleted_at = NOW(), content = 'This message was deleted'
+                WHERE msg_id = %s AND sender_id = %s AND deleted = FALSE
+            """
+            if not db.execute_update(delete_query, (msg_id, user_id)):
+                return {'success': False, 'error': 'Cannot delete this message'}
+            
+            route = load_message_route(msg_id)
+            if route:
+                history_cache.update(route['conv_id'], msg_id, deleted=True, content='This message was deleted')
+                record_change(route['conv_id'], 'delete', user_id, msg_id)
+                notify_message_change('message_deleted', {'msg_id': msg_id, 'deleted': True}, route)
+            
+            return {'success': True, 'msg_id': msg_id}
         
-        # Notify others
-        if group_id:
-            # Group message - notify all members
-            emit('message_deleted', delete_data, room=f'group_{group_id}', include_self=False)
-            print(f"✓ Notified group {group_id} of deletion")
-        elif receiver_id:
-            # Direct message - notify receiver
-            emit('message_deleted', delete_data, room=f'user_{receiver_id}')
-            print(f"✓ Notified receiver {receiver_id} of deletion")
+        except Exception as e:
+            log.exception("socket.delete_message_failed", msg_id=msg_id, user_id=user_id)
+            return {'success': False, 'error': str(e)}
     
     
     @socketio.on('edit_message')
     def handle_edit_message(data):
-        """Handle real-time message editing"""
-        sender_id = data.get('sender_id')
+        """Edit the caller's own message and broadcast it; acks {success, error}"""
+        user_id = session.get('user_id')
         msg_id = data.get('msg_id')
-        new_content = data.get('content')
-        receiver_id = data.get('receiver_id')
-        group_id = data.get('group_id')
+        new_content = (data.get('content') or '').strip()
         
-        print(f"✏️ Edit message: msg_id={msg_id}, sender={sender_id}")
+        log.debug("socket.edit_message", msg_id=msg_id, user_id=user_id)
         
-        if not msg_id or not sender_id or not new_content:
-            return
+        if not msg_id or not user_id or not new_content:
+            return {'success': False, 'error': 'Message content required'}
         
-        edit_data = {
-            'msg_id': msg_id,
-            'content': new_content,
-            'edited': True
-        }
-        
-        # Confirm edit to sender
-        emit('message_edited', edit_data)
+        try:
+            msg_id = int(msg_id)
+            
+            # Ownership check and write in one statement; deleted messages stay deleted
+            update_query = """
+                UPDATE MESSAGE 
+                SET content = %s, edited = TRUE, edited_at = NOW()
+                WHERE msg_id = %s AND sender_id = %s AND deleted = FALSE
+            """
+            if not db.execute_update(update_query, (new_content, msg_id, user_id)):
+                return {'success': False, 'error': 'Cannot edit this message'}
+            
+            route = load_message_route(msg_id)
+            if route:
+                history_cache.update(route['conv_id'], msg_id, content=new_content, edited=True)
+                record_change(route['conv_id'], 'edit', user_id, msg_id)
+                notify_message_change('message_edited', {
+                    'msg_id': msg_id,
+                    'content': new_content,
+                    'edited': True
+                }, route)
+            
+            return {'success': True, 'msg_id': msg_id, 'content': new_content}
         
-        # Notify others
-        if group_id:
-            # Group message - notify all members
-            emit('message_edited', edit_data, room=f'group_{group_id}', include_self=False)
-            print(f"✓ Notified group {group_id} of edit")
-        elif receiver_id:
-            # Direct message - notify receiver
-            emit('message_edited', edit_data, room=f'user_{receiver_id}')
-            print(f"✓ Notified receiver {receiver_id} of edit")
\ No newline at end of file
+        except Exception as e:
+            log.exception("socket.edit_message_failed", msg_id=msg_id, user_id=user_id)
+            return {'success': False, 'error': str(e)}
\ No newline at end of file
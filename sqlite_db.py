@@ -0,0 +1,332 @@
+import os
+import queue
+import re
+import sqlite3
+from datetime import datetime
+from functools import lru_cache
+from database.db import Database
+from logger import get_logger
+
+log = get_logger(__name__)
+
+# Idle connections kept open; threads beyond this open one for the statement and close it
+SQLITE_POOL_SIZE = int(os.getenv('SQLITE_POOL_SIZE', '8'))
+
+# =====================================================
+# SCHEMA (translated from chatflow.sql)
+# =====================================================
+# ENUM columns become TEXT with a CHECK constraint, DATETIME/TIMESTAMP keep
+# their declared type so sqlite3 converts them back to datetime objects.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS USER (
+    user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username VARCHAR(50) UNIQUE NOT NULL,
+    email VARCHAR(100) UNIQUE NOT NULL,
+    password_hash VARCHAR(255) NOT NULL,
+    status TEXT DEFAULT 'offline' CHECK (status IN ('online', 'offline')),
+    last_active DATETIME DEFAULT (datetime('now', 'localtime')),
+    role TEXT DEFAULT 'user' CHECK (role IN ('user', 'admin')),
+    profile_photo_privacy TEXT DEFAULT 'everyone' CHECK (profile_photo_privacy IN ('everyone', 'friends', 'no_one')),
+    group_add_privacy TEXT DEFAULT 'everyone' CHECK (group_add_privacy IN ('everyone', 'friends', 'no_one')),
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+);
+
+CREATE TABLE IF NOT EXISTS CONVERSATION (
+    conv_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    type TEXT NOT NULL DEFAULT 'direct' CHECK (type IN ('direct', 'group')),
+    name VARCHAR(100) NULL,
+    created_by INT NOT NULL,
+    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    last_message_at TIMESTAMP NULL,
+    privacy_settings TEXT DEFAULT 'private' CHECK (privacy_settings IN ('public', 'private')),
+    FOREIGN KEY (created_by) REFERENCES USER(user_id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_conversation_type ON CONVERSATION(type);
+CREATE INDEX IF NOT EXISTS idx_conversation_created_by ON CONVERSATION(created_by);
+CREATE INDEX IF NOT EXISTS idx_conversation_last_message ON CONVERSATION(last_message_at DESC);
+
+CREATE TABLE IF NOT EXISTS CONVERSATION_PARTICIPANT (
+    conversation_id INT NOT NULL,
+    user_id INT NOT NULL,
+    role TEXT DEFAULT 'member' CHECK (role IN ('admin', 'member')),
+    joined_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+    last_read_msg_id INT NULL,
+    muted BOOLEAN DEFAULT FALSE,
+    archived BOOLEAN DEFAULT FALSE,
+    PRIMARY KEY (conversation_id, user_id),
+    FOREIGN KEY (conversation_id) REFERENCES CONVERSATION(conv_id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES USER(user_id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_participant_user ON CONVERSATION_PARTICIPANT(user_id);
+CREATE INDEX IF NOT EXISTS idx_participant_user_archived ON CONVERSATION_PARTICIPANT(user_id, archived);
+
+CREATE TABLE IF NOT EXISTS MESSAGE (
+    msg_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sender_id INT NOT NULL,
+    receiver_id INT NOT NULL,
+    conv_id INT NULL,
+    content TEXT NOT NULL,
+    attachment_path VARCHAR(255),
+    timestamp DATETIME DEFAULT (datetime('now', 'localtime')),
+    status TEXT DEFAULT 'sent' CHECK (status IN ('sent', 'delivered', 'read')),
+    pinned BOOLEAN DEFAULT FALSE,
+    edited BOOLEAN DEFAULT FALSE,
+    edited_at DATETIME NULL,
+    deleted BOOLEAN DEFAULT FALSE,
+    deleted_at DATETIME NULL,
+    FOREIGN KEY (sender_id) REFERENCES USER(user_id) ON DELETE CASCADE,
+    FOREIGN KEY (receiver_id) REFERENCES USER(user_id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_message_sender ON MESSAGE(sender_id);
+CREATE INDEX IF NOT EXISTS idx_message_receiver ON MESSAGE(receiver_id);
+CREATE INDEX IF NOT EXISTS idx_message_timestamp ON MESSAGE(timestamp);
+CREATE INDEX IF NOT EXISTS idx_message_conv_timestamp ON MESSAGE(conv_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_message_attachment ON MESSAGE(attachment_path) WHERE attachment_path IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS USERBLOCK (
+    blocker_id INT NOT NULL,
+    blocked_id INT NOT NULL,
+    blocked_at DATETIME DEFAULT (datetime('now', 'localtime')),
+    PRIMARY KEY (blocker_id, blocked_id),
+    FOREIGN KEY (blocker_id) REFERENCES USER(user_id) ON DELETE CASCADE,
+    FOREIGN KEY (blocked_id) REFERENCES USER(user_id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_userblock_blocked ON USERBLOCK(blocked_id);
+
+CREATE TABLE IF NOT EXISTS USERCONTACT (
+    user_id INT NOT NULL,
+    contact_user_id INT NOT NULL,
+    added_at DATETIME DEFAULT (datetime('now', 'localtime')),
+    PRIMARY KEY (user_id, contact_user_id),
+    FOREIGN KEY (user_id) REFERENCES USER(user_id) ON DELETE CASCADE,
+    FOREIGN KEY (contact_user_id) REFERENCES USER(user_id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_usercontact_contact ON USERCONTACT(contact_user_id);
+
+CREATE TABLE IF NOT EXISTS STARREDMESSAGES (
+    user_id INT NOT NULL,
+    msg_id INT NOT NULL,
+    starred_at DATETIME DEFAULT (datetime('now', 'localtime')),
+    PRIMARY KEY (user_id, msg_id),
+    FOREIGN KEY (user_id) REFERENCES USER(user_id) ON DELETE CASCADE,
+    FOREIGN KEY (msg_id) REFERENCES MESSAGE(msg_id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_starred_msg ON STARREDMESSAGES(msg_id);
+
+CREATE TABLE IF NOT EXISTS ARCHIVEDMESSAGES (
+    user_id INT NOT NULL,
+    msg_id INT NOT NULL,
+    archived_at DATETIME DEFAULT (datetime('now', 'localtime')),
+    PRIMARY KEY (user_id, msg_id),
+    FOREIGN KEY (user_id) REFERENCES USER(user_id) ON DELETE CASCADE,
+    FOREIGN KEY (msg_id) REFERENCES MESSAGE(msg_id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS USERACTIVITYLOG (
+    log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INT NOT NULL,
+    action VARCHAR(255) NOT NULL,
+    timestamp DATETIME DEFAULT (datetime('now', 'localtime')),
+    FOREIGN KEY (user_id) REFERENCES USER(user_id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_activity_user ON USERACTIVITYLOG(user_id);
+CREATE INDEX IF NOT EXISTS idx_activity_timestamp ON USERACTIVITYLOG(timestamp);
+
+CREATE TABLE IF NOT EXISTS ADMINACTION (
+    admin_action_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    admin_id INT NOT NULL,
+    action_description TEXT NOT NULL,
+    target_user_id INT,
+    timestamp DATETIME DEFAULT (datetime('now', 'localtime')),
+    FOREIGN KEY (admin_id) REFERENCES USER(user_id) ON DELETE CASCADE,
+    FOREIGN KEY (target_user_id) REFERENCES USER(user_id) ON DELETE SET NULL
+);
+CREATE INDEX IF NOT EXISTS idx_adminaction_admin ON ADMINACTION(admin_id);
+CREATE INDEX IF NOT EXISTS idx_adminaction_target ON ADMINACTION(target_user_id);
+
+CREATE TABLE IF NOT EXISTS MESSAGECHANGELOG (
+    change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    conv_id INT NOT NULL,
+    msg_id INT NULL,
+    user_id INT NOT NULL,
+    change_type TEXT NOT NULL CHECK (change_type IN ('new', 'edit', 'delete', 'status', 'read')),
+    changed_at DATETIME DEFAULT (datetime('now', 'localtime')),
+    FOREIGN KEY (conv_id) REFERENCES CONVERSATION(conv_id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_changelog_conv ON MESSAGECHANGELOG(conv_id, change_id);
+
+CREATE TABLE IF NOT EXISTS ATTACHMENT (
+    file_hash CHAR(64) PRIMARY KEY,
+    size BIGINT NOT NULL,
+    mime_type VARCHAR(100) NOT NULL,
+    original_name VARCHAR(255) NOT NULL,
+    uploaded_by INT NULL,
+    width INT NULL,
+    height INT NULL,
+    thumbnail BOOLEAN DEFAULT FALSE,
+    created_at DATETIME DEFAULT (datetime('now', 'localtime')),
+    FOREIGN KEY (uploaded_by) REFERENCES USER(user_id) ON DELETE SET NULL
+);
+
+CREATE TABLE IF NOT EXISTS ATTACHMENTUPLOADER (
+    file_hash CHAR(64) NOT NULL,
+    user_id INT NOT NULL,
+    PRIMARY KEY (file_hash, user_id),
+    FOREIGN KEY (file_hash) REFERENCES ATTACHMENT(file_hash) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES USER(user_id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS ARCHIVESEGMENT (
+    segment_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    conv_id INT NOT NULL,
+    file_offset BIGINT NOT NULL,
+    byte_length INT NOT NULL,
+    message_count INT NOT NULL,
+    first_msg_id INT NOT NULL,
+    last_msg_id INT NOT NULL,
+    first_at DATETIME NOT NULL,
+    last_at DATETIME NOT NULL,
+    created_at DATETIME DEFAULT (datetime('now', 'localtime')),
+    FOREIGN KEY (conv_id) REFERENCES CONVERSATION(conv_id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_archivesegment_conv ON ARCHIVESEGMENT(conv_id, segment_id);
+
+CREATE TABLE IF NOT EXISTS ARCHIVEATTACHMENT (
+    file_hash CHAR(64) NOT NULL,
+    conv_id INT NOT NULL,
+    PRIMARY KEY (file_hash, conv_id),
+    FOREIGN KEY (conv_id) REFERENCES CONVERSATION(conv_id) ON DELETE CASCADE
+);
+"""
+
+_PLACEHOLDER = re.compile(r'%s')
+
+
+def _convert_datetime(value):
+    return datetime.fromisoformat(value.decode())
+
+
+def _now():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _dict_factory(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+sqlite3.register_converter('DATETIME', _convert_datetime)
+sqlite3.register_converter('TIMESTAMP', _convert_datetime)
+
+
+@lru_cache(maxsize=512)
+def translate_query(query):
+    """Rewrite MySQL-style placeholders (%s) into SQLite's (?)"""
+    return _PLACEHOLDER.sub('?', query)
+
+
+class SQLiteDatabase(Database):
+    """Embedded SQLite backend: WAL journal, small pool of idle connections.
+
+    A thread checks a connection out for the duration of a statement or
+    transaction (nested uses on the same thread share it) and returns it
+    afterwards, so short-lived request threads do not each keep one open.
+    """
+
+    backend = 'sqlite'
+    driver_errors = (sqlite3.Error,)
+
+    def __init__(self, path=None, pool_size=SQLITE_POOL_SIZE):
+        self.path = path or os.getenv('SQLITE_PATH', 'chatflow.db')
+        self._idle = queue.LifoQueue(maxsize=pool_size)
+        super().__init__()
+        self._create_pool()
+
+    def _create_pool(self):
+        """Make sure the schema exists; connections are opened on demand"""
+        conn = self.get_connection()
+        if conn is None:
+            return
+        try:
+            conn.executescript(SCHEMA)
+            log.info("db.sqlite_ready", path=self.path)
+        except sqlite3.Error as e:
+            log.error("db.sqlite_init_failed", path=self.path, error=str(e))
+        finally:
+            self.release_connection(conn)
+
+    def _open(self):
+        conn = sqlite3.connect(
+            self.path,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            isolation_level=None,  # autocommit, like the MySQL pool
+            check_same_thread=False,
+            timeout=30
+        )
+        conn.row_factory = _dict_factory
+        conn.create_function('NOW', 0, _now)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    def get_connection(self):
+        """Check out a connection for this thread: the one it already holds, an idle one or a new one"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.depth += 1
+            return conn
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            try:
+                conn = self._open()
+            except sqlite3.Error as e:
+                log.error("db.get_connection_failed", error=str(e))
+                return None
+        self._local.conn = conn
+        self._local.depth = 1
+        return conn
+
+    def release_connection(self, conn):
+        """Return the thread's connection to the idle pool once its outermost use ends"""
+        self._local.depth -= 1
+        if self._local.depth:
+            return
+        self._local.conn = None
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def _cursor(self, conn):
+        return conn.cursor()
+
+    def _prepare(self, query):
+        return translate_query(query)
+
+    def _begin(self, conn):
+        conn.execute("BEGIN")
+
+    def connect(self):
+        """Check that the database can be opened"""
+        conn = self.get_connection()
+        if conn is None:
+            return False
+        self.release_connection(conn)
+        return True
+
+    def ensure_connection(self):
+        return self.connect()
+
+    def disconnect(self):
+        """Close the idle connections (at shutdown)"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                log.warning("db.disconnect_failed", error=str(e))
+        log.info("db.disconnected", backend=self.backend)
\ No newline at end of file
@@ -0,0 +1,169 @@
+import os
+from flask import Blueprint, jsonify, request, session
+from database.db import db
+from datetime import datetime, timedelta
+from routes.auth import login_required
+from etags import bump_conversation
+from profiles import user_profiles
+from attachments import attachment_fields, attachment_store
+from logger import get_logger
+
+log = get_logger(__name__)
+
+sync_bp = Blueprint('sync', __name__, url_prefix='/api/sync')
+
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 500
+# Seconds a change must have been in the log before sync hands it out. A lower
+# change_id can still be uncommitted while a higher one is visible; a cursor
+# moved past it would skip that change for good.
+SYNC_SAFETY_LAG = float(os.getenv('SYNC_SAFETY_LAG', '2'))
+
+# =====================================================
+# CHANGE LOG
+# =====================================================
+def record_change(conv_id, change_type, user_id, msg_id=None):
+    """Append a message change to the sync log and invalidate cached payloads.
+
+    change_type is one of 'new', 'edit', 'delete', 'status' (per message)
+    or 'read' (every message in conv_id addressed to user_id was read).
+    """
+    bump_conversation(conv_id)
+    query = """
+        INSERT INTO MESSAGECHANGELOG (conv_id, msg_id, user_id, change_type, changed_at)
+        VALUES (%s, %s, %s, %s, NOW())
+    """
+    if not db.execute_update(query, (conv_id, msg_id, user_id, change_type)):
+        log.error("sync.record_change_failed", conv_id=conv_id, msg_id=msg_id, change_type=change_type)
+
+
+def record_changes(changes):
+    """record_change for many (conv_id, change_type, user_id, msg_id) rows in one INSERT"""
+    if not changes:
+        return
+    for conv_id in {change[0] for change in changes}:
+        bump_conversation(conv_id)
+    placeholders = ', '.join(['(%s, %s, %s, %s, NOW())'] * len(changes))
+    query = f"""
+        INSERT INTO MESSAGECHANGELOG (conv_id, msg_id, user_id, change_type, changed_at)
+        VALUES {placeholders}
+    """
+    params = []
+    for conv_id, change_type, user_id, msg_id in changes:
+        params.extend((conv_id, msg_id, user_id, change_type))
+    if not db.execute_update(query, tuple(params)):
+        log.error("sync.record_changes_failed", count=len(changes))
+
+
+def _format_message(msg, current_user_id):
+    formatted = {
+        'msg_id': msg['msg_id'],
+        'conv_id': msg['conv_id'],
+        'sender_id': msg['sender_id'],
+        'receiver_id': msg['receiver_id'],
+        'sender_username': msg['sender_username'],
+        'content': msg['content'],
+        'timestamp': msg['timestamp'].isoformat() if msg['timestamp'] else None,
+        'status': msg['status'],
+        'attachment_path': msg['attachment_path'],
+        **attachment_fields(msg),
+        'is_mine': msg['sender_id'] == current_user_id,
+        'edited': bool(msg['edited']),
+        'deleted': bool(msg['deleted'])
+    }
+    if msg['conv_type'] == 'group':
+        formatted['group_id'] = msg['conv_id']
+        formatted['is_group'] = True
+    return formatted
+
+
+# =====================================================
+# DELTA SYNC
+# =====================================================
+@sync_bp.route('', methods=['GET'])
+@login_required
+def sync():
+    """Return message changes after ?since=<cursor> across all of the user's conversations"""
+    try:
+        current_user_id = session.get('user_id')
+        since = request.args.get('since', type=int)
+        limit = min(max(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+
+        bounds_query = """
+            SELECT (SELECT MIN(change_id) FROM MESSAGECHANGELOG) AS oldest,
+                   (SELECT MAX(change_id) FROM MESSAGECHANGELOG) AS head,
+                   NOW() AS db_now
+        """
+        bounds = db.execute_query(bounds_query)
+        oldest = bounds[0]['oldest'] if bounds else None
+        head = (bounds[0]['head'] if bounds else None) or 0
+        db_now = bounds[0]['db_now'] if bounds else None
+
+        # No cursor yet: hand out the current head so the client can start tracking
+        if since is None:
+            return jsonify({'cursor': head, 'messages': [], 'reads': [], 'has_more': False})
+
+        # Cursor older than the retained log: the client must reload everything
+        if oldest is not None and since < oldest - 1:
+            log.info("sync.resync_required", user_id=current_user_id, since=since, oldest=oldest)
+            return jsonify({'cursor': head, 'messages': [], 'reads': [], 'has_more': False,
+                            'resync_required': True})
+
+        changes_query = """
+            SELECT mc.change_id, mc.conv_id, mc.msg_id, mc.user_id, mc.change_type, mc.changed_at
+            FROM CONVERSATION_PARTICIPANT cp
+            JOIN MESSAGECHANGELOG mc ON mc.conv_id = cp.conversation_id
+            WHERE cp.user_id = %s AND mc.change_id > %s
+            ORDER BY mc.change_id ASC
+            LIMIT %s
+        """
+        changes = db.execute_query(changes_query, (current_user_id, since, limit + 1)) or []
+
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+
+        # Stop at the first change that may still have in-flight writes below it. changed_at
+        # comes from the database's NOW(), so the cutoff is taken from the same clock.
+        if isinstance(db_now, str):
+            db_now = datetime.fromisoformat(db_now)
+        settled_before = db_now - timedelta(seconds=SYNC_SAFETY_LAG) if db_now else datetime.min
+        for index, change in enumerate(changes):
+            if change['changed_at'] is not None and change['changed_at'] >= settled_before:
+                changes = changes[:index]
+                has_more = False
+                break
+
+        # Several changes to one message collapse into its current state
+        msg_ids = sorted({c['msg_id'] for c in changes if c['msg_id'] is not None})
+        messages = []
+        if msg_ids:
+            placeholders = ', '.join(['%s'] * len(msg_ids))
+            msg_query = f"""
+                SELECT m.msg_id, m.conv_id, m.sender_id, m.receiver_id, m.content,
+                       m.timestamp, m.status, m.attachment_path, m.edited, m.deleted,
+                       c.type as conv_type
+                FROM MESSAGE m
+                JOIN CONVERSATION c ON c.conv_id = m.conv_id
+                WHERE m.msg_id IN ({placeholders})
+                ORDER BY m.msg_id ASC
+            """
+            rows = user_profiles.attach_usernames(db.execute_query(msg_query, tuple(msg_ids)) or [])
+            attachment_store.attach_metadata(rows)
+            messages = [_format_message(row, current_user_id) for row in rows]
+
+        reads = [{
+            'conv_id': c['conv_id'],
+            'reader_id': c['user_id'],
+            'read_at': c['changed_at'].isoformat() if c['changed_at'] else None
+        } for c in changes if c['change_type'] == 'read']
+
+        # Only past changes actually served; jumping to head could skip a late commit
+        cursor = changes[-1]['change_id'] if changes else since
+
+        log.debug("sync.served", user_id=current_user_id, since=since, changes=len(changes),
+                  messages=len(messages), has_more=has_more)
+        return jsonify({'cursor': cursor, 'messages': messages, 'reads': reads, 'has_more': has_more})
+
+    except Exception as e:
+        log.exception("sync.sync_failed")
+        return jsonify({'success': False, 'error': str(e)}), 500
\ No newline at end of file
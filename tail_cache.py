@@ -0,0 +1,187 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+from attachments import attachment_fields
+from logger import get_logger
+
+log = get_logger(__name__)
+
+# Approximate memory the cache may hold across all conversations
+TAIL_CACHE_BYTES = int(os.getenv('TAIL_CACHE_BYTES', str(32 * 1024 * 1024)))
+
+
+def history_entry(row):
+    """Viewer-independent history record for a MESSAGE row; is_mine is added per request"""
+    entry = {
+        'msg_id': row['msg_id'],
+        'sender_id': row['sender_id'],
+        'sender_username': row['sender_username'],
+        'content': row['content'],
+        'timestamp': row['timestamp'].isoformat() if row['timestamp'] else None,
+        'status': row['status'],
+        'attachment_path': row.get('attachment_path'),
+        **attachment_fields(row),
+        'edited': bool(row.get('edited')),
+        'deleted': bool(row.get('deleted'))
+    }
+    # Direct history carries the receiver; group history does not
+    if 'receiver_id' in row:
+        entry['receiver_id'] = row['receiver_id']
+    return entry
+
+
+def for_viewer(entries, user_id):
+    return [{**entry, 'is_mine': entry['sender_id'] == user_id} for entry in entries]
+
+
+def _entry_size(entry):
+    return sys.getsizeof(entry) + sum(sys.getsizeof(value) for value in entry.values())
+
+
+class _Tail:
+    __slots__ = ('entries', 'limit', 'size')
+
+    def __init__(self, entries, limit):
+        self.entries = entries
+        self.limit = limit
+        self.size = sum(_entry_size(entry) for entry in entries)
+
+
+# =====================================================
+# CONVERSATION TAIL CACHE
+# =====================================================
+class ConversationTailCache:
+    """Newest history page of each active conversation, kept in memory.
+
+    A conversation is loaded by its first history read; after that every
+    send, edit, delete, delivery and read-receipt path writes through, so
+    repeat opens are served without touching MESSAGE. Conversations are
+    evicted least recently used first once the byte budget is exceeded.
+    """
+
+    def __init__(self, max_bytes=TAIL_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._tails = OrderedDict()  # conv_id -> _Tail
+        self._bytes = 0
+        self._loading = {}  # conv_id -> True once a write lands while its history is being read
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_load(self, conv_id, limit, loader):
+        """The newest `limit` history entries (oldest first); loader() runs on a miss.
+
+        loader returns the entries from the database, or None if the read
+        failed (nothing is cached then).
+        """
+        conv_id = int(conv_id)
+        with self._lock:
+            tail = self._tails.get(conv_id)
+            if tail is not None and tail.limit == limit:
+                self._tails.move_to_end(conv_id)
+                self.hits += 1
+                return list(tail.entries)
+            self.misses += 1
+            self._loading.setdefault(conv_id, False)
+
+        entries = loader()
+        with self._lock:
+            # A write during the load may already be missing from these rows; let the next read retry
+            dirty = self._loading.pop(conv_id, True)
+            if entries is not None and not dirty:
+                self._discard(conv_id)
+                self._store(conv_id, _Tail(list(entries), limit))
+        return entries
+
+    def append(self, conv_id, entry):
+        """Add a newly sent message to a cached conversation"""
+        with self._lock:
+            tail = self._lookup_for_write(int(conv_id))
+            # A load that finished after the INSERT already holds this row
+            if tail is None or any(cached['msg_id'] == entry['msg_id'] for cached in tail.entries):
+                return
+            tail.entries.append(entry)
+            tail.size += _entry_size(entry)
+            self._bytes += _entry_size(entry)
+            while len(tail.entries) > tail.limit:
+                dropped = tail.entries.pop(0)
+                tail.size -= _entry_size(dropped)
+                self._bytes -= _entry_size(dropped)
+            self._evict()
+
+    def update(self, conv_id, msg_id, **fields):
+        """Apply an edit, delete or status change to one cached message"""
+        with self._lock:
+            tail = self._lookup_for_write(int(conv_id))
+            if tail is None:
+                return
+            for index, entry in enumerate(tail.entries):
+                if entry['msg_id'] == int(msg_id):
+                    # Replace rather than mutate; readers may still hold the old dict
+                    updated = {**entry, **fields}
+                    delta = _entry_size(updated) - _entry_size(entry)
+                    tail.entries[index] = updated
+                    tail.size += delta
+                    self._bytes += delta
+                    break
+
+    def mark_read(self, conv_id, reader_id):
+        """Mirror `UPDATE MESSAGE SET status = 'read' WHERE receiver_id = reader`"""
+        with self._lock:
+            tail = self._lookup_for_write(int(conv_id))
+            if tail is None:
+                return
+            reader_id = int(reader_id)
+            tail.entries = [
+                {**entry, 'status': 'read'}
+                if entry.get('receiver_id') == reader_id and entry['status'] != 'read' else entry
+                for entry in tail.entries
+            ]
+            size = sum(_entry_size(entry) for entry in tail.entries)
+            self._bytes += size - tail.size
+            tail.size = size
+
+    def invalidate(self, conv_id):
+        with self._lock:
+            self._lookup_for_write(int(conv_id))
+            self._discard(int(conv_id))
+
+    def _lookup_for_write(self, conv_id):
+        if conv_id in self._loading:
+            self._loading[conv_id] = True
+        return self._tails.get(conv_id)
+
+    def _store(self, conv_id, tail):
+        self._tails[conv_id] = tail
+        self._bytes += tail.size
+        self._evict()
+
+    def _discard(self, conv_id):
+        tail = self._tails.pop(conv_id, None)
+        if tail is not None:
+            self._bytes -= tail.size
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._tails:
+            conv_id, tail = self._tails.popitem(last=False)
+            self._bytes -= tail.size
+            self.evictions += 1
+            log.debug("tail_cache.evicted", conv_id=conv_id, size=tail.size)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'conversations': len(self._tails),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions
+            }
+
+
+history_cache = ConversationTailCache()
\ No newline at end of file
@@ -0,0 +1,125 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from database.db import db
+from logger import get_logger
+from attachments import attachment_store
+from etags import bump_conversation
+from imaging import can_thumbnail, make_thumbnail
+from tail_cache import history_cache
+
+log = get_logger(__name__)
+
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', '2'))
+# Images waiting for or in a worker; further uploads skip their preview instead of queueing
+THUMBNAIL_QUEUE_LIMIT = int(os.getenv('THUMBNAIL_QUEUE_LIMIT', '64'))
+# Longest side of a preview, in pixels
+THUMBNAIL_EDGE = int(os.getenv('THUMBNAIL_EDGE', '320'))
+
+
+# =====================================================
+# THUMBNAIL SERVICE
+# =====================================================
+class ThumbnailService:
+    """Generates image previews in a small process pool, off the request path.
+
+    Decoding and resizing are CPU-bound, so they run in worker processes
+    rather than threads. Work is keyed by content hash: an image already
+    previewed or already in flight is not queued again, and the preview of a
+    deduplicated upload is shared. Results are written to ATTACHMENT
+    (width, height, thumbnail) and show up in message payloads from then on.
+    """
+
+    def __init__(self, workers=THUMBNAIL_WORKERS, queue_limit=THUMBNAIL_QUEUE_LIMIT, max_edge=THUMBNAIL_EDGE):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.max_edge = max_edge
+        self._lock = threading.Lock()
+        self._pool = None
+        self._inflight = {}  # file_hash -> Future
+        self.generated = 0
+        self.failed = 0
+        self.skipped = 0
+
+    def _executor(self):
+        if self._pool is None:
+            # Fresh interpreters: forking a process with live threads and DB connections
+            # can copy held locks into the child. Workers only call imaging.make_thumbnail;
+            # the app module they re-import is safe to import (no connections, no tasks).
+            self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=multiprocessing.get_context('spawn'))
+        return self._pool
+
+    def schedule(self, file_info):
+        """Queue a preview for a freshly stored upload; returns True if one is (being) made"""
+        file_hash, mime_type = file_info['filename'], file_info['mime_type']
+        if not can_thumbnail(mime_type):
+            return False
+        meta = attachment_store.describe(file_hash)
+        if meta is None or meta['thumbnail']:
+            return bool(meta)
+
+        with self._lock:
+            if file_hash in self._inflight:
+                return True
+            if len(self._inflight) >= self.queue_limit:
+                self.skipped += 1
+                log.warning("thumbnails.queue_full", file_hash=file_hash, inflight=len(self._inflight))
+                return False
+            try:
+                future = self._executor().submit(make_thumbnail, attachment_store.path_for(file_hash),
+                                                 attachment_store.thumbnail_path(file_hash), self.max_edge)
+            except BrokenProcessPool:
+                # A worker died (e.g. killed on memory); start a fresh pool for the next image
+                log.error("thumbnails.pool_broken")
+                self._pool = None
+                return False
+            self._inflight[file_hash] = future
+        future.add_done_callback(lambda done: self._finished(file_hash, done))
+        return True
+
+    def _finished(self, file_hash, future):
+        with self._lock:
+            self._inflight.pop(file_hash, None)
+        try:
+            size = future.result()
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            log.warning("thumbnails.failed", file_hash=file_hash, error=str(e))
+            return
+
+        try:
+            update_query = """
+                UPDATE ATTACHMENT SET width = %s, height = %s, thumbnail = TRUE
+                WHERE file_hash = %s
+            """
+            db.execute_update(update_query, (size['width'], size['height'], file_hash))
+            attachment_store.forget(file_hash)
+
+            # Usually the preview is ready before the message is sent; if not, refresh
+            # the cached history and ETags of the conversations that already carry it
+            conv_query = "SELECT conv_id FROM MESSAGE WHERE attachment_path = %s"
+            for conv_id in {row['conv_id'] for row in db.execute_query(conv_query, (file_hash,)) or []}:
+                history_cache.invalidate(conv_id)
+                bump_conversation(conv_id)
+
+            with self._lock:
+                self.generated += 1
+            log.debug("thumbnails.generated", file_hash=file_hash, **size)
+        except Exception:
+            log.exception("thumbnails.record_failed", file_hash=file_hash)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'inflight': len(self._inflight),
+                'generated': self.generated,
+                'failed': self.failed,
+                'skipped': self.skipped
+            }
+
+
+thumbnail_service = ThumbnailService()
\ No newline at end of file
@@ -0,0 +1,129 @@
+import os
+import threading
+import time
+from logger import get_logger
+
+log = get_logger(__name__)
+
+# Minimum seconds between two forwarded typing events for one user in one conversation
+TYPING_WINDOW = float(os.getenv('TYPING_WINDOW', '1.0'))
+# A "typing" state with no refresh for this long is turned off by the server
+TYPING_TTL = float(os.getenv('TYPING_TTL', '6.0'))
+TYPING_SWEEP_INTERVAL = float(os.getenv('TYPING_SWEEP_INTERVAL', '0.5'))
+
+
+class _TypingEntry:
+    __slots__ = ('wanted', 'sent', 'sent_at', 'expires_at', 'event', 'payload', 'room', 'skip_sid')
+
+    def __init__(self, event, payload, room, skip_sid):
+        self.wanted = False
+        self.sent = False
+        self.sent_at = float('-inf')
+        self.expires_at = 0.0
+        self.event = event
+        self.payload = payload
+        self.room = room
+        self.skip_sid = skip_sid
+
+
+# =====================================================
+# TYPING COALESCER
+# =====================================================
+class TypingCoalescer:
+    """Turns per-keystroke typing events into rate-limited state changes.
+
+    Only transitions (started/stopped) are forwarded, at most one per
+    (user, conversation) per TYPING_WINDOW. A transition that arrives inside
+    the window is held and flushed by sweep(); a "typing" state that stops
+    being refreshed expires after TYPING_TTL.
+    """
+
+    def __init__(self, window=TYPING_WINDOW, ttl=TYPING_TTL):
+        self.window = window
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}  # (kind, user_id, target_id) -> _TypingEntry
+        self.received = 0
+        self.forwarded = 0
+        self.expired = 0
+
+    def update(self, key, is_typing, event, payload, room, skip_sid=None, now=None):
+        """Record a client typing event; return True if it should be emitted now"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self.received += 1
+            entry = self._entries.get(key)
+            if entry is None:
+                if not is_typing:
+                    return False
+                entry = self._entries[key] = _TypingEntry(event, payload, room, skip_sid)
+
+            entry.wanted = bool(is_typing)
+            entry.payload = payload
+            entry.skip_sid = skip_sid
+            if entry.wanted:
+                entry.expires_at = now + self.ttl
+
+            if entry.wanted != entry.sent and now - entry.sent_at >= self.window:
+                self._mark_sent(entry, now)
+                return True
+            return False
+
+    def stop_user(self, user_id):
+        """Turn off every typing state of a user (e.g. on disconnect); sweep() emits the stops"""
+        with self._lock:
+            for key, entry in self._entries.items():
+                if key[1] == user_id:
+                    entry.wanted = False
+
+    def sweep(self, now=None):
+        """Return [(event, payload, room, skip_sid)] for held transitions and expiries"""
+        now = time.monotonic() if now is None else now
+        flush = []
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if entry.wanted and now >= entry.expires_at:
+                    entry.wanted = False
+                    self.expired += 1
+                if now - entry.sent_at < self.window:
+                    continue
+                if entry.wanted != entry.sent:
+                    flush.append((entry.event, {**entry.payload, 'is_typing': entry.wanted},
+                                  entry.room, entry.skip_sid))
+                    self._mark_sent(entry, now)
+                elif not entry.wanted:
+                    # Stopped and out of its window; nothing left to remember
+                    del self._entries[key]
+        return flush
+
+    def _mark_sent(self, entry, now):
+        entry.sent = entry.wanted
+        entry.sent_at = now
+        self.forwarded += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'received': self.received,
+                'forwarded': self.forwarded,
+                'expired': self.expired,
+                'active': len(self._entries)
+            }
+
+
+typing_coalescer = TypingCoalescer()
+
+
+def start_typing_sweeper(socketio, interval=TYPING_SWEEP_INTERVAL):
+    """Background task that emits held typing transitions and expiries"""
+
+    def sweep_loop():
+        while True:
+            socketio.sleep(interval)
+            try:
+                for event, payload, room, skip_sid in typing_coalescer.sweep():
+                    socketio.emit(event, payload, room=room, skip_sid=skip_sid)
+            except Exception:
+                log.exception("typing.sweep_failed")
+
+    return socketio.start_background_task(sweep_loop)
\ No newline at end of file
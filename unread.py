@@ -0,0 +1,95 @@
+import os
+import threading
+from database.db import db
+from logger import get_logger
+
+log = get_logger(__name__)
+
+# Users whose counters are kept in memory; the oldest seeded are dropped first beyond this
+UNREAD_CACHE_USERS = int(os.getenv('UNREAD_CACHE_USERS', '50000'))
+
+
+# =====================================================
+# UNREAD COUNTERS
+# =====================================================
+class UnreadCounters:
+    """Per-user unread direct-message counts by sender.
+
+    A user's counts are seeded from MESSAGE on first read; after that the
+    send and mark-read paths adjust them, so unread lookups never COUNT
+    over MESSAGE. A seed that races one of those writes is not kept.
+    """
+
+    def __init__(self, capacity=UNREAD_CACHE_USERS):
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._counts = {}   # user_id -> {sender_id: unread}
+        self._seeding = {}  # user_id -> True once a write lands while seeding
+
+    def _seed(self, user_id):
+        query = """
+            SELECT sender_id, COUNT(*) as unread_count
+            FROM MESSAGE
+            WHERE receiver_id = %s AND sender_id != %s AND status != 'read'
+            GROUP BY sender_id
+        """
+        rows = db.execute_query(query, (user_id, user_id))
+        if rows is None:
+            return None
+        return {row['sender_id']: row['unread_count'] for row in rows}
+
+    def per_sender(self, user_id):
+        """{sender_id: unread} for one user (a copy)"""
+        user_id = int(user_id)
+        with self._lock:
+            counts = self._counts.get(user_id)
+            if counts is not None:
+                return dict(counts)
+            self._seeding.setdefault(user_id, False)
+
+        counts = self._seed(user_id)
+        with self._lock:
+            dirty = self._seeding.pop(user_id, True)
+            if counts is None:
+                return {}
+            if not dirty:
+                self._counts[user_id] = counts
+                while len(self._counts) > self.capacity:
+                    del self._counts[next(iter(self._counts))]
+        return dict(counts)
+
+    def total(self, user_id):
+        return sum(self.per_sender(user_id).values())
+
+    def _touch(self, user_id):
+        if user_id in self._seeding:
+            self._seeding[user_id] = True
+        return self._counts.get(user_id)
+
+    def incr(self, user_id, sender_id):
+        """A message from sender_id to user_id was stored"""
+        with self._lock:
+            counts = self._touch(int(user_id))
+            if counts is not None:
+                sender_id = int(sender_id)
+                counts[sender_id] = counts.get(sender_id, 0) + 1
+
+    def clear(self, user_id, sender_id):
+        """user_id read everything from sender_id"""
+        with self._lock:
+            counts = self._touch(int(user_id))
+            if counts is not None:
+                counts.pop(int(sender_id), None)
+
+    def forget(self, user_id):
+        """Drop a user's counts so the next read seeds them from MESSAGE again"""
+        with self._lock:
+            self._touch(int(user_id))
+            self._counts.pop(int(user_id), None)
+
+    def stats(self):
+        with self._lock:
+            return {'users': len(self._counts)}
+
+
+unread_counters = UnreadCounters()
\ No newline at end of file